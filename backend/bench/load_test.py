@@ -0,0 +1,473 @@
+"""
+Prueba de carga offline de la API (FastAPI) con backends falsos.
+
+Uso (desde backend/):
+    python -m bench.load_test --concurrency 1 4 8 --requests 24 --out load_results.json
+    python -m bench.load_test --mix single=4,batch=1,export=2,status=8 --workers 2
+    python -m bench.load_test --fake-render 2 --concurrency 16 32   # solo cola + API
+
+Arranca en procesos separados la API (main.py, sin workers propios) y `--workers` workers
+(worker.py) con Pexels, TTS, Whisper, traductor y webhook de n8n sustituidos por los stubs
+de bench/stubs.py y fixtures generadas con ffmpeg: corre sin red ni GPU.
+
+Para cada nivel de concurrencia lanza `--requests` operaciones con ese número de clientes
+simultáneos (bucle cerrado) según `--mix` y mide:
+  - throughput (operaciones terminadas/s) y tasa de error por tipo,
+  - latencia p50/p95/p99 de la petición HTTP y de extremo a extremo (hasta el vídeo listo),
+  - latencia por etapa del pipeline (spans de core.tracing exportados por los workers),
+  - lag del event loop de la API (sonda dentro del proceso API).
+
+--fake-render N sustituye movis + encode final por una espera de N s: mide la API, la cola
+y las etapas previas sin el coste del render en CPU.
+"""
+import argparse, asyncio, csv, io, json, os, random, shutil, socket, statistics, subprocess, sys, tempfile, threading, time, uuid
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KINDS = ("single", "batch", "export", "status")
+DEFAULT_MIX = "single=4,batch=1,export=2,status=8"
+STAGES = [
+    "job", "export", "tts", "transcribe", "group_timestamps", "keywords", "search",
+    "clip_analysis", "download", "transcode", "movis_render", "subtitles", "final_encode",
+]
+LAG_INTERVAL = 0.05   # periodo de la sonda de lag del event loop
+POLL_INTERVAL = 0.25  # consulta de estado de cada operación en curso
+
+
+def percentiles(values):
+    if not values:
+        return None
+    vals = sorted(values)
+    rank = lambda p: vals[max(0, min(len(vals) - 1, -(-len(vals) * p // 100) - 1))]  # nearest-rank
+    return {"n": len(vals), "mean": round(statistics.fmean(vals), 4), "p50": round(rank(50), 4),
+            "p95": round(rank(95), 4), "p99": round(rank(99), 4), "max": round(vals[-1], 4)}
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in KINDS:
+            raise ValueError(f"Tipo de operación desconocido en --mix: {kind} ({', '.join(KINDS)})")
+        mix[kind] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("--mix sin pesos positivos")
+    return mix
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# --- PROCESO API ---
+class LoopLagProbe:
+    """Duerme `interval` en bucle y anota cuánto se retrasa el despertar (= lag del event loop)."""
+
+    def __init__(self, interval=LAG_INTERVAL):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - t0 - self.interval))
+
+    def report(self, reset=False):
+        samples = self.samples
+        if reset:
+            self.samples = []
+        return percentiles(samples) or {"n": 0}
+
+
+def run_api(args):
+    """API real (main.app) con una sonda de lag; su estado vive en el directorio de trabajo (AI_SHORTS_DATA_DIR)."""
+    import uvicorn
+    # Antes de importar main: su arranque abre (y migra) las bases de AI_SHORTS_DATA_DIR
+    os.environ["AI_SHORTS_DATA_DIR"] = args.work_dir
+    os.environ.setdefault("AI_SHORTS_BROKER_URL", f"sqlite:///{os.path.join(args.work_dir, 'broker.db')}")
+    import main
+
+    probe = LoopLagProbe()
+
+    @main.app.on_event("startup")
+    async def start_lag_probe():
+        probe.start()
+
+    @main.app.get("/__loadtest/lag")
+    async def loop_lag(reset: bool = False):
+        return probe.report(reset)
+
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# --- PROCESO WORKER ---
+def fake_video_engine(seconds):
+    """VideoEngine sin movis ni ffmpeg: espera `seconds` y publica el primer clip como salida."""
+    from core.profiling import stage
+
+    class FakeVideoEngine:
+        def __init__(self, output_path, canvas_size=None):
+            self.output_path = os.path.abspath(output_path)
+
+        @staticmethod
+        def plan_sprites(segments, prof):
+            return None
+
+        def assemble_video(self, clip_paths, audio_path, segments, profile_name, job_path, **kwargs):
+            with stage("movis_render"):
+                time.sleep(seconds)
+            with stage("final_encode"):
+                shutil.copyfile(clip_paths[0] if clip_paths else audio_path, self.output_path)
+            return self.output_path
+
+    return FakeVideoEngine
+
+
+def run_worker(args):
+    from core.tracing import setup_logging
+    from core.broker import make_broker
+    from bench.pipeline_bench import install_stubs
+    from worker import Worker
+
+    setup_logging()
+    server = SimpleNamespace(search_url=f"{args.stub_url}/videos/search", webhook_url=f"{args.stub_url}/webhook/video-listo")
+    pipeline = install_stubs(server, args.work_dir)
+    if args.fake_render:
+        pipeline.VideoEngine = fake_video_engine(args.fake_render)
+    worker = Worker(make_broker(), worker_id=f"load-{os.getpid()}")
+    asyncio.run(worker.run())
+
+
+# --- ORQUESTACIÓN ---
+class Cluster:
+    """API + workers como subprocesos sobre un broker, job_store, scratch y storage temporales."""
+
+    def __init__(self, args, work_dir, stub_url):
+        self.args = args
+        self.work_dir = work_dir
+        self.stub_url = stub_url
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.scratch_dir = os.path.join(work_dir, "scratch")
+        self.trace_dir = os.path.join(work_dir, "traces")
+        self.log_dir = os.path.join(work_dir, "logs")
+        self.procs = []
+        for d in (self.scratch_dir, self.trace_dir, self.log_dir):
+            os.makedirs(d, exist_ok=True)
+        self.env = dict(
+            os.environ,
+            # state.db, broker.db y trazas fuera de backend/data: la prueba no toca el estado real
+            AI_SHORTS_DATA_DIR=work_dir,
+            AI_SHORTS_BROKER_URL=f"sqlite:///{os.path.join(work_dir, 'broker.db')}",
+            AI_SHORTS_STORAGE_URL=f"file://{os.path.join(work_dir, 'out')}",
+            AI_SHORTS_SCRATCH_DIR=self.scratch_dir,
+            AI_SHORTS_LOCAL_WORKERS="0",
+            AI_SHORTS_WARMUP="spacy",
+            AI_SHORTS_LOG_LEVEL=os.environ.get("AI_SHORTS_LOG_LEVEL", "WARNING"),
+        )
+
+    def _spawn(self, name, role_args, env):
+        log = open(os.path.join(self.log_dir, f"{name}.log"), "wb")
+        cmd = [sys.executable, "-m", "bench.load_test", "--work-dir", self.work_dir, *role_args]
+        self.procs.append((name, subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)))
+
+    def start(self, ready_timeout):
+        self._spawn("api", ["--role", "api", "--port", str(self.port)], self.env)
+        for i in range(self.args.workers):
+            env = dict(self.env, AI_SHORTS_TRACE="jsonl",
+                       AI_SHORTS_TRACE_FILE=os.path.join(self.trace_dir, f"worker_{i}.jsonl"))
+            role = ["--role", "worker", "--stub-url", self.stub_url]
+            if self.args.fake_render:
+                role += ["--fake-render", str(self.args.fake_render)]
+            self._spawn(f"worker_{i}", role, env)
+        self._wait("/health/live", 60)
+        self._wait("/health/ready", ready_timeout)
+
+    def _wait(self, path, timeout):
+        import requests
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for name, proc in self.procs:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"El proceso {name} terminó (código {proc.returncode}); ver {self.log_dir}")
+            try:
+                if requests.get(self.base_url + path, timeout=2).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.5)
+        raise TimeoutError(f"{path} no respondió 200 en {timeout}s; ver {self.log_dir}")
+
+    def stop(self):
+        for _, proc in self.procs:
+            proc.terminate()
+        for _, proc in self.procs:
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    def stage_spans(self, since):
+        """Duraciones por etapa de los spans que los workers cerraron desde `since` (epoch)."""
+        out = {}
+        for name in os.listdir(self.trace_dir):
+            with open(os.path.join(self.trace_dir, name), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        sp = json.loads(line)
+                    except ValueError:
+                        continue  # línea a medio escribir
+                    if sp.get("name") in STAGES and sp.get("start", 0) >= since:
+                        out.setdefault(sp["name"], []).append(sp["duration"])
+        return out
+
+
+class LoadClient:
+    """Operaciones de un cliente virtual. Cada una devuelve su registro de latencias."""
+
+    def __init__(self, cluster, args, stubs, clip_names):
+        import requests
+        self.cluster = cluster
+        self.base = cluster.base_url
+        self.args = args
+        self.stubs = stubs
+        self.clip_names = sorted(clip_names)
+        self.http = requests.Session()
+        self.script = stubs.script_for_length(args.length)
+
+    def _text(self):
+        # Texto único por operación: si no, la deduplicación devolvería el primer render
+        return f"{self.script} Prueba {uuid.uuid4().hex[:8]}."
+
+    def _poll(self, path, done, deadline):
+        while time.monotonic() < deadline:
+            r = self.http.get(self.base + path, timeout=10)
+            if r.status_code == 200:
+                result = done(r.json())
+                if result is not None:
+                    return result
+            time.sleep(POLL_INTERVAL)
+        raise TimeoutError(f"{path} sin terminar tras {self.args.timeout}s")
+
+    def single(self, deadline):
+        r = self.http.post(self.base + "/process-single", timeout=30, json={
+            "texto": self._text(), "titulo": f"load_{uuid.uuid4().hex[:6]}",
+            "profile": self.args.profile, "layout": self.args.layout,
+        })
+        submitted = time.perf_counter()
+        r.raise_for_status()
+        job_id = r.json()["job_id"]
+        job = self._poll(f"/jobs/{job_id}", lambda j: j if j.get("status") in ("done", "failed") else None, deadline)
+        return submitted, job["status"] == "done", job.get("error")
+
+    def batch(self, deadline):
+        buf = io.StringIO()
+        writer = csv.writer(buf, quoting=csv.QUOTE_ALL)  # el guion lleva comas y dos puntos
+        writer.writerow(["texto", "titulo", "profile", "layout"])
+        for i in range(self.args.batch_rows):
+            writer.writerow([self._text(), f"load_batch_{i}", self.args.profile, self.args.layout or ""])
+        data = buf.getvalue().encode("utf-8")
+        r = self.http.post(self.base + "/batch", timeout=30, files={"file": ("load.csv", data, "text/csv")})
+        submitted = time.perf_counter()
+        r.raise_for_status()
+        batch_id = r.json()["batch_id"]
+        finished = lambda b: b if b["ingested"] and b["pending"] == 0 and b["running"] == 0 else None
+        status = self._poll(f"/batch/{batch_id}", finished, deadline)
+        return submitted, status["failed"] == 0, "; ".join(e["error"] for e in status["errors"]) or None
+
+    def _export_fixture(self):
+        """Job de editor simulado: voz en el scratch compartido + segmentos + clips elegidos."""
+        job_id = f"load_export_{uuid.uuid4().hex[:10]}"
+        words = self.stubs.synthetic_words(self.script)
+        audio_dir = os.path.join(self.cluster.scratch_dir, job_id, "audio")
+        os.makedirs(audio_dir, exist_ok=True)
+        shutil.copyfile(self.stubs.fixture_audio(self.stubs.synthetic_duration(self.script)),
+                        os.path.join(audio_dir, "voice.wav"))
+        segments = [
+            {"start": chunk[0]["start"], "end": chunk[-1]["end"], "words": chunk}
+            for chunk in (words[i:i + 6] for i in range(0, len(words), 6))
+        ]
+        clips = self.clip_names
+        selections = {str(i): f"{self.cluster.stub_url}/files/{clips[i % len(clips)]}" for i in range(len(segments))}
+        return job_id, segments, selections
+
+    def export(self, deadline):
+        job_id, segments, selections = self._export_fixture()
+        r = self.http.post(self.base + "/export", timeout=30, json={
+            "job_id": job_id, "selections": selections, "timestamps": segments, "profile": self.args.profile,
+        })
+        submitted = time.perf_counter()
+        r.raise_for_status()
+        task_id = r.json()["task_id"]
+        finished = lambda j: j if (j.get("task") or {}).get("status") in ("done", "failed") else None
+        job = self._poll(f"/jobs/{task_id}", finished, deadline)
+        return submitted, job["task"]["status"] == "done", None if job["task"]["status"] == "done" else "export fallido"
+
+    def status(self, deadline):
+        r = self.http.get(self.base + "/progress", timeout=30)
+        submitted = time.perf_counter()
+        r.raise_for_status()
+        return submitted, True, None
+
+    def run(self, kind):
+        t0 = time.perf_counter()
+        rec = {"kind": kind, "ok": False, "http": None, "e2e": None, "error": None}
+        try:
+            submitted, ok, error = getattr(self, kind)(time.monotonic() + self.args.timeout)
+            rec.update(ok=ok, error=error, http=submitted - t0, e2e=time.perf_counter() - t0)
+        except Exception as e:
+            rec["error"] = f"{type(e).__name__}: {e}"
+        return rec
+
+
+def run_level(cluster, concurrency, args, stubs, clip_names):
+    """`args.requests` operaciones repartidas entre `concurrency` clientes en bucle cerrado."""
+    import requests
+    rng = random.Random(args.seed + concurrency)
+    mix = parse_mix(args.mix)
+    plan = rng.choices(list(mix), weights=list(mix.values()), k=args.requests)
+    queue, lock, records = list(plan), threading.Lock(), []
+
+    def user(i):
+        client = LoadClient(cluster, args, stubs, clip_names)
+        while True:
+            with lock:
+                if not queue:
+                    return
+                kind = queue.pop(0)
+            rec = client.run(kind)
+            with lock:
+                records.append(rec)
+
+    requests.get(cluster.base_url + "/__loadtest/lag", params={"reset": "true"}, timeout=10)
+    since, t0 = time.time(), time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(user, range(concurrency)))
+    wall = time.perf_counter() - t0
+    lag = requests.get(cluster.base_url + "/__loadtest/lag", params={"reset": "true"}, timeout=10).json()
+    time.sleep(0.5)  # los últimos spans se escriben al cerrar cada etapa
+
+    by_kind = {}
+    for kind in mix:
+        subset = [r for r in records if r["kind"] == kind]
+        if not subset:
+            continue
+        ok = [r for r in subset if r["ok"]]
+        by_kind[kind] = {
+            "count": len(subset), "errors": len(subset) - len(ok),
+            "error_rate": round((len(subset) - len(ok)) / len(subset), 4),
+            "http": percentiles([r["http"] for r in subset if r["http"] is not None]),
+            "e2e": percentiles([r["e2e"] for r in ok]),
+            "sample_errors": sorted({r["error"] for r in subset if r["error"]})[:5],
+        }
+    ok_total = sum(1 for r in records if r["ok"])
+    return {
+        "concurrency": concurrency, "requests": len(records), "wall": round(wall, 3),
+        "throughput": round(len(records) / wall, 4) if wall else None,
+        "ok_throughput": round(ok_total / wall, 4) if wall else None,
+        "error_rate": round((len(records) - ok_total) / len(records), 4) if records else None,
+        "kinds": by_kind,
+        "stages": {k: percentiles(v) for k, v in sorted(cluster.stage_spans(since).items())},
+        "event_loop_lag": lag,
+    }
+
+
+def print_level(level):
+    print(f"\n📈 Concurrencia {level['concurrency']}: {level['requests']} ops en {level['wall']:.1f}s | "
+          f"{level['throughput']:.2f} ops/s | error {level['error_rate'] * 100:.1f}%")
+    print(f"{'tipo':<8} {'n':>4} {'err%':>6} {'http p50':>9} {'http p99':>9} {'e2e p50':>9} {'e2e p95':>9} {'e2e p99':>9}")
+    for kind, k in level["kinds"].items():
+        h, e = k["http"] or {}, k["e2e"] or {}
+        print(f"{kind:<8} {k['count']:>4} {k['error_rate'] * 100:>6.1f} {h.get('p50', 0):>9.3f} {h.get('p99', 0):>9.3f} "
+              f"{e.get('p50', 0):>9.3f} {e.get('p95', 0):>9.3f} {e.get('p99', 0):>9.3f}")
+    for name, st in level["stages"].items():
+        print(f"   {name:<18} n={st['n']:<4} p50 {st['p50']:.3f}s  p95 {st['p95']:.3f}s  p99 {st['p99']:.3f}s")
+    lag = level["event_loop_lag"]
+    if lag.get("n"):
+        print(f"   lag event loop API: p50 {lag['p50'] * 1000:.1f}ms  p99 {lag['p99'] * 1000:.1f}ms  max {lag['max'] * 1000:.1f}ms")
+
+
+def run_driver(args):
+    from bench import stubs
+    from bench.pipeline_bench import environment_info
+
+    parse_mix(args.mix)  # validar antes de arrancar nada
+    work_dir = tempfile.mkdtemp(prefix="ai_shorts_load_")
+    clips = stubs.fixture_clips()
+    stubs.fixture_audio(stubs.synthetic_duration(stubs.script_for_length(args.length)))
+    levels, failed = [], False
+    with stubs.StubPexelsServer(clips) as server:
+        cluster = Cluster(args, work_dir, server.url)
+        try:
+            print(f"🚀 API en {cluster.base_url} + {args.workers} worker(s) | trabajo en {work_dir}")
+            cluster.start(args.ready_timeout)
+            for concurrency in args.concurrency:
+                print(f"⏱️ Nivel de concurrencia {concurrency} ({args.requests} ops, mix {args.mix})...")
+                level = run_level(cluster, concurrency, args, stubs, [os.path.basename(p) for p in clips])
+                level["webhooks"] = len(server.webhooks)
+                levels.append(level)
+                print_level(level)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            cluster.stop()
+            if failed or args.keep:
+                print(f"📁 Logs y trazas conservados en {work_dir}")
+            else:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {"meta": {**environment_info(), "args": vars(args)}, "levels": levels}
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Resultados guardados en {args.out}")
+    return report
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga offline de la API AI Shorts")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="Clientes simultáneos por nivel")
+    parser.add_argument("--requests", type=int, default=20, help="Operaciones por nivel")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Pesos por tipo ({', '.join(KINDS)})")
+    parser.add_argument("--workers", type=int, default=2, help="Procesos worker")
+    parser.add_argument("--length", type=int, default=15, help="Duración objetivo de cada guion (s)")
+    parser.add_argument("--batch-rows", type=int, default=3)
+    parser.add_argument("--profile", default="default")
+    parser.add_argument("--layout", default=None)
+    parser.add_argument("--fake-render", type=float, default=0.0, help="Sustituir movis + encode por N s de espera")
+    parser.add_argument("--timeout", type=float, default=900.0, help="Límite por operación (s)")
+    parser.add_argument("--ready-timeout", type=float, default=300.0, help="Espera a /health/ready (s)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--keep", action="store_true", help="Conservar logs, trazas y salidas")
+    parser.add_argument("--out", default="load_results.json")
+    # Uso interno: subprocesos lanzados por el propio harness
+    parser.add_argument("--role", choices=["driver", "api", "worker"], default="driver", help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--stub-url", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    args.out = os.path.abspath(args.out)
+
+    # La API y el pipeline usan rutas relativas a backend/
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, BACKEND_DIR)
+    if args.role == "api":
+        return run_api(args)
+    if args.role == "worker":
+        return run_worker(args)
+    return run_driver(args)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,169 @@
+"""
+Benchmark reproducible del pipeline completo (offline).
+
+Uso (desde backend/):
+    python -m bench.pipeline_bench --lengths 15 30 60 90 --repeat 3 --out bench_results.json
+    python -m bench.pipeline_bench --capture cprofile --capture-dir bench_profiles
+    python -m bench.pipeline_bench --compare bench_results_old.json
+
+TTS, Whisper, traductor, Pexels y el webhook de n8n se sustituyen por stubs locales
+(bench/stubs.py); keywords (spaCy), transcodificado, render movis, subtítulos y
+encode final son los reales. En máquinas sin GPU, AI_SHORTS_FINAL_ENCODER=libx264 evita el
+intento con NVENC (y que su fallo cuente en final_encode).
+"""
+import argparse, asyncio, json, os, platform, random, statistics, subprocess, sys, tempfile, time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = [
+    "tts", "transcribe", "group_timestamps", "keywords", "search",
+    "clip_analysis", "download", "transcode", "movis_render", "subtitles", "final_encode",
+]
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def environment_info():
+    ffmpeg = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).stdout.splitlines()
+    return {
+        "git_commit": _git("rev-parse", "HEAD"),
+        "git_dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ffmpeg[0] if ffmpeg else None,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def install_stubs(server, work_dir):
+    """Redirige los servicios externos del pipeline a los stubs locales."""
+    import config
+    import pipeline
+    import modules.asset_manager as asset_manager
+    import modules.clip_analysis as clip_analysis
+    from bench import stubs
+    from core.storage import LocalStorage
+
+    config.PEXELS_BASE_URL = server.search_url
+    asset_manager.GoogleTranslator = stubs.IdentityTranslator
+    pipeline.generate_audio = stubs.stub_generate_audio
+    pipeline.get_word_timestamps = stubs.stub_word_timestamps
+    pipeline.N8N_WEBHOOK_URL = server.webhook_url
+    pipeline.storage = LocalStorage(os.path.join(work_dir, "out"))
+    # Los ids del stub (1000+) no deben acabar en la caché real ni reutilizar análisis de otra corrida
+    clip_analysis.CACHE_DIR = os.path.join(work_dir, "cache", "clip_analysis")
+    clip_analysis._memory.clear()
+    return pipeline
+
+
+def run_once(pipeline, length, args, work_dir, capture_dir=None):
+    from bench import stubs
+    from core.profiling import StageRecorder, recording
+    from modules.processor import extract_keywords
+
+    random.seed(args.seed)
+    extract_keywords.cache_clear()
+    job_id = f"bench_{length}s"
+    recorder = StageRecorder(capture=args.capture, capture_dir=capture_dir)
+    text = stubs.script_for_length(length)
+
+    t0 = time.perf_counter()
+    with recording(recorder):
+        asyncio.run(pipeline.process_row(
+            text=text, profile=args.profile, title=job_id, keywords_override=None,
+            job_id=job_id, job_path=os.path.join(work_dir, "jobs", job_id),
+            layout_override=args.layout,
+        ))
+    total = time.perf_counter() - t0
+
+    if args.capture == "cprofile":
+        recorder.dump_profiles()
+    return {
+        "length": length,
+        "audio_duration": round(stubs.synthetic_duration(text), 3),
+        "words": len(stubs.synthetic_words(text)),
+        "total": round(total, 4),
+        "stages": recorder.as_dict(),
+    }
+
+
+def summarize(runs):
+    """Mediana por longitud y etapa (lo que se compara entre commits)."""
+    summary = {}
+    for length in sorted({r["length"] for r in runs}):
+        subset = [r for r in runs if r["length"] == length]
+        entry = {"total": round(statistics.median(r["total"] for r in subset), 4)}
+        for name in STAGES:
+            vals = [r["stages"][name]["total"] for r in subset if name in r["stages"]]
+            if vals:
+                entry[name] = round(statistics.median(vals), 4)
+        summary[str(length)] = entry
+    return summary
+
+
+def compare(current, baseline):
+    print(f"\n📊 Comparación con {baseline['meta'].get('git_commit', '?')[:10]}")
+    print(f"{'len':>5} {'stage':<18} {'base':>9} {'now':>9} {'delta':>8}")
+    for length, stages in current["summary"].items():
+        base = baseline["summary"].get(length, {})
+        for name in ["total"] + STAGES:
+            if name not in stages or name not in base:
+                continue
+            old, new = base[name], stages[name]
+            delta = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"{length:>5} {name:<18} {old:>9.3f} {new:>9.3f} {delta:>8}")
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline del pipeline AI Shorts")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[15, 30, 60, 90], help="Duraciones objetivo (s)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--profile", default="default", help="Perfil de canal a usar")
+    parser.add_argument("--layout", default=None, help="layout_override (p.ej. full_screen)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--capture", choices=["cprofile", "py-spy"], default=None)
+    parser.add_argument("--capture-dir", default="bench_profiles")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", default=None, help="JSON de una ejecución anterior")
+    args = parser.parse_args(argv)
+    args.out = os.path.abspath(args.out)
+    args.capture_dir = os.path.abspath(args.capture_dir)
+    args.compare = os.path.abspath(args.compare) if args.compare else None
+
+    # El pipeline usa rutas relativas a backend/
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, BACKEND_DIR)
+    from bench import stubs
+
+    runs = []
+    with stubs.StubPexelsServer(stubs.fixture_clips()) as server, tempfile.TemporaryDirectory() as work_dir:
+        pipeline = install_stubs(server, work_dir)
+        for length in args.lengths:
+            stubs.fixture_audio(stubs.synthetic_duration(stubs.script_for_length(length)))
+            for rep in range(args.repeat):
+                capture_dir = os.path.join(args.capture_dir, f"{length}s_{rep}") if args.capture else None
+                print(f"⏱️ {length}s (rep {rep + 1}/{args.repeat})...")
+                result = run_once(pipeline, length, args, work_dir, capture_dir)
+                result["repeat"] = rep
+                runs.append(result)
+                print(f"   ↳ total {result['total']:.2f}s")
+
+    report = {"meta": {**environment_info(), "args": vars(args)}, "runs": runs, "summary": summarize(runs)}
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Resultados guardados en {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+    return report
+
+
+if __name__ == "__main__":
+    main_cli()
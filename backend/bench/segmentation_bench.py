@@ -0,0 +1,129 @@
+"""
+Benchmark de segmentación y del timeline compacto: bucle palabra a palabra original
+vs. modules.segmenter sobre core.timeline, memoria y serialización (JSON vs binario).
+
+Uso (desde backend/):
+    python -m bench.segmentation_bench --words 100000 --repeat 5 --out bench_results_segmentation.json
+"""
+import argparse, json, os, random, statistics, tempfile, time, tracemalloc
+
+from core import timeline as tl
+from modules.segmenter import group_words, segment_timeline, split_into_shorts
+
+RAW_WORDS = ["la", "disciplina", "es", "clave,", "hoy.", "mira", "esto!", "dinero", "tiempo?", "mente"]
+
+
+def synthetic_timeline(n_words, seed=7):
+    """Timeline tipo Whisper: duraciones y silencios aleatorios pero reproducibles."""
+    rnd, t, words = random.Random(seed), 0.0, []
+    for _ in range(n_words):
+        raw = rnd.choice(RAW_WORDS)
+        dur = round(rnd.uniform(0.12, 0.55), 3)
+        words.append({"word": raw.strip(",.!?").upper(), "raw_word": raw,
+                      "start": round(t, 3), "end": round(t + dur, 3)})
+        t += dur + rnd.choice([0.0, 0.03, 0.08, 0.15, 0.35, 0.6])
+    return words
+
+
+def legacy_group_timestamps(raw_timestamps):
+    """Copia literal del group_timestamps original (referencia de resultados y tiempos)."""
+    segments, temp_words = [], []
+    for i, w in enumerate(raw_timestamps):
+        temp_words.append(w)
+        is_last = i == len(raw_timestamps) - 1
+        gap = False if is_last else (raw_timestamps[i+1]["start"] - w["end"]) > 0.3
+        has_punct = any(p in w["raw_word"] for p in {".", "!", "?", ","})
+        duration = temp_words[-1]["end"] - temp_words[0]["start"]
+
+        if gap or (has_punct and duration > 1.2) or duration > 3.5 or is_last:
+            segments.append({
+                "phrase": " ".join([x["word"] for x in temp_words]),
+                "start": temp_words[0]["start"],
+                "end": temp_words[-1]["end"],
+                "words": list(temp_words)
+            })
+            temp_words = []
+    return segments
+
+
+def _allocated(fn):
+    """Bytes que quedan vivos tras construir el resultado de fn()."""
+    tracemalloc.start()
+    result = fn()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t0)
+    return result, round(statistics.median(samples), 5)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de segmentación de palabras")
+    parser.add_argument("--words", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--shorts", type=int, default=None, help="Número de shorts objetivo (por defecto, por duración)")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args(argv)
+
+    words = synthetic_timeline(args.words)
+    _, dict_bytes = _allocated(lambda: synthetic_timeline(args.words))
+    timeline, timeline_bytes = _allocated(lambda: tl.WordTimeline.from_words(words))
+
+    legacy, t_legacy = _time(lambda: legacy_group_timestamps(words), args.repeat)
+    grouped, t_group = _time(lambda: group_words(words), args.repeat)
+    _, t_build = _time(lambda: tl.WordTimeline.from_words(words), args.repeat)
+    table, t_segment = _time(lambda: segment_timeline(timeline), args.repeat)
+    shorts, t_split = _time(lambda: split_into_shorts(timeline, target_count=args.shorts), args.repeat)
+
+    # El timeline trabaja en ms enteros: solo puede discrepar del bucle original en empates
+    # exactos con el umbral, donde la resta en float de segundos cae a un lado u otro
+    legacy_cuts = {seg["words"][-1]["end"] for seg in legacy}
+    mismatches = len(legacy_cuts.symmetric_difference(seg["words"][-1]["end"] for seg in grouped))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path, bin_path = os.path.join(tmp, "timestamps.json"), os.path.join(tmp, "timeline.tlb")
+
+        def write_json():
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(words, f, indent=4, ensure_ascii=False)
+
+        _, t_json = _time(write_json, args.repeat)
+        _, t_bin = _time(lambda: tl.dump(bin_path, timeline, table), args.repeat)
+        _, t_bin_load = _time(lambda: tl.load(bin_path), args.repeat)
+        json_size, bin_size = os.path.getsize(json_path), os.path.getsize(bin_path)
+
+    result = {
+        "words": args.words,
+        "audio_seconds": words[-1]["end"],
+        "segments": len(table),
+        "legacy_mismatches": mismatches,
+        "shorts": len(shorts),
+        "memory_bytes": {"dict_words": dict_bytes, "word_timeline": timeline_bytes},
+        "disk_bytes": {"json_indent4": json_size, "timeline_binary": bin_size},
+        "timings": {
+            "legacy_group_timestamps": t_legacy,
+            "group_words_json_roundtrip": t_group,
+            "timeline_from_words": t_build,
+            "segment_timeline": t_segment,
+            "split_into_shorts": t_split,
+            "json_dump_indent4": t_json,
+            "timeline_dump": t_bin,
+            "timeline_load": t_bin_load,
+        },
+    }
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return result
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,186 @@
+"""
+Dobles offline para benchmarks: fixtures generadas con ffmpeg, servidor Pexels falso
+(búsqueda + descarga + webhook de n8n), TTS y ASR deterministas y traductor identidad.
+"""
+import json, os, re, subprocess, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, ".fixtures")
+
+# Ritmo de la voz sintética
+WORD_DUR = 0.32
+WORD_GAP = 0.06
+SENTENCE_PAUSE = 0.40
+
+SENTENCES = [
+    "La disciplina es el puente entre tus metas y tus logros.",
+    "Cada mañana tienes una nueva oportunidad para cambiar tu vida.",
+    "El dinero no compra el tiempo, pero el tiempo bien usado crea dinero.",
+    "Tu mente es el arma más poderosa que tienes, entrénala cada día.",
+    "Los ganadores no tienen suerte, tienen hábitos que repiten sin excusas.",
+    "Apaga el teléfono, la dopamina barata te roba la atención.",
+    "Recuerda que el éxito es la suma de pequeños esfuerzos diarios.",
+    "Mira los datos: el ocho por ciento ahorra de forma constante.",
+]
+
+CLIP_SOURCES = ["testsrc2", "smptehdbars", "rgbtestsrc"]
+
+
+def _ffmpeg(args):
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", *args], check=True)
+
+
+# --- FIXTURES ---
+def script_for_length(seconds):
+    """Texto en español cuya locución sintética dura aproximadamente `seconds`."""
+    words, i = [], 0
+    while synthetic_duration(" ".join(words)) < seconds:
+        words.extend(SENTENCES[i % len(SENTENCES)].split())
+        i += 1
+    return " ".join(words)
+
+
+def fixture_audio(duration):
+    """WAV mono 48 kHz (tono senoidal) de la duración pedida, cacheado en disco."""
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    path = os.path.join(FIXTURES_DIR, f"voice_{duration:.2f}.wav")
+    if not os.path.exists(path):
+        _ffmpeg(["-f", "lavfi", "-i", f"sine=frequency=220:sample_rate=48000:duration={duration:.3f}",
+                 "-ac", "1", "-c:a", "pcm_s16le", path])
+    return path
+
+
+def fixture_clips(count=len(CLIP_SOURCES), seconds=8, size="720x1280"):
+    """Clips verticales sintéticos que el servidor Pexels falso sirve como 'stock'."""
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    paths = []
+    for i in range(count):
+        src = CLIP_SOURCES[i % len(CLIP_SOURCES)]
+        path = os.path.join(FIXTURES_DIR, f"stock_{i}_{size}.mp4")
+        if not os.path.exists(path):
+            _ffmpeg(["-f", "lavfi", "-i", f"{src}=size={size}:rate=30:duration={seconds}",
+                     "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+                     "-movflags", "+faststart", path])
+        paths.append(path)
+    return paths
+
+
+# --- TTS / ASR DETERMINISTAS ---
+def synthetic_words(text):
+    """Timestamps palabra a palabra con el mismo formato que get_word_timestamps."""
+    words, t = [], 0.0
+    for raw in text.split():
+        clean = re.sub(r"\W+", "", raw).upper()
+        if not clean:
+            continue
+        words.append({"word": clean, "raw_word": raw, "start": round(t, 3), "end": round(t + WORD_DUR, 3)})
+        t += WORD_DUR + WORD_GAP
+        if raw.endswith((".", "!", "?")):
+            t += SENTENCE_PAUSE
+    return words
+
+
+def synthetic_duration(text):
+    words = synthetic_words(text)
+    return (words[-1]["end"] + 0.3) if words else 0.0
+
+
+async def stub_generate_audio(texto, voice=None, save_path=None, **kwargs):
+    """Sustituto de voice_engine.generate_audio: pasa una fixture de la duración correcta por audio_post."""
+    from modules.audio_post import postprocess_audio
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    return postprocess_audio(fixture_audio(synthetic_duration(texto)), save_path, kwargs.get("audio_config"))
+
+
+def stub_word_timestamps(audio_path, job_path=None, original_text=""):
+    """Sustituto de voice_engine.get_word_timestamps (sin Whisper)."""
+    from core.timeline import WordTimeline
+    return WordTimeline.from_words(synthetic_words(original_text))
+
+
+class IdentityTranslator:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def translate(self, text):
+        return text
+
+
+# --- SERVIDOR PEXELS / N8N FALSO ---
+class StubPexelsServer:
+    """
+    Servidor HTTP local en un hilo:
+      GET  /videos/search -> JSON con la forma de la API de Pexels
+      GET  /files/<name>  -> bytes de la fixture
+      POST /webhook/...   -> 200 (webhook de n8n)
+    """
+
+    def __init__(self, clip_paths, host="127.0.0.1", port=0):
+        self.clips = {os.path.basename(p): p for p in clip_paths}
+        self.webhooks = []
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, body, ctype="application/json"):
+                self.send_response(code)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                server.requests += 1
+                url = urlparse(self.path)
+                if url.path == "/videos/search":
+                    per_page = int(parse_qs(url.query).get("per_page", ["10"])[0])
+                    self._send(200, json.dumps(server.search_payload(per_page)).encode())
+                elif url.path.startswith("/files/") and os.path.basename(url.path) in server.clips:
+                    with open(server.clips[os.path.basename(url.path)], "rb") as f:
+                        self._send(200, f.read(), "video/mp4")
+                else:
+                    self._send(404, b"{}")
+
+            def do_POST(self):
+                server.requests += 1
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length) if length else b""
+                if self.path.startswith("/webhook"):
+                    server.webhooks.append(json.loads(body or b"{}"))
+                    self._send(200, b"{}")
+                else:
+                    self._send(404, b"{}")
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.search_url = f"{self.url}/videos/search"
+        self.webhook_url = f"{self.url}/webhook/video-listo"
+        self._thread = None
+
+    def search_payload(self, per_page):
+        names = sorted(self.clips)
+        videos = []
+        for i in range(per_page):
+            name = names[i % len(names)]
+            videos.append({
+                "id": 1000 + i,
+                "image": f"{self.url}/files/{name}.jpg",
+                "video_files": [{"link": f"{self.url}/files/{name}", "width": 720, "height": 1280,
+                                 "fps": 30, "quality": "hd", "file_type": "video/mp4"}],
+            })
+        return {"videos": videos}
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,127 @@
+"""
+Contabilidad y límite de ancho de banda de descargas (clips de Pexels).
+
+- Cada byte descargado se anota en el job activo (core.tracing.current_job_id) y en el total del proceso.
+- AI_SHORTS_BANDWIDTH_MBPS (megabits/s, 0 = sin límite) limita el caudal conjunto de las
+  descargas con un token bucket, para que un batch no sature el enlace. Los workers llaman a
+  share_via(broker) y el bucket vive en el broker: el límite es global para todos los workers
+  y procesos (con cualquier --concurrency) que comparten broker. Sin broker (scripts sueltos)
+  el límite es por proceso. Si el broker no responde, cada proceso aplica el límite por su cuenta.
+"""
+import os, threading, time
+from core.tracing import current_job_id, get_logger
+
+log = get_logger("bandwidth")
+
+CAP_MBPS = float(os.environ.get("AI_SHORTS_BANDWIDTH_MBPS", "0"))
+BURST_SECONDS = 1.0  # ráfaga permitida sin esperar
+
+_lock = threading.Lock()
+_jobs = {}    # job_id -> {"bytes", "files", "seconds", "throttled"}
+_totals = {"bytes": 0, "files": 0, "throttled": 0.0}
+
+
+class TokenBucket:
+    """Límite compartido entre hilos; quien se queda en deuda duerme lo que le toca."""
+    __slots__ = ("rate", "capacity", "tokens", "updated", "_lock")
+
+    def __init__(self, bytes_per_second, burst_seconds=BURST_SECONDS):
+        self.rate = float(bytes_per_second)
+        self.capacity = self.rate * burst_seconds
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n):
+        """Descuenta `n` bytes y bloquea lo necesario. Devuelve los segundos esperados."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class SharedBucket:
+    """Misma interfaz que TokenBucket, con el estado en el broker (compartido entre procesos)."""
+    NAME = "downloads"
+
+    def __init__(self, broker, bytes_per_second, burst_seconds=BURST_SECONDS):
+        self.broker = broker
+        self.rate = float(bytes_per_second)
+        self.capacity = self.rate * burst_seconds
+        self._local = TokenBucket(bytes_per_second, burst_seconds)
+
+    def consume(self, n):
+        try:
+            wait = self.broker.take_tokens(self.NAME, n, self.rate, self.capacity)
+        except Exception as e:
+            log.warning(f"⚠️ Límite de descarga compartido no disponible, se aplica por proceso: {e}")
+            return self._local.consume(n)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+_cap = CAP_MBPS
+_broker = None
+_bucket = TokenBucket(CAP_MBPS * 1e6 / 8) if CAP_MBPS > 0 else None
+
+
+def _make_bucket():
+    if _cap <= 0:
+        return None
+    rate = _cap * 1e6 / 8
+    return SharedBucket(_broker, rate) if _broker is not None else TokenBucket(rate)
+
+
+def set_cap(mbps):
+    """Cambia el límite en caliente (0/None = sin límite)."""
+    global _bucket, _cap
+    _cap = float(mbps or 0)
+    _bucket = _make_bucket()
+
+
+def share_via(broker):
+    """Lleva el límite al broker: todos los procesos que lo comparten reparten el mismo caudal."""
+    global _bucket, _broker
+    _broker = broker
+    _bucket = _make_bucket()
+
+
+def metered(chunks, job_id=None):
+    """Envuelve un iterador de bloques (p.ej. iter_content) anotando y limitando lo descargado."""
+    job_id = job_id or current_job_id() or "-"
+    t0 = time.perf_counter()
+    size, throttled = 0, 0.0
+    try:
+        for chunk in chunks:
+            if _bucket is not None:
+                throttled += _bucket.consume(len(chunk))
+            size += len(chunk)
+            yield chunk
+    finally:
+        with _lock:
+            job = _jobs.setdefault(job_id, {"bytes": 0, "files": 0, "seconds": 0.0, "throttled": 0.0})
+            job["bytes"] += size
+            job["files"] += 1
+            job["seconds"] += time.perf_counter() - t0
+            job["throttled"] += throttled
+            _totals["bytes"] += size
+            _totals["files"] += 1
+            _totals["throttled"] += throttled
+
+
+def pop_job(job_id):
+    """Devuelve y olvida la contabilidad del job (al cerrarlo)."""
+    with _lock:
+        return _jobs.pop(job_id, None) or {"bytes": 0, "files": 0, "seconds": 0.0, "throttled": 0.0}
+
+
+def stats():
+    with _lock:
+        return {"cap_mbps": _cap, "shared": _broker is not None, "active_jobs": len(_jobs),
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in _totals.items()}}
@@ -0,0 +1,410 @@
+"""
+Cola de trabajo entre el nodo API y los workers de render.
+
+- SQLiteBroker: sustituto local (un archivo compartido; varios procesos en la misma máquina
+  o un volumen compartido). Es el que se usa por defecto y en pruebas.
+- RedisBroker: para repartir el render entre máquinas (requiere el paquete `redis`).
+
+Las tareas se reclaman con un lease: el worker lo renueva con heartbeat() y, si muere,
+requeue_expired() devuelve la tarea a la cola (hasta MAX_ATTEMPTS intentos).
+heartbeat(), report_progress(), complete() y fail() solo surten efecto si el worker sigue
+siendo el dueño del lease (devuelven False si no): un worker que perdió la tarea no pisa
+el resultado del que la reclamó después.
+El progreso y el estado de cada worker también viajan por el broker, igual que el token
+bucket del límite global de descargas (take_tokens, ver core.bandwidth).
+
+Configuración: AI_SHORTS_BROKER_URL = sqlite:///ruta/broker.db | redis://host:6379/0
+"""
+import json, os, sqlite3, threading, time
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+LEASE_SECONDS = 60
+MAX_ATTEMPTS = 2
+WORKER_TTL = 30  # un worker sin latido en este tiempo deja de contar como vivo
+FINISHED_RETENTION = 3600  # Redis: tiempo que una tarea terminada figura en finished_since()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id     TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    worker_id   TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    result      TEXT,
+    error       TEXT,
+    progress    TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_queue ON tasks (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_finished ON tasks (status, updated_at);
+CREATE TABLE IF NOT EXISTS buckets (
+    name    TEXT PRIMARY KEY,
+    tokens  REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id  TEXT PRIMARY KEY,
+    info       TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+_TASK_COLUMNS = ("task_id", "kind", "payload", "status", "worker_id", "lease_until", "attempts",
+                 "result", "error", "progress", "created_at", "updated_at")
+
+
+def _decode_task(values):
+    task = dict(zip(_TASK_COLUMNS, values))
+    for key in ("payload", "result", "progress"):
+        task[key] = json.loads(task[key]) if task[key] else None
+    return task
+
+
+class SQLiteBroker:
+    def __init__(self, db_path):
+        self.db_path = os.path.abspath(db_path)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _update_owned(self, task_id, worker_id, assignments, params):
+        """UPDATE de una tarea en curso solo si `worker_id` tiene el lease. True si se aplicó."""
+        with self._lock:
+            cur = self._conn.execute(
+                f"UPDATE tasks SET {assignments}, updated_at = ? WHERE task_id = ? AND worker_id = ? AND status = ?",
+                (*params, time.time(), task_id, worker_id, RUNNING),
+            )
+            return cur.rowcount > 0
+
+    # --- PRODUCTOR (API) ---
+    def enqueue(self, task_id, kind, payload):
+        now = time.time()
+        self._execute(
+            "INSERT INTO tasks (task_id, kind, payload, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (task_id, kind, json.dumps(payload, ensure_ascii=False), QUEUED, now, now),
+        )
+        return task_id
+
+    def get(self, task_id):
+        rows = self._execute(f"SELECT {', '.join(_TASK_COLUMNS)} FROM tasks WHERE task_id = ?", (task_id,))
+        return _decode_task(rows[0]) if rows else None
+
+    def active(self):
+        """Tareas en cola o en curso (para /progress)."""
+        rows = self._execute(
+            f"SELECT {', '.join(_TASK_COLUMNS)} FROM tasks WHERE status IN (?, ?) ORDER BY created_at",
+            (QUEUED, RUNNING),
+        )
+        return [_decode_task(r) for r in rows]
+
+    def queue_depth(self):
+        return self._execute("SELECT COUNT(*) FROM tasks WHERE status = ?", (QUEUED,))[0][0]
+
+    def finished_since(self, since):
+        """Tareas terminadas (done/failed) después de `since`: la API reconcilia solo estas."""
+        rows = self._execute(
+            f"SELECT {', '.join(_TASK_COLUMNS)} FROM tasks WHERE status IN (?, ?) AND updated_at > ?",
+            (DONE, FAILED, since),
+        )
+        return [_decode_task(r) for r in rows]
+
+    # --- CONSUMIDOR (WORKER) ---
+    def claim(self, worker_id, kinds=None, lease=LEASE_SECONDS):
+        """Reclama la tarea más antigua en cola (de los tipos pedidos). None si no hay."""
+        kinds = list(kinds or [])
+        kind_sql = f" AND kind IN ({', '.join('?' * len(kinds))})" if kinds else ""
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE: bloquea escritores de otros procesos entre SELECT y UPDATE
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT task_id FROM tasks WHERE status = ?{kind_sql} ORDER BY created_at LIMIT 1",
+                    (QUEUED, *kinds),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE tasks SET status = ?, worker_id = ?, lease_until = ?, attempts = attempts + 1, "
+                        "updated_at = ? WHERE task_id = ?",
+                        (RUNNING, worker_id, now + lease, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0]) if row else None
+
+    def heartbeat(self, task_id, worker_id, lease=LEASE_SECONDS):
+        return self._update_owned(task_id, worker_id, "lease_until = ?", (time.time() + lease,))
+
+    def report_progress(self, task_id, worker_id, snapshot):
+        return self._update_owned(task_id, worker_id, "progress = ?", (json.dumps(snapshot),))
+
+    def complete(self, task_id, worker_id, result=None):
+        return self._update_owned(task_id, worker_id, "status = ?, result = ?, lease_until = NULL",
+                                  (DONE, json.dumps(result)))
+
+    def fail(self, task_id, worker_id, error):
+        return self._update_owned(task_id, worker_id, "status = ?, error = ?, lease_until = NULL",
+                                  (FAILED, str(error)[:2000]))
+
+    def requeue_expired(self, max_attempts=MAX_ATTEMPTS):
+        """Tareas cuyo worker dejó de dar señales: vuelven a la cola o fallan si agotaron intentos."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE tasks SET status = ?, error = ?, updated_at = ? "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (FAILED, "Worker perdido (lease expirado)", now, RUNNING, now, max_attempts),
+                )
+                cur = self._conn.execute(
+                    "UPDATE tasks SET status = ?, worker_id = NULL, lease_until = NULL, updated_at = ? "
+                    "WHERE status = ? AND lease_until < ?",
+                    (QUEUED, now, RUNNING, now),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return cur.rowcount
+
+    # --- LÍMITES COMPARTIDOS ---
+    def take_tokens(self, name, n, rate, capacity):
+        """Token bucket compartido entre procesos: descuenta `n` y devuelve los segundos a esperar."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+                tokens -= n
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)", (name, tokens, now)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return -tokens / rate if tokens < 0 else 0.0
+
+    # --- WORKERS ---
+    def worker_heartbeat(self, worker_id, info):
+        self._execute(
+            "INSERT OR REPLACE INTO workers (worker_id, info, updated_at) VALUES (?, ?, ?)",
+            (worker_id, json.dumps(info), time.time()),
+        )
+
+    def workers(self, ttl=WORKER_TTL):
+        rows = self._execute(
+            "SELECT worker_id, info, updated_at FROM workers WHERE updated_at > ? ORDER BY worker_id",
+            (time.time() - ttl,),
+        )
+        return [{"worker_id": w, **json.loads(info or "{}"), "updated_at": t} for w, info, t in rows]
+
+
+class RedisBroker:
+    """
+    Misma interfaz sobre Redis (o cualquier servidor compatible):
+      ai_shorts:task:<id>      hash con los campos de la tarea
+      ai_shorts:queue:<kind>   lista FIFO de ids en cola, una por tipo de tarea
+      ai_shorts:kinds          set de tipos con cola
+      ai_shorts:running        zset id -> lease_until
+      ai_shorts:finished       zset id -> fin (se olvida pasado FINISHED_RETENTION)
+      ai_shorts:bucket:<name>  token bucket compartido (reloj del servidor Redis)
+      ai_shorts:worker:<id>    estado del worker (con expiración WORKER_TTL)
+    claim() consulta solo las colas de los `kinds` pedidos (todas si no se indican).
+    Las escrituras de un worker sobre su tarea van por un script Lua que comprueba el lease
+    (status y worker_id) y aplica el cambio de forma atómica.
+    """
+    PREFIX = "ai_shorts"
+
+    # KEYS: hash de la tarea, zset running, zset finished | ARGV: task_id, worker_id, op, score, campos...
+    _OWNED_UPDATE = """
+    if redis.call('HGET', KEYS[1], 'status') ~= 'running' or redis.call('HGET', KEYS[1], 'worker_id') ~= ARGV[2] then
+        return 0
+    end
+    if ARGV[3] == 'finish' then
+        redis.call('ZREM', KEYS[2], ARGV[1])
+        redis.call('ZADD', KEYS[3], ARGV[4], ARGV[1])
+    elseif ARGV[3] == 'lease' then
+        redis.call('ZADD', KEYS[2], 'XX', ARGV[4], ARGV[1])
+    end
+    redis.call('HSET', KEYS[1], unpack(ARGV, 5))
+    return 1
+    """
+
+    # KEYS: hash del bucket | ARGV: rate, capacity, n. Devuelve los tokens que quedan (texto)
+    _TAKE_TOKENS = """
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local rate, capacity, n = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local v = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = capacity
+    if v[1] then
+        tokens = math.min(capacity, tonumber(v[1]) + math.max(0, now - tonumber(v[2])) * rate)
+    end
+    tokens = tokens - n
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('EXPIRE', KEYS[1], 3600)
+    return tostring(tokens)
+    """
+
+    # KEYS: zset running, colas en orden | ARGV: worker_id, lease_until, ahora, prefijo del hash
+    _CLAIM = """
+    for i = 2, #KEYS do
+        local id = redis.call('LPOP', KEYS[i])
+        if id then
+            local key = ARGV[4] .. id
+            redis.call('ZADD', KEYS[1], ARGV[2], id)
+            redis.call('HSET', key, 'status', 'running', 'worker_id', ARGV[1], 'lease_until', ARGV[2], 'updated_at', ARGV[3])
+            redis.call('HINCRBY', key, 'attempts', 1)
+            return id
+        end
+    end
+    return false
+    """
+
+    def __init__(self, url):
+        import redis  # dependencia opcional: solo para despliegues multi-máquina
+        self.r = redis.Redis.from_url(url, decode_responses=True)
+        self.kinds = f"{self.PREFIX}:kinds"
+        self.running = f"{self.PREFIX}:running"
+        self.finished = f"{self.PREFIX}:finished"
+        self._owned_update = self.r.register_script(self._OWNED_UPDATE)
+        self._take_tokens = self.r.register_script(self._TAKE_TOKENS)
+        self._claim = self.r.register_script(self._CLAIM)
+
+    def _key(self, task_id):
+        return f"{self.PREFIX}:task:{task_id}"
+
+    def _queue(self, kind):
+        return f"{self.PREFIX}:queue:{kind}"
+
+    def _queues(self, kinds=None):
+        return [self._queue(k) for k in sorted(kinds or self.r.smembers(self.kinds))]
+
+    def enqueue(self, task_id, kind, payload):
+        now = time.time()
+        pipe = self.r.pipeline()
+        pipe.hset(self._key(task_id), mapping={
+            "task_id": task_id, "kind": kind, "payload": json.dumps(payload, ensure_ascii=False),
+            "status": QUEUED, "attempts": 0, "created_at": now, "updated_at": now,
+        })
+        pipe.sadd(self.kinds, kind)
+        pipe.rpush(self._queue(kind), task_id)
+        pipe.execute()
+        return task_id
+
+    def get(self, task_id):
+        raw = self.r.hgetall(self._key(task_id))
+        if not raw:
+            return None
+        task = {k: raw.get(k) for k in _TASK_COLUMNS}
+        for key in ("payload", "result", "progress"):
+            task[key] = json.loads(task[key]) if task[key] else None
+        for key in ("lease_until", "created_at", "updated_at"):
+            task[key] = float(task[key]) if task[key] else None
+        task["attempts"] = int(task["attempts"] or 0)
+        return task
+
+    def active(self):
+        ids = [i for q in self._queues() for i in self.r.lrange(q, 0, -1)] + self.r.zrange(self.running, 0, -1)
+        return [t for t in (self.get(i) for i in ids) if t]
+
+    def queue_depth(self):
+        return sum(self.r.llen(q) for q in self._queues())
+
+    def finished_since(self, since):
+        self.r.zremrangebyscore(self.finished, 0, time.time() - FINISHED_RETENTION)
+        ids = self.r.zrangebyscore(self.finished, f"({since}", "+inf")
+        return [t for t in (self.get(i) for i in ids) if t]
+
+    def claim(self, worker_id, kinds=None, lease=LEASE_SECONDS):
+        queues = self._queues(kinds)
+        if not queues:
+            return None
+        now = time.time()
+        # Sacar de la cola y escribir el lease en un solo script: si el worker muere entre
+        # medias la tarea no puede quedar fuera de la cola y sin lease (requeue_expired no la vería)
+        task_id = self._claim(keys=[self.running, *queues],
+                              args=[worker_id, now + lease, now, f"{self.PREFIX}:task:"])
+        return self.get(task_id) if task_id else None
+
+    def _update_owned(self, task_id, worker_id, fields, op="", score=0):
+        """Aplica `fields` solo si `worker_id` tiene el lease. True si se aplicó."""
+        now = time.time()
+        args = [task_id, worker_id, op, score or now]
+        for k, v in {**fields, "updated_at": now}.items():
+            args += [k, v]
+        return bool(self._owned_update(keys=[self._key(task_id), self.running, self.finished], args=args))
+
+    def heartbeat(self, task_id, worker_id, lease=LEASE_SECONDS):
+        until = time.time() + lease
+        return self._update_owned(task_id, worker_id, {"lease_until": until}, "lease", until)
+
+    def report_progress(self, task_id, worker_id, snapshot):
+        return self._update_owned(task_id, worker_id, {"progress": json.dumps(snapshot)})
+
+    def complete(self, task_id, worker_id, result=None):
+        return self._update_owned(task_id, worker_id, {"status": DONE, "result": json.dumps(result),
+                                                       "lease_until": ""}, "finish")
+
+    def fail(self, task_id, worker_id, error):
+        return self._update_owned(task_id, worker_id, {"status": FAILED, "error": str(error)[:2000],
+                                                       "lease_until": ""}, "finish")
+
+    def requeue_expired(self, max_attempts=MAX_ATTEMPTS):
+        count = 0
+        for task_id in self.r.zrangebyscore(self.running, 0, time.time()):
+            # zrem atómico: solo un nodo reencola cada tarea
+            if not self.r.zrem(self.running, task_id):
+                continue
+            worker_id, attempts, kind = self.r.hmget(self._key(task_id), "worker_id", "attempts", "kind")
+            # Con comprobación de dueño: si el worker terminó entretanto, su resultado se respeta
+            if int(attempts or 0) >= max_attempts:
+                self._update_owned(task_id, worker_id or "", {"status": FAILED, "lease_until": "",
+                                                              "error": "Worker perdido (lease expirado)"}, "finish")
+            elif self._update_owned(task_id, worker_id or "", {"status": QUEUED, "worker_id": "", "lease_until": ""}):
+                self.r.lpush(self._queue(kind or "render"), task_id)  # tareas sin 'kind': render
+                count += 1
+        return count
+
+    def take_tokens(self, name, n, rate, capacity):
+        tokens = float(self._take_tokens(keys=[f"{self.PREFIX}:bucket:{name}"], args=[rate, capacity, n]))
+        return -tokens / rate if tokens < 0 else 0.0
+
+    def worker_heartbeat(self, worker_id, info):
+        self.r.set(f"{self.PREFIX}:worker:{worker_id}", json.dumps({**info, "updated_at": time.time()}), ex=WORKER_TTL)
+
+    def workers(self, ttl=WORKER_TTL):
+        out = []
+        for key in self.r.scan_iter(f"{self.PREFIX}:worker:*"):
+            raw = self.r.get(key)
+            if raw:
+                out.append({"worker_id": key.rsplit(":", 1)[-1], **json.loads(raw)})
+        return sorted(out, key=lambda w: w["worker_id"])
+
+
+def make_broker(url=None, default_path=None):
+    """Crea el broker a partir de AI_SHORTS_BROKER_URL (o `url`); por defecto SQLite en `default_path`."""
+    url = url or os.environ.get("AI_SHORTS_BROKER_URL")
+    if not url:
+        return SQLiteBroker(default_path)
+    if url.startswith("sqlite:///"):
+        return SQLiteBroker(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBroker(url)
+    raise ValueError(f"AI_SHORTS_BROKER_URL no soportada: {url}")
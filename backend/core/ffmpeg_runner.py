@@ -0,0 +1,111 @@
+import os, shlex, subprocess, threading, time
+from collections import deque
+from core.tracing import get_logger, span
+
+log = get_logger("ffmpeg")
+
+# Segundos sin recibir progreso antes de considerar que ffmpeg se ha colgado
+STALL_TIMEOUT = float(os.environ.get("AI_SHORTS_FFMPEG_STALL_TIMEOUT", "120"))
+
+
+class FFmpegStalled(RuntimeError):
+    pass
+
+
+def parse_progress(block):
+    """
+    Convierte un bloque de `-progress pipe:1` (pares clave=valor terminados en 'progress=')
+    en un dict numérico: frame, fps, speed, out_time (segundos).
+    """
+    stats = {}
+    for key, cast in (("frame", int), ("fps", float)):
+        try:
+            stats[key] = cast(block[key])
+        except (KeyError, ValueError):
+            pass
+    speed = block.get("speed", "N/A").strip().rstrip("x")
+    try:
+        stats["speed"] = float(speed)
+    except ValueError:
+        pass
+    # out_time_ms está en microsegundos (bug histórico de ffmpeg); preferimos out_time_us
+    for key in ("out_time_us", "out_time_ms"):
+        try:
+            stats["out_time"] = int(block[key]) / 1e6
+            break
+        except (KeyError, ValueError):
+            continue
+    return stats
+
+
+def _drain(stream, tail):
+    for raw in iter(stream.readline, b""):
+        line = raw.decode("utf-8", errors="replace").strip()
+        if line:
+            tail.append(line)
+    stream.close()
+
+
+def run_ffmpeg(cmd, label="ffmpeg", progress=None, stall_timeout=STALL_TIMEOUT):
+    """
+    Ejecuta ffmpeg con `-progress pipe:1` y parsea frame/fps/speed/out_time en tiempo real.
+    - progress: StageProgress opcional que recibe el avance (ETA y factor de tiempo real).
+    - stall_timeout: si no llega progreso en ese tiempo se mata el proceso (FFmpegStalled).
+    Registra la línea de comando y las últimas estadísticas en el span.
+    Devuelve esas estadísticas más "log_tail" (últimas líneas de stderr, p.ej. para leer
+    el informe de loudnorm). Lanza CalledProcessError con la cola del log si ffmpeg falla.
+    """
+    cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+    cmdline = shlex.join(cmd)
+    with span(f"ffmpeg.{label}", cmd=cmdline) as sp:
+        log.info(f"ffmpeg[{label}]: {cmdline}")
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        tail = deque(maxlen=40)
+        drain = threading.Thread(target=_drain, args=(proc.stderr, tail), daemon=True)
+        drain.start()
+
+        last_seen = [time.monotonic()]
+        stalled = threading.Event()
+
+        def watchdog():
+            while proc.poll() is None:
+                if time.monotonic() - last_seen[0] > stall_timeout:
+                    stalled.set()
+                    proc.kill()
+                    return
+                time.sleep(1.0)
+
+        threading.Thread(target=watchdog, daemon=True).start()
+
+        stats, block = {}, {}
+        for raw in iter(proc.stdout.readline, b""):
+            key, _, value = raw.decode("utf-8", errors="replace").strip().partition("=")
+            if not key:
+                continue
+            block[key] = value
+            if key == "progress":
+                last_seen[0] = time.monotonic()
+                stats = parse_progress(block) or stats
+                if progress is not None and "out_time" in stats:
+                    progress.advance(stats["out_time"], speed=stats.get("speed"))
+                block = {}
+        proc.stdout.close()
+        rc = proc.wait()
+        drain.join(timeout=5.0)  # la cola de stderr debe estar completa antes de usarla
+        elapsed = time.perf_counter() - t0
+        sp.set(returncode=rc, elapsed=round(elapsed, 3), stalled=stalled.is_set(), **stats)
+
+        if stalled.is_set():
+            log.error(f"ffmpeg[{label}] sin progreso durante {stall_timeout:.0f}s: proceso terminado")
+            raise FFmpegStalled(f"ffmpeg[{label}] bloqueado (sin progreso en {stall_timeout:.0f}s)")
+        if rc != 0:
+            log.warning(f"ffmpeg[{label}] falló (rc={rc}) en {elapsed:.2f}s")
+            raise subprocess.CalledProcessError(rc, cmd, stderr="\n".join(tail))
+        log.info(
+            f"ffmpeg[{label}] {elapsed:.2f}s | frames={stats.get('frame', '-')} "
+            f"fps={stats.get('fps', '-')} speed={stats.get('speed', '-')}x"
+        )
+        stats["log_tail"] = list(tail)
+        return stats
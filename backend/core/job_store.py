@@ -0,0 +1,365 @@
+import hashlib, json, os, re, sqlite3, threading, time
+
+# Estados posibles de cada fila de un batch
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id   TEXT PRIMARY KEY,
+    filename   TEXT,
+    created_at REAL NOT NULL,
+    total_rows INTEGER NOT NULL DEFAULT 0,
+    ingested   INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS batch_rows (
+    batch_id    TEXT NOT NULL,
+    row_idx     INTEGER NOT NULL,
+    payload     TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    error       TEXT,
+    output_path TEXT,
+    updated_at  REAL,
+    PRIMARY KEY (batch_id, row_idx)
+);
+CREATE INDEX IF NOT EXISTS idx_rows_status ON batch_rows (batch_id, status, row_idx);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id      TEXT PRIMARY KEY,
+    job_key     TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    output_path TEXT,
+    error       TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs (job_key, status, updated_at);
+CREATE TABLE IF NOT EXISTS job_rows (
+    job_id   TEXT NOT NULL,
+    batch_id TEXT NOT NULL,
+    row_idx  INTEGER NOT NULL,
+    PRIMARY KEY (batch_id, row_idx)
+);
+CREATE INDEX IF NOT EXISTS idx_job_rows_job ON job_rows (job_id);
+"""
+
+# Columnas añadidas después de la primera versión del esquema (bases ya existentes)
+_MIGRATIONS = [
+    "ALTER TABLE jobs ADD COLUMN outputs TEXT",  # JSON {variante: ubicación} de los jobs con variantes
+    "ALTER TABLE batches ADD COLUMN error TEXT",  # motivo si la ingesta del CSV se abortó
+]
+
+
+def relocate_db(old_path, new_path):
+    """
+    Mueve una base SQLite (con sus -wal/-shm) de su ubicación antigua a la nueva si aún
+    no existe allí. Usado al sacar las bases del directorio servido en /assets.
+    """
+    if not os.path.exists(old_path) or os.path.exists(new_path):
+        return False
+    os.makedirs(os.path.dirname(os.path.abspath(new_path)), exist_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(old_path + suffix):
+            os.replace(old_path + suffix, new_path + suffix)
+    return True
+
+
+def _norm(value):
+    return re.sub(r"\s+", " ", str(value or "")).strip()
+
+
+def make_job_key(text, profile=None, keywords=None, layout=None, extra=None):
+    """
+    Clave de deduplicación: mismo texto, perfil, keywords y layout => mismo video.
+    `extra` distingue otras opciones de salida (p.ej. partir en shorts); sin él la clave no cambia.
+    Es independiente del job_id (que siempre es un UUID).
+    """
+    parts = [
+        _norm(text),
+        _norm(profile).lower() or "default",
+        _norm(keywords).replace(";", ",").lower(),
+        _norm(layout).lower(),
+    ]
+    if extra:
+        parts.append(_norm(extra))
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class JobStore:
+    """
+    Almacén durable (SQLite) del estado de batches y jobs.
+    Cada fila del CSV se guarda con su estado para poder reanudar
+    un batch tras un reinicio sin repetir las filas ya terminadas.
+    La tabla de jobs hace de índice de salidas para la deduplicación; job_rows enlaza
+    cada fila con el job (en un worker) del que espera el resultado.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = os.path.abspath(db_path)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        for sql in _MIGRATIONS:
+            try:
+                self._conn.execute(sql)
+            except sqlite3.OperationalError:
+                pass  # ya aplicada
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # --- BATCHES ---
+    def create_batch(self, batch_id, filename=None):
+        self._execute(
+            "INSERT INTO batches (batch_id, filename, created_at) VALUES (?, ?, ?)",
+            (batch_id, filename, time.time()),
+        )
+
+    def add_rows(self, batch_id, rows):
+        """Inserta un bloque de filas [(row_idx, dict)] en una sola transacción."""
+        now = time.time()
+        data = [(batch_id, idx, json.dumps(payload, ensure_ascii=False), now) for idx, payload in rows]
+        if not data:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                cur = self._conn.executemany(
+                    "INSERT OR IGNORE INTO batch_rows (batch_id, row_idx, payload, updated_at) VALUES (?, ?, ?, ?)",
+                    data,
+                )
+                # Solo las filas realmente insertadas (las repetidas se ignoran)
+                self._conn.execute(
+                    "UPDATE batches SET total_rows = total_rows + ? WHERE batch_id = ?", (cur.rowcount, batch_id)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def finish_ingest(self, batch_id):
+        self._execute("UPDATE batches SET ingested = 1 WHERE batch_id = ?", (batch_id,))
+
+    def abort_ingest(self, batch_id, error):
+        """
+        CSV inválido: las filas aún pendientes fallan con `error` y el batch queda cerrado con él
+        (las ya enviadas a un worker siguen su curso). Un batch sin ninguna fila se borra.
+        """
+        error = str(error)[:2000]
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                has_rows = self._conn.execute(
+                    "SELECT 1 FROM batch_rows WHERE batch_id = ? LIMIT 1", (batch_id,)
+                ).fetchone()
+                if has_rows:
+                    self._conn.execute(
+                        "UPDATE batch_rows SET status = ?, error = ?, updated_at = ? WHERE batch_id = ? AND status = ?",
+                        (FAILED, error, now, batch_id, PENDING),
+                    )
+                    self._conn.execute(
+                        "UPDATE batches SET ingested = 1, error = ? WHERE batch_id = ?", (error, batch_id)
+                    )
+                else:
+                    self._conn.execute("DELETE FROM batches WHERE batch_id = ?", (batch_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return bool(has_rows)
+
+    def unfinished_batches(self):
+        """Batches con filas pendientes o interrumpidas (running)."""
+        rows = self._execute(
+            "SELECT DISTINCT batch_id FROM batch_rows WHERE status IN (?, ?)", (PENDING, RUNNING)
+        )
+        return [r[0] for r in rows]
+
+    def reset_interrupted(self, batch_id):
+        """Las filas que quedaron en 'running' tras un reinicio vuelven a 'pending'."""
+        self._execute(
+            "UPDATE batch_rows SET status = ?, updated_at = ? WHERE batch_id = ? AND status = ?",
+            (PENDING, time.time(), batch_id, RUNNING),
+        )
+
+    # --- FILAS ---
+    def claim_next(self, batch_id):
+        """Toma la siguiente fila pendiente (en orden) y la marca como 'running'."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT row_idx, payload FROM batch_rows WHERE batch_id = ? AND status = ? ORDER BY row_idx LIMIT 1",
+                (batch_id, PENDING),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE batch_rows SET status = ?, error = NULL, updated_at = ? WHERE batch_id = ? AND row_idx = ?",
+                (RUNNING, time.time(), batch_id, row[0]),
+            )
+        return row[0], json.loads(row[1])
+
+    def mark_done(self, batch_id, row_idx, output_path=None):
+        self._execute(
+            "UPDATE batch_rows SET status = ?, output_path = ?, updated_at = ? WHERE batch_id = ? AND row_idx = ?",
+            (DONE, output_path, time.time(), batch_id, row_idx),
+        )
+
+    def mark_failed(self, batch_id, row_idx, error):
+        self._execute(
+            "UPDATE batch_rows SET status = ?, error = ?, updated_at = ? WHERE batch_id = ? AND row_idx = ?",
+            (FAILED, str(error)[:2000], time.time(), batch_id, row_idx),
+        )
+
+    def retry_failed(self, batch_id):
+        self._execute(
+            "UPDATE batch_rows SET status = ?, updated_at = ? WHERE batch_id = ? AND status = ?",
+            (PENDING, time.time(), batch_id, FAILED),
+        )
+
+    # --- JOBS E ÍNDICE DE SALIDAS ---
+    def create_job(self, job_id, job_key):
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO jobs (job_id, job_key, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, job_key, RUNNING, now, now),
+        )
+
+    def find_or_create_job(self, job_id, job_key):
+        """
+        Busca un job en curso para la clave y, si no hay, crea `job_id`, todo en una transacción:
+        dos peticiones idénticas simultáneas nunca crean dos jobs. Devuelve (job_id, creado).
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT job_id FROM jobs WHERE job_key = ? AND status = ? ORDER BY created_at DESC LIMIT 1",
+                    (job_key, RUNNING),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute(
+                        "INSERT INTO jobs (job_id, job_key, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                        (job_id, job_key, RUNNING, now, now),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return (row[0], False) if row else (job_id, True)
+
+    def _finish_job(self, job_id, status, output_path=None, error=None, outputs=None):
+        """Cierra el job y, en la misma transacción, las filas de batch que esperaban por él."""
+        now = time.time()
+        outputs = json.dumps(outputs, ensure_ascii=False) if outputs else None
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, output_path = ?, outputs = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                    (status, output_path, outputs, error, now, job_id),
+                )
+                self._conn.execute(
+                    "UPDATE batch_rows SET status = ?, output_path = ?, error = ?, updated_at = ? "
+                    "WHERE (batch_id, row_idx) IN (SELECT batch_id, row_idx FROM job_rows WHERE job_id = ?)",
+                    (status, output_path, error, now, job_id),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def finish_job(self, job_id, output_path, outputs=None):
+        """`outputs` ({variante: ubicación}) solo en jobs con variantes; output_path es la primera."""
+        self._finish_job(job_id, DONE, output_path=output_path, outputs=outputs)
+
+    def fail_job(self, job_id, error):
+        self._finish_job(job_id, FAILED, error=str(error)[:2000])
+
+    def attach_row(self, job_id, batch_id, row_idx):
+        """
+        La fila del batch queda a la espera del job (que corre en un worker). Si el job ya
+        terminó entre medias, la fila se cierra en el acto con su resultado.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_rows (job_id, batch_id, row_idx) VALUES (?, ?, ?)",
+                (job_id, batch_id, row_idx),
+            )
+            row = self._conn.execute(
+                "SELECT status, output_path, error FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row and row[0] in (DONE, FAILED):
+                self._conn.execute(
+                    "UPDATE batch_rows SET status = ?, output_path = ?, error = ?, updated_at = ? "
+                    "WHERE batch_id = ? AND row_idx = ?",
+                    (row[0], row[1], row[2], time.time(), batch_id, row_idx),
+                )
+
+    def find_running(self, job_key):
+        """job_id de un render en curso (en cola o en un worker) para esta clave."""
+        rows = self._execute(
+            "SELECT job_id FROM jobs WHERE job_key = ? AND status = ? ORDER BY created_at DESC LIMIT 1",
+            (job_key, RUNNING),
+        )
+        return rows[0][0] if rows else None
+
+    def running_jobs(self, created_before=None):
+        """job_ids en curso; con `created_before`, solo los creados antes de ese instante."""
+        if created_before is None:
+            return [r[0] for r in self._execute("SELECT job_id FROM jobs WHERE status = ?", (RUNNING,))]
+        return [r[0] for r in self._execute(
+            "SELECT job_id FROM jobs WHERE status = ? AND created_at < ?", (RUNNING, created_before)
+        )]
+
+    def get_job(self, job_id):
+        rows = self._execute(
+            "SELECT job_id, job_key, status, output_path, outputs, error, created_at, updated_at FROM jobs WHERE job_id = ?",
+            (job_id,),
+        )
+        if not rows:
+            return None
+        keys = ("job_id", "job_key", "status", "output_path", "outputs", "error", "created_at", "updated_at")
+        job = dict(zip(keys, rows[0]))
+        job["outputs"] = json.loads(job["outputs"]) if job["outputs"] else None
+        return job
+
+    def find_output(self, job_key, exists=os.path.exists):
+        """Último render completado para esta clave cuyo archivo siga existiendo (según `exists`)."""
+        rows = self._execute(
+            "SELECT job_id, output_path, outputs FROM jobs WHERE job_key = ? AND status = ? ORDER BY updated_at DESC",
+            (job_key, DONE),
+        )
+        for job_id, path, outputs in rows:
+            outputs = json.loads(outputs) if outputs else None
+            # Con variantes, todas deben seguir existiendo
+            if path and exists(path) and all(exists(p) for p in (outputs or {}).values()):
+                return {"job_id": job_id, "output_path": path, "outputs": outputs}
+        return None
+
+    def batch_status(self, batch_id):
+        meta = self._execute(
+            "SELECT filename, created_at, total_rows, ingested, error FROM batches WHERE batch_id = ?", (batch_id,)
+        )
+        if not meta:
+            return None
+        filename, created_at, total, ingested, ingest_error = meta[0]
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for status, n in self._execute(
+            "SELECT status, COUNT(*) FROM batch_rows WHERE batch_id = ? GROUP BY status", (batch_id,)
+        ):
+            counts[status] = n
+        errors = [
+            {"row": idx, "error": err}
+            for idx, err in self._execute(
+                "SELECT row_idx, error FROM batch_rows WHERE batch_id = ? AND status = ? ORDER BY row_idx LIMIT 50",
+                (batch_id, FAILED),
+            )
+        ]
+        return {
+            "batch_id": batch_id, "filename": filename, "created_at": created_at,
+            "rows": total, "ingested": bool(ingested), "ingest_error": ingest_error, **counts, "errors": errors,
+        }
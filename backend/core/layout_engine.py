@@ -8,3 +8,16 @@ def compute_zones(profile: dict):
         "subs": box(z["subs"]["y0"], z["subs"]["y1"]),
         "persona": (0, int(h*z["persona"]["y0"]), w, h)
     }
+
+# Lado del clip de stock superpuesto en full_screen, sobre el lienzo de referencia 1080x1920
+STOCK_SIDE_FULL_SCREEN = 600
+
+def stock_layer_side(profile: dict, layout_mode=None, canvas_size=None):
+    """Lado (px) que ocupa en pantalla la capa de stock en el layout y lienzo dados."""
+    ref_w, ref_h = profile["video"]["size"]
+    w, h = canvas_size or (ref_w, ref_h)
+    if str(layout_mode).lower() == "full_screen":
+        scale = float(profile.get("layout", {}).get("stock", {}).get("scale", 1.0))
+        return int(STOCK_SIDE_FULL_SCREEN * scale * h / 1920)
+    x0, y0, x1, y1 = compute_zones(profile)["stock"]
+    return int(max((x1 - x0) * w / ref_w, (y1 - y0) * h / ref_h))
@@ -0,0 +1,205 @@
+"""
+Ciclo de vida de los modelos pesados (Whisper, spaCy, voces de Piper, clientes externos).
+
+Cada módulo registra su modelo con un loader; nada se importa ni se carga hasta el
+primer uso o hasta el warm-up explícito del arranque. Los modelos con `idle_ttl` que
+lleven ese tiempo sin usarse (y sin usos en curso) se descargan para liberar memoria.
+
+Configuración (variables de entorno):
+  AI_SHORTS_WARMUP          modelos a precargar al arrancar ("whisper,spacy,piper", "none")
+  AI_SHORTS_MODEL_IDLE_TTL  segundos de inactividad antes de descargar (0 = nunca)
+"""
+import gc, os, sys, threading, time
+from contextlib import contextmanager
+from core.tracing import get_logger, span
+
+log = get_logger("models")
+
+DEFAULT_WARMUP = "whisper,spacy,piper"
+IDLE_TTL = float(os.environ.get("AI_SHORTS_MODEL_IDLE_TTL", "1800"))
+
+
+def warmup_names():
+    raw = os.environ.get("AI_SHORTS_WARMUP", DEFAULT_WARMUP).strip().lower()
+    if raw in ("", "none", "off", "0"):
+        return []
+    return [name.strip() for name in raw.split(",") if name.strip()]
+
+
+class _Entry:
+    __slots__ = ("name", "loader", "unloader", "idle_ttl", "optional", "value", "loaded", "loading",
+                 "error", "load_seconds", "loaded_at", "last_used", "uses", "in_use", "lock")
+
+    def __init__(self, name, loader, unloader, idle_ttl, optional=False):
+        self.name = name
+        self.loader = loader
+        self.unloader = unloader
+        self.idle_ttl = idle_ttl
+        self.optional = optional
+        self.value = None
+        self.loaded = False
+        self.loading = False
+        self.error = None
+        self.load_seconds = None
+        self.loaded_at = None
+        self.last_used = None
+        self.uses = 0
+        self.in_use = 0
+        self.lock = threading.Lock()  # serializa carga/descarga de este modelo
+
+    def as_dict(self):
+        return {
+            "loaded": self.loaded, "loading": self.loading, "error": self.error,
+            "load_seconds": self.load_seconds, "loaded_at": self.loaded_at,
+            "last_used": self.last_used, "uses": self.uses, "in_use": self.in_use,
+            "idle_ttl": self.idle_ttl, "optional": self.optional,
+        }
+
+
+_lock = threading.Lock()
+_entries = {}
+_warmup = {"requested": [], "started_at": None, "finished_at": None}
+
+
+def register(name, loader, unloader=None, idle_ttl=IDLE_TTL, optional=False):
+    """
+    Registra un modelo. `loader()` devuelve el objeto; `unloader(obj)` lo libera (opcional).
+    idle_ttl=None: el modelo nunca se descarga por inactividad.
+    optional=True: si falla en el warm-up no bloquea is_ready() (hay alternativa, p.ej. un fallback).
+    """
+    with _lock:
+        if name not in _entries:
+            _entries[name] = _Entry(name, loader, unloader, idle_ttl or None, optional)
+        return _entries[name]
+
+
+def _entry(name):
+    with _lock:
+        entry = _entries.get(name)
+    if entry is None:
+        raise KeyError(f"Modelo no registrado: {name}")
+    return entry
+
+
+def _load(entry):
+    # Llamar con entry.lock tomado
+    if entry.loaded:
+        return entry.value
+    entry.loading = True
+    t0 = time.perf_counter()
+    try:
+        with span("model.load", model=entry.name):
+            entry.value = entry.loader()
+    except Exception as e:
+        entry.error = f"{type(e).__name__}: {e}"
+        log.error(f"❌ No se pudo cargar el modelo '{entry.name}': {e}")
+        raise
+    finally:
+        entry.loading = False
+    entry.load_seconds = round(time.perf_counter() - t0, 3)
+    entry.loaded, entry.error, entry.loaded_at = True, None, time.time()
+    log.info(f"🧠 Modelo '{entry.name}' cargado en {entry.load_seconds:.2f}s")
+    return entry.value
+
+
+def get(name):
+    """Devuelve el modelo (cargándolo si hace falta). Para usos largos, mejor `use()`."""
+    entry = _entry(name)
+    with entry.lock:
+        value = _load(entry)
+        entry.uses += 1
+        entry.last_used = time.time()
+    return value
+
+
+@contextmanager
+def use(name):
+    """Como get(), pero el modelo no puede descargarse mientras dure el bloque."""
+    entry = _entry(name)
+    with entry.lock:
+        value = _load(entry)
+        entry.uses += 1
+        entry.in_use += 1
+    try:
+        yield value
+    finally:
+        with entry.lock:
+            entry.in_use -= 1
+            entry.last_used = time.time()
+
+
+def unload(name):
+    entry = _entry(name)
+    with entry.lock:
+        if not entry.loaded or entry.in_use:
+            return False
+        value, entry.value, entry.loaded = entry.value, None, False
+        try:
+            if entry.unloader:
+                entry.unloader(value)
+        except Exception as e:
+            log.warning(f"⚠️ Error liberando '{name}': {e}")
+        del value
+    gc.collect()
+    release_gpu_cache()
+    log.info(f"🧹 Modelo '{name}' descargado")
+    return True
+
+
+def evict_idle(now=None):
+    """Descarga los modelos cuyo último uso supera su idle_ttl. Devuelve sus nombres."""
+    now = now or time.time()
+    with _lock:
+        entries = list(_entries.values())
+    evicted = []
+    for entry in entries:
+        if not entry.idle_ttl or not entry.loaded or entry.in_use:
+            continue
+        last = entry.last_used or entry.loaded_at or now
+        if now - last > entry.idle_ttl and unload(entry.name):
+            evicted.append(entry.name)
+    return evicted
+
+
+def warm_up(names=None):
+    """Carga (bloqueante) los modelos pedidos; los errores quedan en status()."""
+    names = warmup_names() if names is None else list(names)
+    with _lock:
+        _warmup.update(requested=names, started_at=time.time(), finished_at=None)
+    for name in names:
+        try:
+            get(name)
+        except KeyError:
+            log.warning(f"⚠️ Warm-up: modelo desconocido '{name}'")
+        except Exception:
+            pass  # ya registrado en entry.error
+    with _lock:
+        _warmup["finished_at"] = time.time()
+
+
+def is_ready():
+    """
+    Listo cuando el warm-up terminó y todos los modelos pedidos se cargaron sin error; los
+    opcionales que fallaron no cuentan (el error sigue visible en status()).
+    Una descarga posterior por inactividad no cambia la disponibilidad (se recargan al usarse).
+    """
+    with _lock:
+        if _warmup["finished_at"] is None:
+            return False
+        requested = [_entries.get(n) for n in _warmup["requested"]]
+    return all(e is not None and ((e.loaded_at is not None and e.error is None) or (e.optional and e.error))
+               for e in requested)
+
+
+def status():
+    with _lock:
+        models = {name: e.as_dict() for name, e in _entries.items()}
+        warmup = dict(_warmup)
+    return {"ready": is_ready(), "warmup": warmup, "models": models}
+
+
+def release_gpu_cache():
+    """Vacía la caché de CUDA solo si torch ya está importado (no lo importa por nosotros)."""
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
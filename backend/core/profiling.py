@@ -0,0 +1,105 @@
+import contextlib, contextvars, cProfile, os, pstats, shutil, signal, subprocess, time
+from core.tracing import span
+
+# Recorder activo en el contexto actual (None = profiling desactivado, coste casi nulo)
+_recorder = contextvars.ContextVar("stage_recorder", default=None)
+
+
+class StageRecorder:
+    """
+    Acumula la duración de cada etapa del pipeline (una etapa puede ejecutarse varias veces,
+    p.ej. 'download' una vez por clip). Opcionalmente captura cProfile o py-spy por etapa.
+    """
+
+    def __init__(self, capture=None, capture_dir=None):
+        if capture not in (None, "cprofile", "py-spy"):
+            raise ValueError(f"Modo de captura desconocido: {capture}")
+        if capture == "py-spy" and not shutil.which("py-spy"):
+            raise RuntimeError("py-spy no está instalado o no está en el PATH")
+        self.capture = capture
+        self.capture_dir = capture_dir
+        if capture:
+            os.makedirs(capture_dir, exist_ok=True)
+        self.stages = {}
+        self._profilers = {}
+        self._profiling = False
+        self._spy_count = 0
+
+    def add(self, name, elapsed):
+        st = self.stages.setdefault(name, {"total": 0.0, "calls": 0, "max": 0.0})
+        st["total"] += elapsed
+        st["calls"] += 1
+        st["max"] = max(st["max"], elapsed)
+
+    def as_dict(self):
+        return {k: {"total": round(v["total"], 4), "calls": v["calls"], "max": round(v["max"], 4)}
+                for k, v in self.stages.items()}
+
+    # --- CAPTURA ---
+    def _start_capture(self, name):
+        # Solo una etapa perfilada a la vez: las anidadas se cronometran pero no se perfilan
+        if not self.capture or self._profiling:
+            return None
+        self._profiling = True
+        if self.capture == "cprofile":
+            prof = self._profilers.setdefault(name, cProfile.Profile())
+            prof.enable()
+            return prof
+        self._spy_count += 1
+        out = os.path.join(self.capture_dir, f"{name}_{self._spy_count}.speedscope.json")
+        return subprocess.Popen(
+            ["py-spy", "record", "--pid", str(os.getpid()), "--format", "speedscope", "--output", out, "--rate", "200"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+    def _stop_capture(self, handle):
+        if handle is None:
+            return
+        self._profiling = False
+        if isinstance(handle, cProfile.Profile):
+            handle.disable()
+            return
+        handle.send_signal(signal.SIGINT)
+        try:
+            handle.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            handle.kill()
+
+    def dump_profiles(self):
+        """Guarda un .prof por etapa (abrible con snakeviz o pstats)."""
+        paths = {}
+        for name, prof in self._profilers.items():
+            path = os.path.join(self.capture_dir, f"{name}.prof")
+            pstats.Stats(prof).dump_stats(path)
+            paths[name] = path
+        return paths
+
+
+@contextlib.contextmanager
+def recording(recorder):
+    """Activa un StageRecorder para todo lo que se ejecute dentro del bloque."""
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Marca una etapa del pipeline: abre un span de traza y, si hay un StageRecorder
+    activo, cronometra (y perfila) la etapa. Sin ninguno de los dos no hace nada.
+    """
+    rec = _recorder.get()
+    with span(name) as sp:
+        if rec is None:
+            yield sp
+            return
+        handle = rec._start_capture(name)
+        t0 = time.perf_counter()
+        try:
+            yield sp
+        finally:
+            rec.add(name, time.perf_counter() - t0)
+            rec._stop_capture(handle)
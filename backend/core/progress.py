@@ -0,0 +1,133 @@
+"""
+Progreso por job: etapa actual, porcentaje global, ETA y factor de tiempo real
+(segundos de vídeo procesados por segundo de reloj).
+"""
+import threading, time
+from core.tracing import current_job_id, get_logger
+
+log = get_logger("progress")
+
+# Orden y peso aproximado (% del tiempo total) de cada etapa de un job
+STAGE_WEIGHTS = {
+    "tts": 5,
+    "transcribe": 10,
+    "assets": 25,
+    "movis_render": 40,
+    "subtitles": 1,
+    "final_encode": 19,
+}
+_STAGE_ORDER = list(STAGE_WEIGHTS)
+_TOTAL_WEIGHT = float(sum(STAGE_WEIGHTS.values()))
+
+# Los jobs terminados se olvidan pasado este tiempo
+RETENTION_SECONDS = 3600
+
+_lock = threading.Lock()
+_jobs = {}
+_listeners = {}
+
+
+def start_job(job_id):
+    with _lock:
+        cutoff = time.time() - RETENTION_SECONDS
+        for old in [k for k, v in _jobs.items() if v["status"] != "running" and v["updated_at"] < cutoff]:
+            _jobs.pop(old, None)
+            _listeners.pop(old, None)
+        _jobs[job_id] = {
+            "job_id": job_id, "status": "running", "stage": None, "stage_fraction": 0.0,
+            "percent": 0.0, "eta": None, "stage_eta": None, "realtime_factor": None,
+            "started_at": time.time(), "updated_at": time.time(),
+        }
+
+
+def finish_job(job_id, status="done"):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job:
+            job.update(status=status, updated_at=time.time(), eta=0.0 if status == "done" else None)
+            if status == "done":
+                job["percent"] = 100.0
+    _notify(job_id)
+
+
+def discard(job_id):
+    with _lock:
+        _jobs.pop(job_id, None)
+        _listeners.pop(job_id, None)
+
+
+def add_listener(job_id, callback):
+    """callback(snapshot) se invoca en cada actualización del job (desde cualquier hilo)."""
+    with _lock:
+        _listeners.setdefault(job_id, []).append(callback)
+
+
+def get(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def snapshot():
+    with _lock:
+        return {k: dict(v) for k, v in _jobs.items()}
+
+
+def _notify(job_id):
+    with _lock:
+        callbacks = list(_listeners.get(job_id, ()))
+        job = dict(_jobs[job_id]) if job_id in _jobs else None
+    for cb in callbacks:
+        try:
+            cb(job)
+        except Exception as e:
+            log.warning(f"Listener de progreso falló: {e}")
+
+
+def update(stage, fraction, stage_eta=None, realtime_factor=None, job_id=None):
+    """Actualiza la etapa actual del job (por defecto el del contexto) y recalcula % y ETA."""
+    job_id = job_id or current_job_id()
+    if job_id is None:
+        return
+    fraction = min(max(float(fraction), 0.0), 1.0)
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            # Jobs sin start_job explícito (p.ej. /export) se registran al vuelo
+            job = _jobs[job_id] = {"job_id": job_id, "status": "running", "started_at": time.time()}
+        done = sum(STAGE_WEIGHTS[s] for s in _STAGE_ORDER[:_STAGE_ORDER.index(stage)]) if stage in STAGE_WEIGHTS else 0
+        percent = (done + STAGE_WEIGHTS.get(stage, 0) * fraction) / _TOTAL_WEIGHT * 100
+        elapsed = time.time() - job["started_at"]
+        job.update(
+            stage=stage, stage_fraction=round(fraction, 4), percent=round(percent, 1),
+            stage_eta=None if stage_eta is None else round(stage_eta, 1),
+            realtime_factor=None if realtime_factor is None else round(realtime_factor, 3),
+            # ETA global: extrapolación lineal del tiempo transcurrido
+            eta=round(elapsed / percent * (100 - percent), 1) if percent > 1 else None,
+            updated_at=time.time(),
+        )
+    _notify(job_id)
+
+
+class StageProgress:
+    """
+    Seguimiento de una etapa medida en segundos de media (render/encode).
+    `advance(media_time)` calcula fracción, factor de tiempo real y ETA de la etapa.
+    """
+
+    def __init__(self, stage, total, job_id=None):
+        self.stage = stage
+        self.total = max(float(total or 0.0), 1e-6)
+        self.job_id = job_id or current_job_id()
+        self.t0 = time.perf_counter()
+        self.realtime_factor = None
+        self.eta = None
+        update(stage, 0.0, job_id=self.job_id)
+
+    def advance(self, media_time, speed=None):
+        media_time = min(max(float(media_time or 0.0), 0.0), self.total)
+        elapsed = time.perf_counter() - self.t0
+        rate = speed if speed else (media_time / elapsed if elapsed > 0 else None)
+        self.realtime_factor = rate
+        self.eta = (self.total - media_time) / rate if rate else None
+        update(self.stage, media_time / self.total, stage_eta=self.eta, realtime_factor=rate, job_id=self.job_id)
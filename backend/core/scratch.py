@@ -0,0 +1,155 @@
+"""
+Espacio de trabajo temporal (scratch) de los jobs.
+
+Todo lo intermedio de un job (descargas, clips transcodificados, voz, timeline, visual_raw,
+subtítulos y render final) vive en <raíz>/<job_id> y se borra al terminar, en segundo plano.
+
+Configuración:
+- AI_SHORTS_SCRATCH_DIR: raíz del scratch. "tmpfs" usa /dev/shm/ai_shorts (RAM). Sin definir
+  se usa AI_SHORTS_JOBS_DIR o assets/jobs (necesario si /export corre en otro nodo).
+- AI_SHORTS_SCRATCH_MIN_FREE_MB: con tmpfs, si queda menos espacio libre se usa el disco (2048).
+- AI_SHORTS_SCRATCH_STALE_HOURS: sweep() borra directorios de jobs abandonados más viejos (24).
+- AI_SHORTS_SCRATCH_SWEEP_INTERVAL: cada cuántos segundos el worker llama a sweep() (3600).
+"""
+import os, queue, shutil, threading, time, uuid
+from core.tracing import get_logger
+
+log = get_logger("scratch")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DISK_ROOT = os.environ.get("AI_SHORTS_JOBS_DIR") or os.path.join(BASE_DIR, "assets", "jobs")
+TMPFS_ROOT = "/dev/shm/ai_shorts"
+MIN_FREE_MB = int(os.environ.get("AI_SHORTS_SCRATCH_MIN_FREE_MB", "2048"))
+STALE_HOURS = float(os.environ.get("AI_SHORTS_SCRATCH_STALE_HOURS", "24"))
+SWEEP_INTERVAL = float(os.environ.get("AI_SHORTS_SCRATCH_SWEEP_INTERVAL", "3600"))
+TRASH = ".trash"
+DELETE_RETRIES = 3  # en Windows ffmpeg puede tardar en soltar los archivos
+
+_root = None
+_lock = threading.Lock()
+_pending = queue.Queue()
+_deleter = None
+_stats = {"jobs_released": 0, "bytes_released": 0, "peak_job_bytes": 0}
+
+
+def _resolve_root():
+    wanted = os.environ.get("AI_SHORTS_SCRATCH_DIR", "")
+    if wanted.lower() != "tmpfs":
+        return os.path.abspath(wanted or DISK_ROOT)
+    if os.path.isdir(os.path.dirname(TMPFS_ROOT)):
+        free_mb = shutil.disk_usage(os.path.dirname(TMPFS_ROOT)).free // (1024 * 1024)
+        if free_mb >= MIN_FREE_MB:
+            return TMPFS_ROOT
+        log.warning(f"⚠️ tmpfs con {free_mb} MB libres (< {MIN_FREE_MB}): scratch en disco")
+    else:
+        log.warning(f"⚠️ {os.path.dirname(TMPFS_ROOT)} no existe: scratch en disco")
+    return os.path.abspath(DISK_ROOT)
+
+
+def root():
+    global _root
+    with _lock:
+        if _root is None:
+            _root = _resolve_root()
+            os.makedirs(_root, exist_ok=True)
+            log.info(f"🗂️ Scratch de jobs en {_root}")
+        return _root
+
+
+def job_dir(job_id):
+    path = os.path.join(root(), job_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def usage(path):
+    """Bytes ocupados bajo `path` (sin seguir enlaces)."""
+    total = 0
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        total += usage(entry.path)
+                    else:
+                        total += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    pass
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    return total
+
+
+def _delete_loop():
+    while True:
+        path = _pending.get()
+        for attempt in range(DELETE_RETRIES):
+            shutil.rmtree(path, ignore_errors=True)
+            if not os.path.exists(path):
+                break
+            time.sleep(1.0 + attempt)
+        else:
+            log.warning(f"⚠️ No se pudo borrar {path}")
+        _pending.task_done()
+
+
+def _discard(path):
+    global _deleter
+    with _lock:
+        if _deleter is None:
+            _deleter = threading.Thread(target=_delete_loop, name="scratch-cleanup", daemon=True)
+            _deleter.start()
+    _pending.put(path)
+
+
+def release(job_path):
+    """
+    Cierra el scratch del job sin bloquear: lo mide, lo renombra a la papelera (instantáneo)
+    y lo borra un hilo en segundo plano. Devuelve los bytes que ocupaba.
+    """
+    if not job_path or not os.path.isdir(job_path):
+        return 0
+    size = usage(job_path)
+    trash = os.path.join(os.path.dirname(job_path), TRASH)
+    target = os.path.join(trash, f"{os.path.basename(job_path)}-{uuid.uuid4().hex[:6]}")
+    try:
+        os.makedirs(trash, exist_ok=True)
+        os.replace(job_path, target)
+    except OSError:
+        target = job_path  # archivos aún abiertos (Windows): se reintenta en el hilo
+    _discard(target)
+    with _lock:
+        _stats["jobs_released"] += 1
+        _stats["bytes_released"] += size
+        _stats["peak_job_bytes"] = max(_stats["peak_job_bytes"], size)
+    log.info(f"🧹 Scratch liberado: {os.path.basename(job_path)} ({size / 1e6:.1f} MB)")
+    return size
+
+
+def sweep(max_age_hours=STALE_HOURS, keep=()):
+    """
+    Borra la papelera y los directorios de jobs sin tocar en `max_age_hours` (fallos, cortes).
+    `keep`: job_ids en curso, que nunca se tocan aunque lleven tiempo sin escribir.
+    """
+    base = root()
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for entry in os.scandir(base):
+        if not entry.is_dir(follow_symlinks=False) or entry.name in keep:
+            continue
+        try:
+            stale = entry.name == TRASH or entry.stat().st_mtime < cutoff
+        except OSError:
+            continue
+        if stale:
+            _discard(entry.path)
+            removed += 1
+    return removed
+
+
+def stats():
+    base = root()
+    disk = shutil.disk_usage(base)
+    with _lock:
+        return {"root": base, "tmpfs": base.startswith("/dev/shm"), "free_bytes": disk.free,
+                "pending_delete": _pending.qsize(), **_stats}
@@ -0,0 +1,85 @@
+"""
+Destino de los vídeos terminados.
+
+- LocalStorage: un directorio (por defecto ~/Documents/AI_Shorts_Finals). Devuelve rutas absolutas.
+- S3Storage: bucket S3 o compatible (MinIO...). Devuelve URIs s3://bucket/clave (requiere boto3).
+
+Configuración: AI_SHORTS_STORAGE_URL = file:///ruta | s3://bucket/prefijo
+"""
+import errno, os, shutil, uuid
+
+DEFAULT_ROOT = os.path.join(os.path.expanduser("~"), "Documents", "AI_Shorts_Finals")
+
+
+class LocalStorage:
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def put(self, local_path, key, move=False):
+        """
+        Copia `local_path` a `key` (relativa a la raíz) de forma atómica. Devuelve la ruta final.
+        Con move=True y el mismo sistema de archivos basta un rename (sin copiar el vídeo).
+        """
+        dst = os.path.join(self.root, *key.split("/"))
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if move:
+            try:
+                os.replace(local_path, dst)
+                return dst
+            except OSError as e:
+                if e.errno != errno.EXDEV:  # EXDEV: scratch en otro disco/tmpfs -> copia
+                    raise
+        tmp = f"{dst}.{uuid.uuid4().hex[:8]}.part"
+        shutil.copy2(local_path, tmp)
+        os.replace(tmp, dst)
+        if move:
+            os.remove(local_path)  # libera ya el tmpfs
+        return dst
+
+    def exists(self, location):
+        return bool(location) and os.path.exists(location)
+
+    def public_url(self, location):
+        return f"file://{location}"
+
+
+class S3Storage:
+    def __init__(self, bucket, prefix=""):
+        import boto3  # dependencia opcional
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client("s3", endpoint_url=os.environ.get("AI_SHORTS_S3_ENDPOINT") or None)
+
+    def _key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put(self, local_path, key, move=False):
+        full = self._key(key)
+        self.client.upload_file(local_path, self.bucket, full)
+        return f"s3://{self.bucket}/{full}"
+
+    def exists(self, location):
+        if not location or not location.startswith(f"s3://{self.bucket}/"):
+            return False
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=location[len(f"s3://{self.bucket}/"):])
+            return True
+        except Exception:
+            return False
+
+    def public_url(self, location):
+        key = location[len(f"s3://{self.bucket}/"):]
+        return self.client.generate_presigned_url("get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=86400)
+
+
+def make_storage(url=None):
+    url = url or os.environ.get("AI_SHORTS_STORAGE_URL")
+    if not url:
+        return LocalStorage()
+    if url.startswith("file://"):
+        return LocalStorage(url[len("file://"):])
+    if url.startswith("s3://"):
+        bucket, _, prefix = url[len("s3://"):].partition("/")
+        return S3Storage(bucket, prefix)
+    raise ValueError(f"AI_SHORTS_STORAGE_URL no soportada: {url}")
@@ -0,0 +1,248 @@
+"""
+Representación compacta de timelines de palabras y segmentos.
+
+- WordTimeline: array estructurado NumPy (inicio/fin en ms, ids de palabra, flags) + un
+  vocabulario de strings internados. ~17 bytes por palabra frente a ~1 KB de un dict.
+- SegmentTable: segmentos como rangos [first, first+count) sobre el timeline, con su
+  propio inicio/fin (el frontend puede editarlos).
+- dump()/load(): formato binario en disco (.tlb). El JSON queda solo para la API.
+"""
+import re, struct, sys
+import numpy as np
+
+FLAG_PUNCT = 1         # contiene . ! ? ,
+FLAG_SENTENCE_END = 2  # termina en . ! ?
+
+WORD_DTYPE = np.dtype([("start", "<u4"), ("end", "<u4"), ("word", "<u4"), ("raw", "<u4"), ("flags", "u1")])
+SEGMENT_DTYPE = np.dtype([("start", "<u4"), ("end", "<u4"), ("first", "<u4"), ("count", "<u4")])
+
+_PUNCT_RE = re.compile(r"[.!?,]")
+_SENTENCE_END_RE = re.compile(r"[.!?]\s*$")
+
+_MAGIC = b"AITL"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHIII")  # magic, versión, n_palabras, n_segmentos, bytes de vocabulario
+
+
+def _ms(seconds):
+    return max(0, int(round(float(seconds) * 1000)))
+
+
+def word_flags(raw):
+    flags = FLAG_PUNCT if _PUNCT_RE.search(raw) else 0
+    if _SENTENCE_END_RE.search(raw):
+        flags |= FLAG_SENTENCE_END
+    return flags
+
+
+class Vocabulary:
+    """Strings internados: cada palabra distinta se guarda una sola vez."""
+    __slots__ = ("strings", "_ids")
+
+    def __init__(self, strings=None):
+        self.strings = [sys.intern(s) for s in (strings or [])]
+        self._ids = {s: i for i, s in enumerate(self.strings)}
+
+    def add(self, s):
+        idx = self._ids.get(s)
+        if idx is None:
+            idx = self._ids[s] = len(self.strings)
+            self.strings.append(sys.intern(s))
+        return idx
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class TimelineBuilder:
+    """Acumula palabras una a una (p.ej. desde Whisper) y produce un WordTimeline."""
+    __slots__ = ("vocab", "_rows")
+
+    def __init__(self, vocab=None):
+        self.vocab = vocab or Vocabulary()
+        self._rows = []
+
+    def append(self, word, raw_word, start, end):
+        self._rows.append((_ms(start), _ms(end), self.vocab.add(word), self.vocab.add(raw_word), word_flags(raw_word)))
+
+    def build(self):
+        return WordTimeline(np.array(self._rows, dtype=WORD_DTYPE), self.vocab)
+
+
+def rebase_ms(data, offset_ms):
+    """
+    Resta `offset_ms` a los campos start/end (uint32) en int64 y recorta en 0: con tiempos no
+    monótonos (Whisper a veces los da) un valor menor que el offset no da la vuelta a 4e9.
+    """
+    for field in ("start", "end"):
+        data[field] = np.clip(data[field].astype(np.int64) - int(offset_ms), 0, None)
+    return data
+
+
+class WordTimeline:
+    __slots__ = ("data", "vocab")
+
+    def __init__(self, data, vocab):
+        self.data = data
+        self.vocab = vocab
+
+    @classmethod
+    def from_words(cls, words):
+        """Desde la lista de dicts {word, raw_word, start, end} (JSON de la API)."""
+        builder = TimelineBuilder()
+        for w in words:
+            builder.append(w["word"], w.get("raw_word", w["word"]), w["start"], w["end"])
+        return builder.build()
+
+    def __len__(self):
+        return len(self.data)
+
+    # --- Vistas numéricas ---
+    @property
+    def start_ms(self):
+        return self.data["start"]
+
+    @property
+    def end_ms(self):
+        return self.data["end"]
+
+    @property
+    def punct(self):
+        return (self.data["flags"] & FLAG_PUNCT).astype(bool)
+
+    @property
+    def sentence_end(self):
+        return (self.data["flags"] & FLAG_SENTENCE_END).astype(bool)
+
+    @property
+    def duration(self):
+        return float(self.data["end"].max()) / 1000 if len(self.data) else 0.0
+
+    # --- Acceso a texto ---
+    def words(self, first=0, last=None):
+        """Palabras (limpias) del rango [first, last)."""
+        strings = self.vocab.strings
+        return [strings[i] for i in self.data["word"][first:last].tolist()]
+
+    def text(self, first=0, last=None):
+        return " ".join(self.words(first, last))
+
+    def slice(self, first, last, offset_ms=0):
+        """Sub-timeline [first, last) con tiempos desplazados (comparte vocabulario)."""
+        data = self.data[first:last].copy()
+        if offset_ms:
+            rebase_ms(data, offset_ms)
+        return WordTimeline(data, self.vocab)
+
+    def to_words(self):
+        """Lista de dicts para la API/JSON."""
+        strings = self.vocab.strings
+        d = self.data
+        return [
+            {"word": strings[w], "raw_word": strings[r], "start": s / 1000, "end": e / 1000}
+            for s, e, w, r in zip(d["start"].tolist(), d["end"].tolist(), d["word"].tolist(), d["raw"].tolist())
+        ]
+
+
+class SegmentTable:
+    __slots__ = ("timeline", "data")
+
+    def __init__(self, timeline, data):
+        self.timeline = timeline
+        self.data = data
+
+    @classmethod
+    def from_bounds(cls, timeline, first, last):
+        """Segmentos a partir de índices de primera/última palabra (ver modules.segmenter)."""
+        data = np.empty(len(first), dtype=SEGMENT_DTYPE)
+        data["first"] = first
+        data["count"] = np.asarray(last) - np.asarray(first) + 1
+        data["start"] = timeline.start_ms[first]
+        data["end"] = timeline.end_ms[last]
+        return cls(timeline, data)
+
+    @classmethod
+    def from_json(cls, segments):
+        """Desde la lista de segmentos JSON de la API (/export)."""
+        builder, rows = TimelineBuilder(), []
+        for seg in segments:
+            first = len(builder._rows)
+            for w in seg.get("words", []):
+                builder.append(w["word"], w.get("raw_word", w["word"]), w["start"], w["end"])
+            rows.append((_ms(seg["start"]), _ms(seg["end"]), first, len(builder._rows) - first))
+        return cls(builder.build(), np.array(rows, dtype=SEGMENT_DTYPE))
+
+    def __len__(self):
+        return len(self.data)
+
+    def start(self, i):
+        return int(self.data["start"][i]) / 1000
+
+    def end(self, i):
+        return int(self.data["end"][i]) / 1000
+
+    @property
+    def starts(self):
+        """Inicios en segundos (float64) de todos los segmentos."""
+        return self.data["start"] / 1000.0
+
+    @property
+    def ends(self):
+        return self.data["end"] / 1000.0
+
+    def word_range(self, i):
+        first = int(self.data["first"][i])
+        return first, first + int(self.data["count"][i])
+
+    def phrase(self, i):
+        return self.timeline.text(*self.word_range(i))
+
+    def phrases(self):
+        return [self.phrase(i) for i in range(len(self))]
+
+    def to_json(self):
+        words = self.timeline.to_words()
+        out = []
+        for i in range(len(self)):
+            first, last = self.word_range(i)
+            seg_words = words[first:last]
+            out.append({
+                "phrase": " ".join([w["word"] for w in seg_words]),
+                "start": self.start(i),
+                "end": self.end(i),
+                "words": seg_words,
+            })
+        return out
+
+
+# --- FORMATO BINARIO ---
+def dump(path, timeline, segments=None):
+    """Guarda timeline (y opcionalmente segmentos) en un único archivo binario."""
+    vocab = "\0".join(timeline.vocab.strings).encode("utf-8")
+    seg_data = segments.data if segments is not None else np.empty(0, dtype=SEGMENT_DTYPE)
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, len(timeline.data), len(seg_data), len(vocab)))
+        f.write(vocab)
+        f.write(np.ascontiguousarray(timeline.data).tobytes())
+        f.write(np.ascontiguousarray(seg_data).tobytes())
+    return path
+
+
+def load(path):
+    """Devuelve (WordTimeline, SegmentTable | None)."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    magic, version, n_words, n_segs, vocab_len = _HEADER.unpack_from(raw, 0)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError(f"Archivo de timeline no válido: {path}")
+    offset = _HEADER.size
+    strings = raw[offset:offset + vocab_len].decode("utf-8").split("\0") if vocab_len else []
+    offset += vocab_len
+    data = np.frombuffer(raw, dtype=WORD_DTYPE, count=n_words, offset=offset).copy()
+    offset += n_words * WORD_DTYPE.itemsize
+    timeline = WordTimeline(data, Vocabulary(strings))
+    if not n_segs:
+        return timeline, None
+    seg_data = np.frombuffer(raw, dtype=SEGMENT_DTYPE, count=n_segs, offset=offset).copy()
+    return timeline, SegmentTable(timeline, seg_data)
+
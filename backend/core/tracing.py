@@ -0,0 +1,230 @@
+"""
+Trazas por job y por etapa.
+
+- `job_context(job_id)` propaga el job_id a todo lo que se ejecute dentro (incluido asyncio.to_thread).
+- `span(name, **attrs)` abre un span anidado con duración y atributos.
+- `get_logger(__name__)` devuelve un logger cuyos mensajes llevan el job_id y quedan
+  registrados como eventos del span activo.
+
+Exportación configurable con variables de entorno:
+    AI_SHORTS_TRACE=off|jsonl|otlp      (por defecto off)
+    AI_SHORTS_TRACE_FILE=<ruta>         (por defecto data/traces/spans.jsonl, fuera de /assets)
+Con la traza desactivada `span()` solo consulta un flag y devuelve un objeto vacío.
+"""
+import contextlib, contextvars, json, logging, os, secrets, threading, time
+
+_job_id = contextvars.ContextVar("job_id", default=None)
+_current = contextvars.ContextVar("current_span", default=None)
+_exporter = None
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def event(self, name, **attrs):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "job_id", "start_ns", "end_ns",
+                 "attrs", "events", "status")
+
+    def __init__(self, name, parent, job_id, attrs):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.job_id = job_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attrs = dict(attrs)
+        self.events = []
+        self.status = "ok"
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def event(self, name, **attrs):
+        self.events.append((time.time_ns(), name, attrs))
+
+    @property
+    def duration(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self):
+        return {
+            "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+            "parent_id": self.parent_id, "job_id": self.job_id,
+            "start": self.start_ns / 1e9, "duration": round(self.duration, 6),
+            "status": self.status, "attrs": self.attrs,
+            "events": [{"t": t / 1e9, "name": n, **a} for t, n, a in self.events],
+        }
+
+
+# --- EXPORTADORES ---
+class JsonLinesExporter:
+    """Un span por línea, formato propio y fácil de procesar con jq/pandas."""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def _write(self, obj):
+        line = json.dumps(obj, ensure_ascii=False, default=str)
+        with self._lock:
+            self._fh.write(line + "\n")
+            self._fh.flush()
+
+    def export(self, span):
+        self._write(span.to_dict())
+
+    def close(self):
+        with self._lock:
+            self._fh.close()
+
+
+def _otlp_value(v):
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def _otlp_attrs(attrs):
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attrs.items() if v is not None]
+
+
+class OtlpJsonExporter(JsonLinesExporter):
+    """
+    Formato del 'file exporter' de OpenTelemetry (OTLP/JSON, un ExportTraceServiceRequest
+    por línea): importable con el otel-collector (receiver otlpjsonfile) en Jaeger/Tempo.
+    """
+
+    def export(self, span):
+        attrs = dict(span.attrs, **({"job.id": span.job_id} if span.job_id else {}))
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent_id or "",
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": _otlp_attrs(attrs),
+            "events": [{"timeUnixNano": str(t), "name": n, "attributes": _otlp_attrs(a)} for t, n, a in span.events],
+            "status": {"code": 2 if span.status == "error" else 1},
+        }
+        self._write({"resourceSpans": [{
+            "resource": {"attributes": _otlp_attrs({"service.name": "ai_shorts"})},
+            "scopeSpans": [{"scope": {"name": "ai_shorts.tracing"}, "spans": [otlp_span]}],
+        }]})
+
+
+def configure(mode=None, path=None):
+    """Activa/desactiva la exportación. Sin argumentos lee las variables de entorno."""
+    global _exporter
+    mode = (mode or os.environ.get("AI_SHORTS_TRACE", "off")).strip().lower()
+    # Las trazas llevan guiones y títulos: nunca bajo assets/, que la API sirve en /assets
+    data_dir = os.environ.get("AI_SHORTS_DATA_DIR") or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+    path = path or os.environ.get("AI_SHORTS_TRACE_FILE") or os.path.join(data_dir, "traces", "spans.jsonl")
+    if _exporter:
+        _exporter.close()
+        _exporter = None
+    if mode == "jsonl":
+        _exporter = JsonLinesExporter(path)
+    elif mode == "otlp":
+        _exporter = OtlpJsonExporter(path)
+    elif mode not in ("off", "", "0", "false"):
+        raise ValueError(f"AI_SHORTS_TRACE desconocido: {mode}")
+    return _exporter
+
+
+def enabled():
+    return _exporter is not None
+
+
+def current_job_id():
+    return _job_id.get()
+
+
+def current_span():
+    return _current.get() or NOOP_SPAN
+
+
+@contextlib.contextmanager
+def job_context(job_id):
+    token = _job_id.set(job_id)
+    try:
+        yield
+    finally:
+        _job_id.reset(token)
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    if _exporter is None:
+        yield NOOP_SPAN
+        return
+    sp = Span(name, _current.get(), _job_id.get(), attrs)
+    token = _current.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.status = "error"
+        sp.attrs["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        sp.end_ns = time.time_ns()
+        _current.reset(token)
+        exporter = _exporter
+        if exporter is not None:
+            exporter.export(sp)
+
+
+# --- LOGGING ---
+class _ContextFilter(logging.Filter):
+    """Inyecta job_id y span en cada registro y lo copia como evento del span activo."""
+
+    def filter(self, record):
+        record.job_id = _job_id.get() or "-"
+        sp = _current.get()
+        record.span = sp.name if sp else "-"
+        if sp is not None:
+            sp.event("log", level=record.levelname, message=record.getMessage())
+        return True
+
+
+_LOG_FORMAT = "%(asctime)s %(levelname)-5s [%(job_id)s] %(name)s: %(message)s"
+
+
+def setup_logging(level=None):
+    """Configura el logger raíz del backend (llamar una vez al arrancar)."""
+    level = level or os.environ.get("AI_SHORTS_LOG_LEVEL", "INFO")
+    root = logging.getLogger("ai_shorts")
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(_LOG_FORMAT, datefmt="%H:%M:%S"))
+        root.addHandler(handler)
+    root.setLevel(level)
+    root.propagate = False
+    configure()
+    return root
+
+
+def get_logger(name):
+    logger = logging.getLogger(f"ai_shorts.{name}")
+    if not any(isinstance(f, _ContextFilter) for f in logger.filters):
+        logger.addFilter(_ContextFilter())
+    return logger
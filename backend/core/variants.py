@@ -0,0 +1,44 @@
+"""
+Especificaciones de variantes: el mismo guion renderizado en varios layouts, presets de
+subtítulos o formatos (9:16, 1:1) a partir de un único audio, transcripción y set de clips.
+
+Una variante es {"name", "layout", "preset", "aspect"}; todo es opcional salvo que los
+nombres deben ser únicos (se usan para el nombre del archivo de salida).
+"""
+import json, re
+
+# Lienzo (ancho, alto) por formato
+ASPECTS = {"9:16": (1080, 1920), "1:1": (1080, 1080)}
+DEFAULT_ASPECT = "9:16"
+MAX_VARIANTS = 8
+
+
+def normalize_variants(specs):
+    """Valida y completa la lista de variantes. Lanza ValueError con un mensaje legible."""
+    if not isinstance(specs, list) or not specs:
+        raise ValueError("'variants' debe ser una lista no vacía")
+    if len(specs) > MAX_VARIANTS:
+        raise ValueError(f"Máximo {MAX_VARIANTS} variantes por job")
+    out, names = [], set()
+    for i, spec in enumerate(specs):
+        if not isinstance(spec, dict):
+            raise ValueError(f"Variante {i}: se esperaba un objeto")
+        aspect = str(spec.get("aspect") or DEFAULT_ASPECT)
+        if aspect not in ASPECTS:
+            raise ValueError(f"Variante {i}: aspect '{aspect}' no soportado ({', '.join(ASPECTS)})")
+        name = re.sub(r"[^a-zA-Z0-9_\-]+", "_", str(spec.get("name") or "")).strip("_") or f"v{i}"
+        if name in names:
+            raise ValueError(f"Variante {i}: nombre '{name}' repetido")
+        names.add(name)
+        out.append({
+            "name": name,
+            "layout": spec.get("layout") or None,
+            "preset": spec.get("preset") or None,
+            "aspect": aspect,
+        })
+    return out
+
+
+def variants_key(variants):
+    """Representación canónica de las variantes para la clave de deduplicación."""
+    return json.dumps(variants, sort_keys=True, separators=(",", ":"))
@@ -1,245 +1,365 @@
-import os, time, shutil, traceback, asyncio, re, io, random
-import pandas as pd
-from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File
+import os, sys, csv, subprocess, asyncio, time, uuid
+from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-import core.sprite_controller as sprite_controller
-import gc
-from core.profile_manager import load_profile
-import torch
-import requests
+from fastapi.responses import FileResponse, JSONResponse
+from core.job_store import JobStore, make_job_key, relocate_db, RUNNING as JOB_RUNNING
+from core.broker import make_broker, QUEUED, DONE, FAILED
+from core.storage import make_storage
+from core.variants import normalize_variants, variants_key
+from core.tracing import setup_logging, get_logger
 
 # Módulos propios
-from modules.voice_engine import generate_audio, get_word_timestamps
-from modules.asset_manager import AssetManager
-from modules.processor import extract_keywords
-from modules.video_engine import VideoEngine
+from modules.csv_ingest import ingest_csv
+
+setup_logging()
+log = get_logger("main")
 
 app = FastAPI(title="AI Shorts API")
 
 # --- CONFIGURACIÓN Y RUTAS ---
+# Nodo API: solo encola trabajo y consulta estado. El render corre en worker.py
+# (procesos locales lanzados aquí o nodos remotos contra el mismo broker).
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ASSETS_DIR = os.path.join(BASE_DIR, "assets")
-JOBS_DIR = os.path.join(ASSETS_DIR, "jobs")
-DOCS_OUTPUT_BASE = os.path.join(os.path.expanduser("~"), "Documents", "AI_Shorts_Finals")
+# Estado interno (guiones, claves, ubicaciones): fuera de ASSETS_DIR, que se sirve en /assets
+DATA_DIR = os.environ.get("AI_SHORTS_DATA_DIR") or os.path.join(BASE_DIR, "data")
+STATE_DB = os.path.join(DATA_DIR, "state.db")
+BROKER_DB = os.path.join(DATA_DIR, "broker.db")
 API_URL = "http://127.0.0.1:8000"
 
-# ----- N8N CONFIG -----
-N8N_WEBHOOK_URL = "http://localhost:5678/webhook/video-listo" 
-
-# Asegurar directorios base
-for d in [ASSETS_DIR, JOBS_DIR, DOCS_OUTPUT_BASE]:
-    os.makedirs(d, exist_ok=True)
+# Workers lanzados junto a la API (0 si los workers corren en otras máquinas)
+LOCAL_WORKERS = int(os.environ.get("AI_SHORTS_LOCAL_WORKERS", "1"))
+# Cada cuánto se sincroniza el estado de los jobs con el broker: en cada pasada solo las
+# tareas terminadas desde la anterior (con margen por desfase de relojes entre nodos) y, cada
+# FULL_RECONCILE_INTERVAL, un repaso de todos los jobs en curso (tareas perdidas en el broker)
+RECONCILE_INTERVAL = 1.0
+RECONCILE_OVERLAP = 30.0
+FULL_RECONCILE_INTERVAL = 60.0
+# El repaso completo ignora jobs más nuevos que esto: submit_job los crea antes de encolarlos
+JOB_ENQUEUE_GRACE = 30.0
+# Máximo de shorts por guion en /process-single
+MAX_SHORTS = 20
+
+os.makedirs(ASSETS_DIR, exist_ok=True)
+os.makedirs(DATA_DIR, exist_ok=True)
+relocate_db(os.path.join(ASSETS_DIR, "state.db"), STATE_DB)
+relocate_db(os.path.join(ASSETS_DIR, "broker.db"), BROKER_DB)
 
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
 # Estado global
-export_progress = {"status": "esperando", "percent": 0, "final_url": None}
-
-# --- UTILIDADES ---
-def sanitize_filename(name: str, fallback: str) -> str:
-    name = re.sub(r"[^a-zA-Z0-9_\-]+", "_", str(name or "").strip())
-    return name.strip("_") or fallback
-
-def notify_n8n(job_id, final_path, title, profile):
-    """Función centralizada para avisar a n8n que el video está listo."""
-    payload = {
-        "job_id": job_id,
-        "status": "completed",
-        "file_path": os.path.abspath(final_path),
-        "title": title,
-        "profile": profile,
-        "event": "video_ready"
-    }
-    try:
-        # Enviamos el aviso al Webhook de n8n
-        response = requests.post(N8N_WEBHOOK_URL, json=payload, timeout=10)
-        print(f"📡 Aviso enviado a n8n: {response.status_code}")
-    except Exception as e:
-        print(f"⚠️ n8n no respondió al aviso final: {e}")
-
-def group_timestamps(raw_timestamps):
-    segments, temp_words = [], []
-    for i, w in enumerate(raw_timestamps):
-        temp_words.append(w)
-        is_last = i == len(raw_timestamps) - 1
-        gap = False if is_last else (raw_timestamps[i+1]["start"] - w["end"]) > 0.3
-        has_punct = any(p in w["raw_word"] for p in {".", "!", "?", ","})
-        duration = temp_words[-1]["end"] - temp_words[0]["start"]
-
-        if gap or (has_punct and duration > 1.2) or duration > 3.5 or is_last:
-            segments.append({
-                "phrase": " ".join([x["word"] for x in temp_words]),
-                "start": temp_words[0]["start"],
-                "end": temp_words[-1]["end"],
-                "words": list(temp_words)
-            })
-            temp_words = []
-    return segments
-
-# --- LÓGICA DE PROCESAMIENTO ---
-
-async def process_row(text, profile, title, keywords_override, job_id, job_path, output_dir, layout_override=None):
-    success = False
+job_store = JobStore(STATE_DB)
+broker = make_broker(default_path=BROKER_DB)
+storage = make_storage()
+_batch_tasks = {}    # batch_id -> asyncio.Task (evita lanzar dos veces el mismo batch)
+_last_export = {"task_id": None}
+_local_workers = []  # procesos worker.py hijos
+
+# --- LÓGICA DE ENCOLADO ---
+
+def submit_job(job_key, job_id, kind="render", **row_kwargs):
+    """
+    Devuelve (job_id, output_path). Si ya existe un render terminado para la clave se
+    devuelve su salida sin re-renderizar; si hay uno en cola o en curso, su job_id.
+    Si no, registra el job y lo encola para los workers.
+    """
+    cached = job_store.find_output(job_key, exists=storage.exists)
+    if cached:
+        return cached["job_id"], cached["outputs"] or cached["output_path"]
+    job_id, created = job_store.find_or_create_job(job_id, job_key)
+    if created:  # solo la petición que creó el job lo encola
+        try:
+            broker.enqueue(job_id, kind, row_kwargs)
+        except Exception as e:
+            job_store.fail_job(job_id, f"No se pudo encolar: {e}")
+            raise
+    return job_id, None
+
+def _submit_row(batch_id, row_idx, row):
+    job_key = make_job_key(row["texto"], row.get("profile"), row.get("keywords"), row.get("layout"))
     try:
-        print(f"\n🚀 Procesando: {title} | Job ID: {job_id}")
-        sprite_controller._last_pose = None 
-        gc.collect()
-
-        prof_data = load_profile(profile)
-        voice_model = prof_data.get("voice_model", "es_ES-sharvard-medium")
-        el_style = prof_data.get("elevenlabs_style", {})
-        
-        audio_dir = os.path.join(job_path, "audio")
-        os.makedirs(audio_dir, exist_ok=True)
-        voice_path = os.path.join(audio_dir, "voice.wav")
-
-        audio_path = await generate_audio(text, voice=voice_model, save_path=voice_path, elevenlabs_style=el_style)
-        
-        raw_ts = get_word_timestamps(audio_path, job_path, text)
-        segments = group_timestamps(raw_ts)
-        manager = AssetManager(profile_name=profile, job_id=job_id)
-
-        kw_override = (keywords_override or "").strip().replace(";", ",")
-        clips = []
-        for j, seg in enumerate(segments):
-            duracion_segmento = seg["end"] - seg["start"] + 0.5
-            kw = kw_override if kw_override else extract_keywords(seg["phrase"])
-            options = manager.search_stock_videos(kw)
-            if options:
-                chosen = random.choice(options[:5])
-                p = manager.download_from_url(chosen["download_link"], f"clip_{j}", job_path, duration=duracion_segmento)
-                if p: clips.append(os.path.abspath(p))
-
-        out_temp = os.path.join(job_path, "output", "final_render.mp4")
-        os.makedirs(os.path.dirname(out_temp), exist_ok=True)
-
-        engine = VideoEngine(output_path=out_temp)
-        engine.assemble_video(
-            clip_paths=clips, 
-            audio_path=os.path.abspath(audio_path), 
-            segments=segments, 
-            profile_name=profile, 
-            job_path=job_path,
-            layout_mode=layout_override
+        job_id, final_path = submit_job(
+            job_key, uuid.uuid4().hex,
+            text=row["texto"], profile=row.get("profile"),
+            title=row.get("titulo"), keywords_override=row.get("keywords"),
+            output_prefix="Batch", layout_override=row.get("layout")
         )
-
-        safe_title = sanitize_filename(title, fallback=f"video_{job_id}")
-        final_path = os.path.join(output_dir, f"{safe_title}.mp4")
-        os.makedirs(output_dir, exist_ok=True)
-        
-        shutil.copy2(out_temp, final_path)
-        print(f"✨ VIDEO LISTO: {final_path}")
-        
-        success = True
-        
-        # --- AVISO A N8N (AUTOMÁTICO) ---
-        notify_n8n(job_id, final_path, title, profile)
-            
-        return final_path
-
+        if final_path:
+            job_store.mark_done(batch_id, row_idx, final_path)
+        else:
+            job_store.attach_row(job_id, batch_id, row_idx)
     except Exception as e:
-        print(f"❌ Error: {str(e)}")
-        traceback.print_exc()
-        raise e
+        job_store.mark_failed(batch_id, row_idx, f"{type(e).__name__}: {e}")
+
+async def run_batch(batch_id):
+    """Encola las filas pendientes del batch en orden; el resultado lo cierra reconcile_jobs()."""
+    # SQLite y storage (HEAD en S3) bloquean: todo en hilos para no frenar el event loop
+    try:
+        while True:
+            claimed = await asyncio.to_thread(job_store.claim_next, batch_id)
+            if claimed is None:
+                status = await asyncio.to_thread(job_store.batch_status, batch_id)
+                if not status or status["ingested"]:
+                    break
+                # La ingesta sigue en curso: esperamos a que lleguen más filas
+                await asyncio.sleep(0.5)
+                continue
+            await asyncio.to_thread(_submit_row, batch_id, *claimed)
+        log.info(f"📦 Batch {batch_id} encolado: {await asyncio.to_thread(job_store.batch_status, batch_id)}")
     finally:
-        sprite_controller._last_pose = None
-        gc.collect()
-        if torch.cuda.is_available(): torch.cuda.empty_cache()
-        if success:
-            time.sleep(2)
-            shutil.rmtree(job_path, ignore_errors=True)
+        _batch_tasks.pop(batch_id, None)
+
+def start_batch(batch_id):
+    task = _batch_tasks.get(batch_id)
+    if task is None or task.done():
+        _batch_tasks[batch_id] = asyncio.create_task(run_batch(batch_id))
+
+_reconcile = {"since": 0.0, "full_at": 0.0}
+
+def _apply_task(job_id, task):
+    if task is None:
+        job_store.fail_job(job_id, "Tarea no encontrada en el broker")
+    elif task["status"] == DONE:
+        location = (task["result"] or {}).get("location")
+        if isinstance(location, dict):  # job con variantes: {nombre: ubicación}
+            job_store.finish_job(job_id, next(iter(location.values()), None), outputs=location)
+        else:
+            job_store.finish_job(job_id, location)
+    elif task["status"] == FAILED:
+        job_store.fail_job(job_id, task["error"])
+
+def _reconcile_once():
+    broker.requeue_expired()
+    now = time.time()
+    if now - _reconcile["full_at"] >= FULL_RECONCILE_INTERVAL:
+        for job_id in job_store.running_jobs(created_before=now - JOB_ENQUEUE_GRACE):
+            _apply_task(job_id, broker.get(job_id))
+        _reconcile["full_at"] = now
+    else:
+        for task in broker.finished_since(_reconcile["since"] - RECONCILE_OVERLAP):
+            job = job_store.get_job(task["task_id"])  # las de /export no son jobs
+            if job and job["status"] == JOB_RUNNING:
+                _apply_task(task["task_id"], task)
+    _reconcile["since"] = now
+
+async def reconcile_jobs():
+    """Vuelca al job_store (y a las filas de batch) lo que los workers terminan."""
+    while True:
+        try:
+            await asyncio.to_thread(_reconcile_once)
+        except Exception as e:
+            log.warning(f"⚠️ Reconciliación con el broker falló: {e}")
+        await asyncio.sleep(RECONCILE_INTERVAL)
+
+def export_status_from_task(task):
+    """Traduce el estado/progreso de la tarea de export a la barra del frontend."""
+    if task is None:
+        return {"status": "esperando", "percent": 0, "final_url": None}
+    if task["status"] == QUEUED:
+        return {"status": "En cola...", "percent": 5, "final_url": None}
+    if task["status"] == DONE:
+        location = (task["result"] or {}).get("location")
+        return {"status": "¡Completado!", "percent": 100, "final_url": storage.public_url(location) if location else None}
+    if task["status"] == FAILED:
+        return {"status": f"Error: {task['error']}", "percent": 0, "final_url": None}
+
+    snap = task["progress"] or {}
+    stage_name, fraction = snap.get("stage"), snap.get("stage_fraction") or 0.0
+    if stage_name == "movis_render":
+        percent = 50 + 35 * fraction
+    elif stage_name in ("subtitles", "final_encode"):
+        percent = 85 + 14 * fraction
+    else:
+        return {"status": "Descargando clips...", "percent": int(10 + 40 * fraction), "final_url": None}
+    eta = f" | ETA {snap['stage_eta']:.0f}s" if snap.get("stage_eta") is not None else ""
+    rt = f" | {snap['realtime_factor']:.2f}x" if snap.get("realtime_factor") else ""
+    return {"status": f"Renderizando ({stage_name}){eta}{rt}", "percent": int(percent), "final_url": None,
+            "eta": snap.get("stage_eta"), "realtime_factor": snap.get("realtime_factor")}
 
 # --- ENDPOINTS ---
 
 @app.post("/export")
-async def export_video(request: dict, background_tasks: BackgroundTasks):
-    job_id = request["job_id"]
-    selections = request["selections"]
-    segments = request["timestamps"]
-    profile = request.get("profile")
-    preset_from_front = request.get("preset")
-    position_from_front = request.get("position")
-
-    async def run_export():
-        success = False
-        job_path = os.path.join(JOBS_DIR, job_id)
+async def export_video(request: dict):
+    task_id = uuid.uuid4().hex
+    await asyncio.to_thread(broker.enqueue, task_id, "export", {
+        "job_id": request["job_id"],
+        "selections": request["selections"],
+        "timestamps": request["timestamps"],
+        "profile": request.get("profile"),
+        "preset": request.get("preset"),
+        "position": request.get("position"),
+    })
+    _last_export["task_id"] = task_id
+    return {"message": "Exportación iniciada", "task_id": task_id}
+
+@app.on_event("startup")
+async def resume_unfinished_batches():
+    # Los jobs en curso siguen en los workers: no se tocan; reconcile_jobs() recogerá su resultado.
+    # Las filas 'running' se reenvían: submit_job las vuelve a enlazar con su job si sigue vivo.
+    for batch_id in job_store.unfinished_batches():
+        job_store.reset_interrupted(batch_id)
+        job_store.finish_ingest(batch_id)
+        log.info(f"🔁 Reanudando batch {batch_id}")
+        start_batch(batch_id)
+    asyncio.create_task(reconcile_jobs())
+
+@app.on_event("startup")
+async def start_local_workers():
+    for _ in range(LOCAL_WORKERS):
+        _local_workers.append(subprocess.Popen([sys.executable, "-m", "worker"], cwd=BASE_DIR))
+    if LOCAL_WORKERS:
+        log.info(f"👷 {LOCAL_WORKERS} worker(s) local(es) lanzados")
+
+@app.on_event("shutdown")
+async def stop_local_workers():
+    for proc in _local_workers:
+        proc.terminate()
+    for proc in _local_workers:
         try:
-            export_progress.update({"status": "Descargando clips...", "percent": 10})
-            manager = AssetManager(profile_name=profile)
-            clips = [manager.download_from_url(url, f"clip_{i}", job_path, duration=(segments[int(idx)]["end"]-segments[int(idx)]["start"]+0.2)) 
-                     for i, (idx, url) in enumerate(selections.items())]
-            clips = [c for c in clips if c]
-
-            export_progress.update({"status": "Renderizando...", "percent": 50})
-            out_temp = os.path.join(job_path, "output", "final.mp4")
-            os.makedirs(os.path.dirname(out_temp), exist_ok=True)
-
-            await asyncio.to_thread(
-                VideoEngine(output_path=out_temp).assemble_video,
-                clip_paths=clips, audio_path=os.path.join(job_path, "audio", "voice.wav"), 
-                segments=segments, profile_name=profile, job_path=job_path,
-                preset_from_front=preset_from_front, position_from_front=position_from_front
-            )
-
-            final_path = os.path.join(DOCS_OUTPUT_BASE, "Manual", f"video_{job_id}.mp4")
-            os.makedirs(os.path.dirname(final_path), exist_ok=True)
-            shutil.copy2(out_temp, final_path)
-            
-            # --- AVISO A N8N (MANUAL) ---
-            notify_n8n(job_id, final_path, f"Manual_{job_id}", profile)
-
-            export_progress.update({"status": "¡Completado!", "percent": 100, "final_url": f"file://{final_path}"})
-            success = True
-        except Exception as e:
-            export_progress.update({"status": f"Error: {str(e)}", "percent": 0})
-        finally:
-            if success:
-                time.sleep(1.5)
-                shutil.rmtree(job_path, ignore_errors=True)
-
-    background_tasks.add_task(run_export)
-    return {"message": "Exportación iniciada"}
+            await asyncio.to_thread(proc.wait, 10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+@app.get("/health/live")
+async def health_live():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """200 si hay al menos un worker vivo con sus modelos cargados; 503 mientras tanto."""
+    workers = await asyncio.to_thread(broker.workers)
+    ready = any(w.get("ready") for w in workers)
+    body = {"ready": ready, "queue_depth": await asyncio.to_thread(broker.queue_depth), "workers": workers}
+    return JSONResponse(body, status_code=200 if ready else 503)
 
 @app.post("/batch")
-async def batch_process(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
-    content = await file.read()
-    df = pd.read_csv(io.BytesIO(content), sep=None, engine='python').rename(columns=lambda x: x.strip().lower())
-    df = df.dropna(subset=['texto']) 
-    
-    async def run_batch():
-        for i, row in df.iterrows():
-            job_id = f"batch_{int(time.time())}_{i}"
-            try:
-                await process_row(
-                    text=str(row.get("texto")).strip(), profile=row.get("profile"), 
-                    title=row.get("titulo"), keywords_override=row.get("keywords"), 
-                    job_id=job_id, job_path=os.path.join(JOBS_DIR, job_id), 
-                    output_dir=os.path.join(DOCS_OUTPUT_BASE, "Batch"),
-                    layout_override=str(row.get("layout")).strip() if pd.notna(row.get("layout")) else None
-                )
-            except: continue
-    background_tasks.add_task(run_batch)
-    return {"message": "Batch iniciado", "rows": len(df)}
+async def batch_process(file: UploadFile = File(...)):
+    batch_id = uuid.uuid4().hex[:12]
+    await asyncio.to_thread(job_store.create_batch, batch_id, file.filename)
+    # El encolado arranca ya: va consumiendo filas a medida que se ingieren
+    start_batch(batch_id)
+    try:
+        rows = await asyncio.to_thread(ingest_csv, file.file, job_store, batch_id)
+    except (ValueError, UnicodeError, csv.Error) as e:
+        # Sin filas el batch se borra; si no, las pendientes fallan y el batch guarda el motivo
+        await asyncio.to_thread(job_store.abort_ingest, batch_id, f"CSV inválido: {e}")
+        raise HTTPException(status_code=400, detail=f"CSV inválido: {e}")
+    except BaseException:
+        await asyncio.to_thread(job_store.finish_ingest, batch_id)
+        raise
+    # run_batch() deja de esperar filas en cuanto la ingesta se marca terminada
+    await asyncio.to_thread(job_store.finish_ingest, batch_id)
+    return {"message": "Batch iniciado", "batch_id": batch_id, "rows": rows}
+
+@app.get("/batch/{batch_id}")
+async def batch_status(batch_id: str):
+    status = await asyncio.to_thread(job_store.batch_status, batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Batch no encontrado")
+    return status
+
+@app.post("/batch/{batch_id}/resume")
+async def batch_resume(batch_id: str, retry_failed: bool = False):
+    if await asyncio.to_thread(job_store.batch_status, batch_id) is None:
+        raise HTTPException(status_code=404, detail="Batch no encontrado")
+    if batch_id not in _batch_tasks:
+        await asyncio.to_thread(job_store.reset_interrupted, batch_id)
+    if retry_failed:
+        await asyncio.to_thread(job_store.retry_failed, batch_id)
+    start_batch(batch_id)
+    return await asyncio.to_thread(job_store.batch_status, batch_id)
+
+def parse_shorts(value):
+    """'shorts' de la petición: None = un solo vídeo, "auto"/0 = según short_max_duration, N = N shorts."""
+    if value is None or value is False:
+        return None
+    if value is True or str(value).strip().lower() == "auto":
+        return 0
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="'shorts' debe ser un entero >= 0 o \"auto\"")
+    if n < 0 or n > MAX_SHORTS:
+        raise HTTPException(status_code=400, detail=f"'shorts' debe estar entre 0 y {MAX_SHORTS}")
+    return n
 
 @app.post("/process-single")
-async def process_single(request: dict, background_tasks: BackgroundTasks):
-    job_id = f"n8n_{int(time.time())}"
-    background_tasks.add_task(
-        process_row, text=request.get("texto"), profile=request.get("profile"),
+async def process_single(request: dict):
+    """Un guion -> un vídeo; con "shorts" la narración larga se parte en varios shorts."""
+    text = request.get("texto")
+    if not str(text or "").strip():
+        raise HTTPException(status_code=400, detail="Falta 'texto'")
+    shorts = parse_shorts(request.get("shorts"))
+    job_key = make_job_key(text, request.get("profile"), request.get("keywords"), request.get("layout"),
+                           extra=None if shorts is None else f"shorts={shorts}")
+    split = {} if shorts is None else {"shorts": shorts}
+    new_id = uuid.uuid4().hex
+    job_id, final_path = await asyncio.to_thread(
+        submit_job, job_key, new_id,
+        text=text, profile=request.get("profile"),
         title=request.get("titulo"), keywords_override=request.get("keywords"),
-        job_id=job_id, job_path=os.path.join(JOBS_DIR, job_id),
-        output_dir=os.path.join(DOCS_OUTPUT_BASE, "n8n_Automation"),
-        layout_override=request.get("layout")
+        output_prefix="n8n_Automation",
+        layout_override=request.get("layout"), **split
     )
-    return {"status": "Procesamiento iniciado", "job_id": job_id}
+    if isinstance(final_path, dict):
+        return {"status": "Ya procesado", "job_id": job_id, "shorts": final_path, "deduplicated": True}
+    if final_path:
+        return {"status": "Ya procesado", "job_id": job_id, "file_path": final_path, "deduplicated": True}
+    if job_id != new_id:
+        return {"status": "Procesamiento en curso", "job_id": job_id, "deduplicated": True}
+    return {"status": "Procesamiento iniciado", "job_id": job_id, "deduplicated": False}
+
+@app.post("/process-variants")
+async def process_variants(request: dict):
+    """Mismo guion en varias salidas (layout, preset de subtítulos, 9:16 / 1:1) con un solo TTS y set de clips."""
+    text = request.get("texto")
+    if not str(text or "").strip():
+        raise HTTPException(status_code=400, detail="Falta 'texto'")
+    try:
+        variants = normalize_variants(request.get("variants"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job_key = make_job_key(text, request.get("profile"), request.get("keywords"), variants_key(variants))
+    new_id = uuid.uuid4().hex
+    job_id, outputs = await asyncio.to_thread(
+        submit_job, job_key, new_id, kind="variants",
+        text=text, profile=request.get("profile"),
+        title=request.get("titulo"), keywords_override=request.get("keywords"),
+        output_prefix="n8n_Automation", variants=variants
+    )
+    if outputs:
+        return {"status": "Ya procesado", "job_id": job_id, "variants": outputs, "deduplicated": True}
+    if job_id != new_id:
+        return {"status": "Procesamiento en curso", "job_id": job_id, "deduplicated": True}
+    return {"status": "Procesamiento iniciado", "job_id": job_id, "variants": [v["name"] for v in variants],
+            "deduplicated": False}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await asyncio.to_thread(job_store.get_job, job_id)
+    task = await asyncio.to_thread(broker.get, job_id)
+    if job is None and task is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    worker = {k: task[k] for k in ("status", "worker_id", "attempts")} if task else None
+    return {**(job or {"job_id": job_id}), "task": worker, "progress": task["progress"] if task else None}
+
+@app.get("/progress")
+async def all_progress():
+    """Progreso en vivo (etapa, %, ETA, factor de tiempo real) de las tareas en cola o en curso."""
+    tasks = await asyncio.to_thread(broker.active)
+    return {
+        t["task_id"]: {"kind": t["kind"], "status": t["status"], "worker_id": t["worker_id"], **(t["progress"] or {})}
+        for t in tasks
+    }
 
 @app.get("/export-status")
-async def get_status(): return export_progress
+async def get_status():
+    task = await asyncio.to_thread(broker.get, _last_export["task_id"]) if _last_export["task_id"] else None
+    return export_status_from_task(task)
 
 app.mount("/assets", StaticFiles(directory=ASSETS_DIR), name="assets")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,13 +1,46 @@
 import os
 import random
+import contextvars
 import requests
 import subprocess
 from concurrent.futures import ThreadPoolExecutor
 from deep_translator import GoogleTranslator
 import config
+from core.profiling import stage
+from core.ffmpeg_runner import run_ffmpeg
+from core.tracing import get_logger
+import core.model_manager as models
+import core.bandwidth as bandwidth
+from modules.clip_analysis import analyze_clip
+
+log = get_logger("asset_manager")
+
+# Lado máximo útil de un clip: es el tamaño al que se transcodifica (recorte cuadrado)
+MAX_CLIP_SIDE = 720
+PREFERRED_FPS = 30
+
+def pick_rendition(files, side):
+    """
+    La versión más ligera de Pexels cuyo recorte cuadrado central cubre `side` px
+    (desempate: fps más cercano a 30, luego menor tamaño si Pexels lo informa).
+    Si ninguna llega, la de mayor resolución.
+    """
+    files = [f for f in files if f.get("link") and f.get("width") and f.get("height")
+             and f.get("file_type", "video/mp4") == "video/mp4"]
+    if not files:
+        return None
+    adequate = [f for f in files if min(f["width"], f["height"]) >= side]
+    if not adequate:
+        return max(files, key=lambda f: min(f["width"], f["height"]))
+    return min(adequate, key=lambda f: (
+        f["width"] * f["height"], abs((f.get("fps") or PREFERRED_FPS) - PREFERRED_FPS), f.get("size") or 0
+    ))
+
+# Un único traductor compartido por todos los jobs (se crea en el primer uso)
+models.register("translator", lambda: GoogleTranslator(source="es", target="en"), idle_ttl=None)
 
 class AssetManager:
-    def __init__(self, job_id="default", profile_name=None, profile=None):
+    def __init__(self, job_id="default", profile_name=None, profile=None, target_side=MAX_CLIP_SIDE):
         self.api_key = getattr(config, "PEXELS_API_KEY", None)
         self.used_video_ids = set()
         if not self.api_key or self.api_key.strip() in ("", "###"):
@@ -15,14 +48,13 @@ class AssetManager:
 
         self.session = requests.Session()
         self.session.headers.update({"Authorization": self.api_key})
-        self.base_url = "https://api.pexels.com/videos/search"
-        self.translator = GoogleTranslator(source="es", target="en")
+        self.base_url = getattr(config, "PEXELS_BASE_URL", "https://api.pexels.com/videos/search")
         self.job_id = job_id
         self.profile_name = (profile_name or "default").strip().lower()
 
-        # Configuración de recorte
-        self.target_w = 720
-        self.target_h = 720
+        # Configuración de recorte: el tamaño real de la capa de stock en el layout (ver
+        # layout_engine.stock_layer_side), sin pasar del máximo que se transcodifica
+        self.target_w = self.target_h = max(64, min(int(target_side), MAX_CLIP_SIDE)) // 2 * 2  # par (yuv420p)
 
         self.profile_styles = {
             "default": ["cinematic ultra-high quality", "4k moody lighting"],
@@ -42,11 +74,15 @@ class AssetManager:
 
     def search_stock_videos(self, keyword, per_page=10):
         """Busca videos en Pexels y devuelve los links de descarga."""
+        with stage("search"):
+            return self._search_stock_videos(keyword, per_page)
+
+    def _search_stock_videos(self, keyword, per_page):
         estilo = self._pick_style()
         search_query_raw = f"{keyword} {estilo}"
 
         try:
-            search_query = self.translator.translate(search_query_raw)
+            search_query = models.get("translator").translate(search_query_raw)
         except:
             search_query = search_query_raw
 
@@ -67,7 +103,7 @@ class AssetManager:
                 response = self.session.get(self.base_url, params=params, timeout=10)
                 videos = response.json().get("videos", [])
         except Exception as e:
-            print(f"Error en Pexels API: {e}")
+            log.warning(f"Error en Pexels API: {e}")
             videos = []
 
         options = []
@@ -75,19 +111,58 @@ class AssetManager:
             video_id = video.get("id")
             if video_id in self.used_video_ids: continue
             files = video.get("video_files", [])
-            best_file = next(
-                (f for f in files if f.get("width", 0) <= 1080 and f.get("height", 0) > f.get("width", 0)),
-                files[0] if files else None
-            )
+            best_file = pick_rendition(files, self.target_w)
 
             if best_file:
+                # Para analizar basta la versión más ligera
+                lightest = pick_rendition(files, 0)
                 options.append({
                     "id": video_id, # Guardamos el ID
                     "preview_img": video.get("image"),
                     "download_link": best_file["link"],
+                    "analysis_link": lightest["link"],
+                    "duration": video.get("duration"),
+                    "rendition": f"{best_file['width']}x{best_file['height']}",
                 })
         return options
 
+    def pick_best_clip(self, options, duration, max_candidates=3):
+        """
+        Analiza (en paralelo, con caché por id) los primeros `max_candidates` resultados y
+        devuelve (opción, inicio_en_segundos) con el mejor tramo de `duration` segundos.
+        Sin análisis disponible, vuelve a la elección aleatoria de siempre desde 0.
+        """
+        candidates = options[:max_candidates]
+        if not candidates:
+            return None, 0.0
+        with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+            # Cada hilo con una copia del contexto: job_id (contabilidad de bandwidth) y span actual
+            futures = [
+                executor.submit(contextvars.copy_context().run, analyze_clip,
+                                o.get("analysis_link") or o["download_link"], o.get("id"), session=self.session)
+                for o in candidates
+            ]
+            analyses = [f.result() for f in futures]
+
+        best, best_start, best_score = None, 0.0, None
+        for option, analysis in zip(candidates, analyses):
+            if analysis is None:
+                continue
+            start, score = analysis.best_window(duration)
+            if analysis.complete and analysis.duration < duration:
+                score -= 0.5  # el clip no llega a cubrir el segmento
+            if option.get("duration"):
+                start = max(0.0, min(start, float(option["duration"]) - duration))
+            if best_score is None or score > best_score:
+                best, best_start, best_score = option, start, score
+
+        if best is None:
+            best, best_start = random.choice(options[:5]), 0.0
+        else:
+            log.info(f"🎯 Clip {best.get('id')} elegido: tramo {best_start:.1f}s (+{duration:.1f}s), score {best_score:.2f}")
+        self.used_video_ids.add(best.get("id"))
+        return best, best_start
+
     def _process_video_ffmpeg(self, input_path, output_path):
         """
         Filtro inteligente: Escala el video para que quepa en 720x720 
@@ -139,40 +214,40 @@ class AssetManager:
             return True
         except: return False
 
-    def _process_video_ffmpeg(self, input_path, output_path, duration=10):
+    def _process_video_ffmpeg(self, input_path, output_path, duration=10, start=0.0):
         """Filtro unificado con fallback inteligente"""
         # Aseguramos que la duración sea un string válido para FFmpeg
         duration_str = str(max(1, float(duration)))
         
+        side = self.target_w
         smart_filter = (
-            f"scale='if(lt(iw,ih),720,-1)':'if(lt(iw,ih),-1,720)',"
+            f"scale='if(lt(iw,ih),{side},-1)':'if(lt(iw,ih),-1,{side})',"
             f"crop={self.target_w}:{self.target_h},setsar=1,fps=30" # Subido a 30fps para fluidez
         )
+
+        def build_cmd(codec_args):
+            # -ss antes de -i: búsqueda en la entrada (no decodifica lo que se salta)
+            return [
+                "ffmpeg", "-y", "-ss", f"{max(0.0, float(start)):.3f}", "-i", input_path,
+                "-vf", smart_filter, *codec_args, "-an",
+                "-t", duration_str, output_path
+            ]
         
         # Intentar GPU
-        cmd = [
-            "ffmpeg", "-y", "-i", input_path,
-            "-vf", smart_filter,
-            "-c:v", "h264_nvenc", "-preset", "p1", "-an", 
-            "-t", duration_str, output_path
-        ]
-        
         try:
-            subprocess.run(cmd, check=True, capture_output=True)
+            run_ffmpeg(build_cmd(["-c:v", "h264_nvenc", "-preset", "p1"]), "transcode")
             return True
-        except:
+        except Exception:
             # Fallback CPU
-            cmd[7] = "libx264" # Cambiar codec a CPU
-            cmd.insert(8, "-crf")
-            cmd.insert(9, "23")
             try:
-                subprocess.run(cmd, check=True, capture_output=True)
+                run_ffmpeg(build_cmd(["-c:v", "libx264", "-crf", "23", "-preset", "ultrafast"]), "transcode_cpu")
                 return True
-            except:
+            except Exception as e:
+                log.error(f"❌ Transcodificación fallida: {getattr(e, 'stderr', '') or e}")
                 return False
 
     # Cambia la firma del método
-    def download_from_url(self, url, filename, job_path, duration=10): 
+    def download_from_url(self, url, filename, job_path, duration=10, start=0.0): 
         save_dir = os.path.join(job_path, "clips")
         os.makedirs(save_dir, exist_ok=True)
         
@@ -180,28 +255,28 @@ class AssetManager:
         final_path = os.path.join(save_dir, f"{filename}.mp4")
 
         try:
-            with self.session.get(url, stream=True, timeout=30) as r:
+            with stage("download"), self.session.get(url, stream=True, timeout=30) as r:
                 r.raise_for_status()
                 with open(raw_path, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=1024 * 1024):
+                    for chunk in bandwidth.metered(r.iter_content(chunk_size=256 * 1024)):
                         f.write(chunk)
             
-
-            success = self._process_video_ffmpeg(raw_path, final_path, duration)
+            with stage("transcode"):
+                success = self._process_video_ffmpeg(raw_path, final_path, duration, start)
             
             if os.path.exists(raw_path): 
                 os.remove(raw_path)
             
             return final_path if success else None
         except Exception as e:
-            print(f"Error procesando {filename}: {e}")
+            log.error(f"Error procesando {filename}: {e}")
             return None
 
     def download_multiple_clips(self, clips_to_download, job_path):
         results = []
         with ThreadPoolExecutor(max_workers=4) as executor:
             futures = [
-                executor.submit(self.download_from_url, url, fname, job_path) 
+                executor.submit(contextvars.copy_context().run, self.download_from_url, url, fname, job_path)
                 for url, fname in clips_to_download
             ]
             for future in futures:
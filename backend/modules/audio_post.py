@@ -0,0 +1,142 @@
+"""
+Post-proceso de la voz en una sola pasada de ffmpeg:
+decodificación (MP3 de ElevenLabs o WAV de Piper) -> loudnorm EBU R128 -> resample -> WAV.
+
+El archivo se escribe una única vez y se devuelve un AudioInfo con la duración y las
+medidas de sonoridad, para que ninguna etapa posterior tenga que volver a abrirlo.
+Los objetivos se configuran por perfil en el bloque "audio".
+"""
+import json, os, subprocess, wave
+from core.ffmpeg_runner import run_ffmpeg
+from core.tracing import get_logger
+
+log = get_logger("audio_post")
+
+# Objetivos por defecto (sobrescribibles con "audio" en el perfil)
+DEFAULT_AUDIO = {
+    "normalize": True,      # aplicar loudnorm (EBU R128)
+    "target_i": -14.0,      # sonoridad integrada objetivo (LUFS)
+    "target_tp": -1.5,      # true peak máximo (dBTP)
+    "target_lra": 11.0,     # rango de sonoridad (LU)
+    "sample_rate": 48000,
+    "channels": 1,
+}
+
+# Claves numéricas del informe JSON de loudnorm
+_LOUDNORM_KEYS = ("input_i", "input_tp", "input_lra", "input_thresh",
+                  "output_i", "output_tp", "output_lra", "output_thresh", "target_offset")
+
+
+class AudioInfo:
+    """Resultado del post-proceso: ruta final, duración (s), formato y medidas de loudnorm."""
+    __slots__ = ("path", "duration", "sample_rate", "channels", "loudness")
+
+    def __init__(self, path, duration, sample_rate, channels, loudness=None):
+        self.path = path
+        self.duration = duration
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.loudness = loudness or {}
+
+    def as_dict(self):
+        return {"path": self.path, "duration": self.duration, "sample_rate": self.sample_rate,
+                "channels": self.channels, "loudness": self.loudness}
+
+
+def audio_config(overrides=None):
+    """Objetivos efectivos: defaults + el bloque "audio" del perfil (si lo hay)."""
+    cfg = dict(DEFAULT_AUDIO)
+    cfg.update({k: v for k, v in (overrides or {}).items() if k in DEFAULT_AUDIO})
+    return cfg
+
+
+def parse_loudnorm(lines):
+    """Extrae el bloque JSON que loudnorm (print_format=json) imprime al final de stderr."""
+    text = "\n".join(lines)
+    start, end = text.rfind("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return {}
+    try:
+        raw = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    stats = {}
+    for key in _LOUDNORM_KEYS:
+        try:
+            stats[key] = float(raw[key])
+        except (KeyError, TypeError, ValueError):
+            pass  # "-inf" en silencios completos, etc.
+    if "normalization_type" in raw:
+        stats["normalization_type"] = raw["normalization_type"]
+    return stats
+
+
+def _wav_duration(path):
+    with wave.open(path, "rb") as f:
+        return f.getnframes() / float(f.getframerate())
+
+
+def postprocess_audio(src_path, dst_path, config=None):
+    """
+    Decodifica `src_path`, normaliza la sonoridad, remuestrea y escribe `dst_path`
+    (PCM 16 bits) en una sola invocación de ffmpeg. Devuelve un AudioInfo.
+    """
+    cfg = audio_config(config)
+    sr, channels = int(cfg["sample_rate"]), int(cfg["channels"])
+
+    filters = []
+    if cfg["normalize"]:
+        # loudnorm trabaja internamente a 192 kHz: el resample va detrás, en el mismo grafo
+        filters.append(
+            f"loudnorm=I={cfg['target_i']}:TP={cfg['target_tp']}:LRA={cfg['target_lra']}:print_format=json"
+        )
+    filters.append(f"aresample={sr}")
+
+    tmp_path = dst_path + ".part.wav"
+    cmd = [
+        "ffmpeg", "-y", "-hide_banner", "-i", src_path,
+        "-af", ",".join(filters),
+        "-ac", str(channels), "-ar", str(sr), "-c:a", "pcm_s16le",
+        tmp_path,
+    ]
+    try:
+        stats = run_ffmpeg(cmd, "audio_post")
+    except (subprocess.CalledProcessError, RuntimeError):
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, dst_path)
+
+    loudness = parse_loudnorm(stats.get("log_tail", [])) if cfg["normalize"] else {}
+    # La duración sale del propio progreso de ffmpeg; el WAV solo se abre si faltara
+    duration = stats.get("out_time") or _wav_duration(dst_path)
+
+    info = AudioInfo(os.path.abspath(dst_path), round(float(duration), 3), sr, channels, loudness)
+    if loudness:
+        log.info(
+            f"🔊 Audio normalizado: {loudness.get('input_i', '?')} -> {loudness.get('output_i', '?')} LUFS "
+            f"(objetivo {cfg['target_i']}) | {info.duration:.2f}s @ {sr} Hz"
+        )
+    else:
+        log.info(f"🔊 Audio remuestreado: {info.duration:.2f}s @ {sr} Hz")
+    return info
+
+
+def cut_audio(info, start, end, dst_path):
+    """
+    Recorta [start, end) segundos del WAV de `info` (ya post-procesado: PCM, sin re-codificar)
+    a `dst_path`. end=None llega hasta el final. Devuelve un AudioInfo del tramo.
+    """
+    with wave.open(info.path, "rb") as src:
+        rate = src.getframerate()
+        total = src.getnframes()
+        first = min(total, max(0, int(round(start * rate))))
+        last = total if end is None else min(total, max(first, int(round(end * rate))))
+        src.setpos(first)
+        frames = src.readframes(last - first)
+        params = src.getparams()
+    os.makedirs(os.path.dirname(os.path.abspath(dst_path)), exist_ok=True)
+    with wave.open(dst_path, "wb") as dst:
+        dst.setparams(params)
+        dst.writeframes(frames)
+    return AudioInfo(os.path.abspath(dst_path), round((last - first) / float(rate), 3), rate, params.nchannels,
+                     info.loudness)
@@ -0,0 +1,300 @@
+"""
+Análisis barato de clips de stock para elegir qué clip y qué tramo usar.
+
+ffmpeg decodifica (en CPU, un hilo) unos pocos fotogramas por segundo reducidos a
+36x64 en gris; sobre ese bloque (n, h, w) se calculan con NumPy, sin bucles:
+  - brillo y contraste por fotograma (fundidos a negro, planos estáticos/lisos),
+  - movimiento: diferencia absoluta media entre fotogramas consecutivos,
+  - cambio de escena: distancia entre histogramas consecutivos.
+Las URLs se descargan (con core.bandwidth, como el resto de descargas) a un temporal del
+scratch antes de decodificar. El resultado se cachea por id de Pexels (memoria + .npz en disco), así que cada vídeo
+se analiza una sola vez; la elección del tramo para una duración concreta es barata.
+Ambas cachés están acotadas: LRU de CLIP_ANALYSIS_MEMORY_ITEMS entradas en memoria y, en
+disco, se borran los .npz sin usar en CLIP_ANALYSIS_CACHE_MAX_DAYS días y los menos
+recientes si el directorio pasa de CLIP_ANALYSIS_CACHE_MAX_MB.
+"""
+import os, subprocess, tempfile, threading, time
+from collections import OrderedDict
+import numpy as np
+import requests
+import config
+import core.bandwidth as bandwidth
+import core.scratch as scratch
+from core.profiling import stage
+from core.tracing import get_logger
+
+log = get_logger("clip_analysis")
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = getattr(config, "CLIP_ANALYSIS_CACHE_DIR", os.path.join(BASE_DIR, "assets", "cache", "clip_analysis"))
+
+# Presupuesto por clip: tiempo de reloj máximo y segundos de vídeo analizados
+BUDGET_SECONDS = float(getattr(config, "CLIP_ANALYSIS_BUDGET", 3.0))
+MAX_SECONDS = float(getattr(config, "CLIP_ANALYSIS_MAX_SECONDS", 30.0))
+
+SAMPLE_FPS = 4
+FRAME_W, FRAME_H = 36, 64
+HIST_BINS = 16
+
+SCENE_CUT = 0.35     # distancia de histogramas a partir de la cual hay corte de plano
+DARK_LEVEL = 0.08    # brillo medio por debajo del cual el fotograma es "negro"
+FLAT_LEVEL = 0.03    # desviación típica por debajo de la cual el fotograma es liso
+MOTION_CAP = 0.08    # más movimiento que esto no suma (evita premiar clips temblorosos)
+CUT_PENALTY = 0.5    # penalización por cada corte de plano dentro del tramo
+
+# Límites de caché
+MEMORY_ITEMS = int(getattr(config, "CLIP_ANALYSIS_MEMORY_ITEMS", 2048))
+CACHE_MAX_MB = float(getattr(config, "CLIP_ANALYSIS_CACHE_MAX_MB", 256))
+CACHE_MAX_DAYS = float(getattr(config, "CLIP_ANALYSIS_CACHE_MAX_DAYS", 30))
+PRUNE_INTERVAL = 600.0  # segundos mínimos entre podas del disco
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+_last_prune = 0.0
+
+
+class ClipAnalysis:
+    """Series por muestra (SAMPLE_FPS) de un clip. `complete` es False si se agotó el presupuesto."""
+    __slots__ = ("fps", "brightness", "contrast", "motion", "scene", "complete")
+
+    def __init__(self, fps, brightness, contrast, motion, scene, complete=True):
+        self.fps = float(fps)
+        self.brightness = brightness
+        self.contrast = contrast
+        self.motion = motion
+        self.scene = scene
+        self.complete = bool(complete)
+
+    def __len__(self):
+        return len(self.motion)
+
+    @property
+    def duration(self):
+        return len(self) / self.fps
+
+    @classmethod
+    def from_frames(cls, frames, fps=SAMPLE_FPS, complete=True):
+        """frames: uint8 (n, h, w) en gris."""
+        n = len(frames)
+        f = frames.reshape(n, -1).astype(np.float32) / 255.0
+        brightness = f.mean(axis=1)
+        contrast = f.std(axis=1)
+
+        motion = np.zeros(n, dtype=np.float32)
+        motion[1:] = np.abs(f[1:] - f[:-1]).mean(axis=1)
+        if n > 1:
+            motion[0] = motion[1]
+
+        # Histogramas de todos los fotogramas con un único bincount
+        bins = frames.reshape(n, -1).astype(np.int64) * HIST_BINS // 256
+        bins += (np.arange(n) * HIST_BINS)[:, None]
+        hist = np.bincount(bins.ravel(), minlength=n * HIST_BINS).reshape(n, HIST_BINS)
+        hist = hist / float(frames[0].size)
+        scene = np.zeros(n, dtype=np.float32)
+        scene[1:] = 0.5 * np.abs(hist[1:] - hist[:-1]).sum(axis=1)
+        return cls(fps, brightness, contrast, motion, scene, complete)
+
+    # --- Caché en disco ---
+    def save(self, path):
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp, fps=self.fps, complete=self.complete,
+            brightness=self.brightness.astype(np.float16), contrast=self.contrast.astype(np.float16),
+            motion=self.motion.astype(np.float16), scene=self.scene.astype(np.float16),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as d:
+            return cls(float(d["fps"]), *(d[k].astype(np.float32) for k in ("brightness", "contrast", "motion", "scene")),
+                       complete=bool(d["complete"]))
+
+    # --- Selección de tramo ---
+    def window_scores(self, duration):
+        """Puntuación de cada posible inicio (en muestras) de un tramo de `duration` segundos."""
+        n = len(self)
+        w = min(max(1, int(round(duration * self.fps))), n)
+
+        def window_mean(x):
+            c = np.concatenate(([0.0], np.cumsum(x, dtype=np.float64)))
+            return (c[w:] - c[:-w]) / w
+
+        usable = (self.brightness > DARK_LEVEL) & (self.contrast > FLAT_LEVEL)
+        motion = np.minimum(self.motion, MOTION_CAP) / MOTION_CAP
+        # Cortes estrictamente dentro del tramo (un corte justo en el inicio no molesta)
+        cuts = np.concatenate(([0.0], np.cumsum(self.scene > SCENE_CUT, dtype=np.float64)))
+        inner_cuts = cuts[w:] - cuts[1:n - w + 2]
+        return window_mean(motion) - window_mean(~usable) - CUT_PENALTY * inner_cuts
+
+    def best_window(self, duration):
+        """(inicio en segundos, puntuación) del mejor tramo; ante empate, el más temprano."""
+        scores = self.window_scores(duration)
+        i = int(np.argmax(scores))
+        return i / self.fps, float(scores[i])
+
+
+def _fetch(url, path, deadline, session=None):
+    """Descarga `url` a `path` pasando por bandwidth.metered. False si se cortó por el plazo."""
+    http = session or requests
+    remaining = max(0.5, deadline - time.monotonic())
+    with http.get(url, stream=True, timeout=min(30.0, remaining)) as r:
+        r.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in bandwidth.metered(r.iter_content(chunk_size=256 * 1024)):
+                f.write(chunk)
+                if time.monotonic() > deadline:
+                    return False  # lo ya bajado se analiza igualmente (análisis incompleto)
+    return True
+
+
+def _read_frames(source, max_seconds, budget, session=None):
+    """
+    Decodifica muestras reducidas con ffmpeg hasta agotar el vídeo, max_seconds o el presupuesto
+    (que incluye la descarga si `source` es una URL).
+    """
+    if source.startswith(("http://", "https://")):
+        deadline = time.monotonic() + budget
+        fd, path = tempfile.mkstemp(suffix=".mp4", prefix="analysis_", dir=scratch.root())
+        os.close(fd)
+        try:
+            fetched = _fetch(source, path, deadline, session)
+            frames, complete = _read_frames(path, max_seconds, max(0.5, deadline - time.monotonic()))
+            return frames, complete and fetched
+        except requests.RequestException as e:
+            raise OSError(f"descarga fallida: {e}") from e
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    cmd = [
+        "ffmpeg", "-nostdin", "-v", "error", "-threads", "1",
+        "-t", f"{max_seconds:.3f}", "-i", source, "-an",
+        "-vf", f"fps={SAMPLE_FPS},scale={FRAME_W}:{FRAME_H},format=gray",
+        "-f", "rawvideo", "pipe:1",
+    ]
+    frame_bytes = FRAME_W * FRAME_H
+    proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    timer = threading.Timer(budget, proc.kill)
+    timer.start()
+    chunks = []
+    try:
+        while True:
+            chunk = proc.stdout.read(frame_bytes)
+            if len(chunk) < frame_bytes:
+                break
+            chunks.append(chunk)
+    finally:
+        timer.cancel()
+        proc.stdout.close()
+        rc = proc.wait()
+    complete = rc == 0
+    frames = np.frombuffer(b"".join(chunks), dtype=np.uint8).reshape(-1, FRAME_H, FRAME_W)
+    return frames, complete
+
+
+def _cache_path(video_id):
+    return os.path.join(CACHE_DIR, f"{video_id}.npz")
+
+
+def _remember(key, analysis):
+    with _lock:
+        _memory[key] = analysis
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_ITEMS:
+            _memory.popitem(last=False)
+
+
+def prune_disk_cache(max_mb=CACHE_MAX_MB, max_days=CACHE_MAX_DAYS):
+    """
+    Borra los .npz sin usar en `max_days` y, si aún se pasa de `max_mb`, los menos recientes
+    (el mtime se renueva en cada acierto) hasta quedar en el 90%. Devuelve cuántos borró.
+    """
+    try:
+        entries = []
+        with os.scandir(CACHE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith(".npz") and entry.is_file():
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+    except FileNotFoundError:
+        return 0
+    entries.sort()
+    cutoff = time.time() - max_days * 86400
+    total = sum(size for _, size, _ in entries)
+    limit = max_mb * 1024 * 1024
+    shrink = total > limit
+    removed = 0
+    for mtime, size, path in entries:
+        if mtime >= cutoff and not (shrink and total > limit * 0.9):
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        log.info(f"🧹 Caché de análisis: {removed} archivos borrados ({total / 1e6:.1f} MB)")
+    return removed
+
+
+def _maybe_prune():
+    global _last_prune
+    with _lock:
+        now = time.monotonic()
+        if _last_prune and now - _last_prune < PRUNE_INTERVAL:
+            return
+        _last_prune = now
+    prune_disk_cache()
+
+
+def analyze_clip(source, video_id=None, max_seconds=MAX_SECONDS, budget=BUDGET_SECONDS, session=None):
+    """
+    Devuelve el ClipAnalysis de `source` (URL o ruta), cacheado por `video_id`.
+    `session`: sesión HTTP para descargar URLs (reutiliza conexiones). None si no se pudo
+    decodificar nada útil.
+    """
+    key = str(video_id) if video_id is not None else None
+    if key is not None:
+        with _lock:
+            cached = _memory.get(key)
+            if cached is not None:
+                _memory.move_to_end(key)
+        if cached is not None:
+            return cached
+        if os.path.exists(_cache_path(key)):
+            try:
+                cached = ClipAnalysis.load(_cache_path(key))
+                os.utime(_cache_path(key))  # uso reciente para la poda por tamaño
+                _remember(key, cached)
+                return cached
+            except Exception as e:
+                log.warning(f"Caché de análisis corrupta para {key}: {e}")
+
+    with stage("clip_analysis"):
+        t0 = time.perf_counter()
+        try:
+            frames, complete = _read_frames(source, max_seconds, budget, session)
+        except OSError as e:
+            log.warning(f"⚠️ No se pudo analizar el clip {key or source}: {e}")
+            return None
+        if len(frames) < 2:
+            return None
+        analysis = ClipAnalysis.from_frames(frames, complete=complete)
+        log.info(
+            f"🔎 Clip {key or '-'} analizado: {analysis.duration:.1f}s en {time.perf_counter() - t0:.2f}s"
+            + ("" if complete else " (presupuesto agotado)")
+        )
+
+    if key is not None:
+        _remember(key, analysis)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            analysis.save(_cache_path(key))
+        except OSError as e:
+            log.warning(f"No se pudo guardar el análisis de {key}: {e}")
+        _maybe_prune()
+    return analysis
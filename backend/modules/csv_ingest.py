@@ -0,0 +1,64 @@
+import csv, io
+
+# Columnas que entiende el pipeline (el resto se ignora)
+BATCH_COLUMNS = ("texto", "profile", "titulo", "keywords", "layout")
+SNIFF_BYTES = 64 * 1024
+
+
+def _sniff_dialect(binary_file):
+    """Detecta el separador leyendo solo una muestra del inicio del archivo."""
+    sample = binary_file.read(SNIFF_BYTES)
+    binary_file.seek(0)
+    text = sample.decode("utf-8-sig", errors="ignore")
+    # Cortamos en el último salto de línea para no confundir al Sniffer con una fila a medias
+    if "\n" in text:
+        text = text[: text.rfind("\n")]
+    try:
+        return csv.Sniffer().sniff(text, delimiters=",;\t|")
+    except csv.Error:
+        return csv.excel
+
+
+def iter_csv_rows(binary_file):
+    """
+    Parsea el CSV de forma incremental (fila a fila) sin cargarlo entero en memoria.
+    Devuelve tuplas (row_idx, dict) solo para filas con 'texto' no vacío.
+    """
+    dialect = _sniff_dialect(binary_file)
+    text_stream = io.TextIOWrapper(binary_file, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        reader = csv.reader(text_stream, dialect)
+        header = next(reader, None)
+        if not header:
+            raise ValueError("CSV vacío")
+        columns = [h.strip().lower() for h in header]
+        if "texto" not in columns:
+            raise ValueError("El CSV no tiene columna 'texto'")
+        index = {c: columns.index(c) for c in BATCH_COLUMNS if c in columns}
+
+        for row_idx, values in enumerate(reader):
+            row = {}
+            for col, pos in index.items():
+                val = values[pos].strip() if pos < len(values) else ""
+                row[col] = val or None
+            if row.get("texto"):
+                yield row_idx, row
+    finally:
+        # Evita que el wrapper cierre el archivo subido al ser recolectado
+        text_stream.detach()
+
+
+def ingest_csv(binary_file, store, batch_id, chunk_size=500):
+    """Vuelca las filas al JobStore en bloques. Memoria constante sea cual sea el tamaño del CSV."""
+    total, chunk = 0, []
+    for item in iter_csv_rows(binary_file):
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            store.add_rows(batch_id, chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        store.add_rows(batch_id, chunk)
+        total += len(chunk)
+    store.finish_ingest(batch_id)
+    return total
@@ -1,18 +1,24 @@
-import spacy
+import subprocess, sys
 from functools import lru_cache
+import core.model_manager as models
+from core.tracing import get_logger
+
+log = get_logger("processor")
+
+SPACY_MODEL = "es_core_news_sm"
 
 # --- CARGA OPTIMIZADA DEL MODELO ---
 def load_nlp():
+    import spacy
     try:
-        return spacy.load("es_core_news_sm")
+        return spacy.load(SPACY_MODEL)
     except OSError:
-        import os
-        print("Descargando modelo de spaCy...")
-        os.system("python -m spacy download es_core_news_sm")
-        return spacy.load("es_core_news_sm")
+        log.info("Descargando modelo de spaCy...")
+        subprocess.run([sys.executable, "-m", "spacy", "download", SPACY_MODEL], check=True)
+        return spacy.load(SPACY_MODEL)
 
-# Cargamos el modelo una sola vez al importar el módulo
-nlp = load_nlp()
+# Se carga en el warm-up del arranque o en el primer uso (ver core.model_manager)
+models.register("spacy", load_nlp)
 
 # CONCEPTOS CLAVE: Usamos lemas (raíces) para máxima coincidencia
 # Ejemplo: "disciplinado", "disciplinas" -> "disciplina"
@@ -41,7 +47,8 @@ def extract_keywords(text: str):
     if not text or len(text.strip()) < 3:
         return "cinematic lifestyle"
 
-    doc = nlp(text.lower())
+    with models.use("spacy") as nlp:
+        doc = nlp(text.lower())
     
     # 1. Intentar detectar conceptos abstractos del diccionario (por lema)
     for token in doc:
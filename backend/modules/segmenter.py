@@ -0,0 +1,218 @@
+"""
+Segmentación vectorizada de timelines de palabras.
+
+Trabaja directamente sobre el WordTimeline (core.timeline): los cortes se calculan para
+todas las posiciones a la vez sobre los arrays de inicio/fin (ms) y flags de puntuación;
+solo el encadenado final de segmentos es un bucle (de enteros, no de palabras). Sirve
+igual para un short de 30 s que para cortar una narración de 10 minutos en varios shorts.
+"""
+import math
+import numpy as np
+from core.timeline import SegmentTable, WordTimeline, rebase_ms
+
+# Umbrales por defecto (sobrescribibles con "segmentation" en el perfil)
+DEFAULT_SEGMENTATION = {
+    "gap": 0.3,               # silencio (s) que fuerza un corte
+    "punct_min": 1.2,         # con puntuación, cortar si el segmento ya dura más que esto
+    "max_duration": 3.5,      # duración máxima de un segmento
+    "short_max_duration": 60.0,  # duración máxima de cada short al partir un timeline largo
+}
+
+
+def segmentation_config(overrides=None):
+    """Umbrales efectivos: defaults + el bloque "segmentation" del perfil (si lo hay)."""
+    cfg = dict(DEFAULT_SEGMENTATION)
+    cfg.update({k: float(v) for k, v in (overrides or {}).items() if k in DEFAULT_SEGMENTATION})
+    return cfg
+
+
+def _next_true(mask):
+    """Para cada i, el primer índice j >= i con mask[j] (len(mask) si no hay). Longitud n+1."""
+    n = len(mask)
+    idx = np.where(mask, np.arange(n), n)
+    out = np.empty(n + 1, dtype=np.int64)
+    out[:n] = np.minimum.accumulate(idx[::-1])[::-1]
+    out[n] = n
+    return out
+
+
+def _first_exceeding(end_cummax, starts, threshold, eps=1e-6):
+    """
+    Para cada s, el primer índice i con end_cummax[i] - starts[s] > threshold (n si no hay).
+    searchsorted sobre start + threshold difiere en el último ulp de la resta original,
+    así que buscamos un poco antes y avanzamos comparando la resta tal cual.
+    """
+    n = len(end_cummax)
+    idx = np.searchsorted(end_cummax, starts + (threshold - eps), side="right")
+    while True:
+        pending = idx < n
+        pending[pending] = (end_cummax[idx[pending]] - starts[pending]) <= threshold
+        if not pending.any():
+            return idx
+        idx[pending] += 1
+
+
+def segment_bounds(starts, ends, punct, gap=0.3, punct_min=1.2, max_duration=3.5):
+    """
+    Devuelve (first, last): índices de la primera y última palabra de cada segmento.
+
+    Las unidades de tiempo son las de los arrays (el timeline usa ms).
+    Un segmento que empieza en la palabra s termina en la primera palabra i >= s tal que:
+      - el silencio hasta la siguiente palabra supera `gap`, o
+      - tiene puntuación y end[i] - start[s] > punct_min, o
+      - end[i] - start[s] > max_duration, o
+      - es la última palabra.
+    Los tres candidatos se calculan para todos los s posibles con searchsorted.
+    """
+    n = len(starts)
+    if n == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    # float64 representa exactamente los ms enteros y evita desbordes de uint32 al restar
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+
+    gaps = np.empty(n)
+    gaps[:-1] = starts[1:] - ends[:-1]
+    gaps[-1] = np.inf
+    next_hard = _next_true(gaps > gap)[:n]
+    next_punct = _next_true(np.asarray(punct, dtype=bool))
+
+    # El máximo acumulado permite buscar "primer índice con end > umbral" con searchsorted.
+    # Es exacto para la condición de duración; la de puntuación asume 'end' monótono (Whisper)
+    end_cummax = np.maximum.accumulate(ends)
+    positions = np.arange(n)
+    by_duration = np.maximum(_first_exceeding(end_cummax, starts, max_duration), positions)
+    punct_from = np.maximum(_first_exceeding(end_cummax, starts, punct_min), positions)
+    by_punct = next_punct[punct_from]
+
+    cut = np.minimum(np.minimum(by_duration, by_punct), next_hard)
+
+    # Encadenado: cada segmento empieza justo después del corte del anterior
+    nxt = (cut + 1).tolist()
+    firsts, s = [], 0
+    while s < n:
+        firsts.append(s)
+        s = nxt[s]
+    first = np.asarray(firsts, dtype=np.int64)
+    return first, cut[first]
+
+
+def segment_timeline(timeline, config=None):
+    """Agrupa el timeline en segmentos con los umbrales del perfil. Devuelve una SegmentTable."""
+    cfg = segmentation_config(config)
+    first, last = segment_bounds(
+        timeline.start_ms, timeline.end_ms, timeline.punct,
+        cfg["gap"] * 1000, cfg["punct_min"] * 1000, cfg["max_duration"] * 1000,
+    )
+    return SegmentTable.from_bounds(timeline, first, last)
+
+
+def group_words(words, config=None):
+    """Variante para listas de dicts (JSON de la API): mismo formato que el antiguo group_timestamps."""
+    if not words:
+        return []
+    return segment_timeline(WordTimeline.from_words(words), config).to_json()
+
+
+def short_cut_points(seg_starts, seg_ends, seg_sentence_end, target_count=None, max_duration=60.0):
+    """
+    Elige en qué segmentos partir un timeline largo en `target_count` shorts
+    (por defecto, los mínimos para no superar `max_duration`).
+    Cada corte se coloca en el final de frase más cercano al punto ideal si está a menos de
+    un cuarto de short y ninguno de los dos shorts vecinos pasa de `max_duration`; si no,
+    en el final de segmento más cercano. Si aun así algún short se pasa, se sube
+    `target_count` hasta que todos quepan (o no queden segmentos que partir).
+    Devuelve los índices de segmento tras los que se corta.
+    """
+    n = len(seg_starts)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    total = float(seg_ends[-1] - seg_starts[0])
+    if not target_count:
+        target_count = max(1, math.ceil(total / max_duration))
+    target_count = int(min(target_count, n))
+    while True:
+        cuts = _pick_cuts(seg_starts, seg_ends, seg_sentence_end, target_count, max_duration)
+        if target_count >= n or _short_lengths(cuts, seg_starts, seg_ends).max() <= max_duration:
+            return cuts
+        target_count += 1
+
+
+def _short_lengths(cuts, seg_starts, seg_ends):
+    firsts = np.concatenate(([0], cuts + 1))
+    lasts = np.concatenate((cuts, [len(seg_starts) - 1]))
+    return seg_ends[lasts] - seg_starts[firsts]
+
+
+def _pick_cuts(seg_starts, seg_ends, seg_sentence_end, target_count, max_duration):
+    n = len(seg_starts)
+    if target_count <= 1:
+        return np.empty(0, dtype=np.int64)
+    total = float(seg_ends[-1] - seg_starts[0])
+    targets = seg_starts[0] + total * np.arange(1, target_count) / target_count
+    boundary_t = seg_ends[:-1]  # no se puede cortar tras el último segmento
+
+    any_pick, _ = _nearest(np.arange(n - 1), boundary_t, targets)
+    sentence_cands = np.flatnonzero(seg_sentence_end[:-1])
+    if len(sentence_cands) == 0:
+        return np.unique(any_pick)
+    sent_pick, sent_dist = _nearest(sentence_cands, boundary_t, targets)
+
+    # En orden: cada corte se valida contra el anterior ya decidido y el siguiente provisional
+    # (que a su vez se valida contra este al decidirse)
+    cuts = any_pick.copy()
+    tolerance = total / target_count / 4
+    for k in range(len(cuts)):
+        cand = int(sent_pick[k])
+        prev_cut = int(cuts[k - 1]) if k else -1
+        next_last = int(cuts[k + 1]) if k + 1 < len(cuts) else n - 1
+        if sent_dist[k] > tolerance or not prev_cut < cand < next_last:
+            continue
+        if (seg_ends[cand] - seg_starts[prev_cut + 1] <= max_duration
+                and seg_ends[next_last] - seg_starts[cand + 1] <= max_duration):
+            cuts[k] = cand
+    return np.unique(cuts)
+
+
+def _nearest(candidates, times, targets):
+    """Para cada objetivo, el candidato cuyo tiempo es más cercano (y su distancia)."""
+    cand_t = times[candidates]
+    pos = np.searchsorted(cand_t, targets)
+    left = candidates[np.clip(pos - 1, 0, len(candidates) - 1)]
+    right = candidates[np.clip(pos, 0, len(candidates) - 1)]
+    d_left, d_right = np.abs(times[left] - targets), np.abs(times[right] - targets)
+    return np.where(d_left <= d_right, left, right), np.minimum(d_left, d_right)
+
+
+def split_into_shorts(timeline, config=None, target_count=None):
+    """
+    Parte un timeline largo en varios shorts en una sola pasada.
+    Devuelve [{"start", "end", "timeline", "segments"}] con start/end en segundos sobre el
+    audio original y timeline/segments rebasados a 0 (listos para recortar y renderizar).
+    """
+    if not len(timeline):
+        return []
+    cfg = segmentation_config(config)
+    table = segment_timeline(timeline, cfg)
+    seg_first, seg_count = table.data["first"], table.data["count"]
+    seg_last = seg_first + seg_count - 1
+    cuts = short_cut_points(table.starts, table.ends, timeline.sentence_end[seg_last],
+                            target_count, cfg["short_max_duration"])
+
+    shorts, seg_from = [], 0
+    for seg_to in cuts.tolist() + [len(table) - 1]:
+        w0, w1 = int(seg_first[seg_from]), int(seg_last[seg_to]) + 1
+        offset = int(timeline.start_ms[w0])
+        sub = timeline.slice(w0, w1, offset_ms=offset)
+        sub_segments = table.data[seg_from:seg_to + 1].copy()
+        sub_segments["first"] -= w0
+        rebase_ms(sub_segments, offset)
+        shorts.append({
+            "start": offset / 1000,
+            "end": int(timeline.end_ms[w1 - 1]) / 1000,
+            "timeline": sub,
+            "segments": SegmentTable(sub, sub_segments),
+        })
+        seg_from = seg_to + 1
+    return shorts
@@ -1,31 +1,52 @@
-import os, subprocess, pysubs2, time, gc, shutil, wave
+import os, subprocess, pysubs2, gc, wave
+import imageio
+import numpy as np
 import movis as mv
 from core.profile_manager import load_profile
+from core.layout_engine import stock_layer_side
 import core.sprite_controller as sprite_controller
+from core.profiling import stage
+from core.ffmpeg_runner import run_ffmpeg, FFmpegStalled
+from core.tracing import get_logger
+from core.progress import StageProgress
+from core.timeline import SegmentTable
+
+log = get_logger("video_engine")
 
 os.environ["OMP_NUM_THREADS"] = "8" 
 
+# Encoder del render final: "nvenc" (GPU; si la máquina no tiene NVENC/CUDA se reintenta en CPU)
+# o "libx264" (CPU directamente, p.ej. benchmarks en máquinas sin GPU)
+FINAL_ENCODER = os.environ.get("AI_SHORTS_FINAL_ENCODER", "nvenc").strip().lower()
+# Mensajes de ffmpeg que indican que falta NVENC/CUDA (y no un error de entradas o del .ass)
+_NO_NVENC_MARKERS = (
+    "unknown encoder", "cannot load libcuda", "cannot load nvcuda", "no nvenc capable devices",
+    "openencodesessionex failed", "cannot load libnvidia-encode", "device creation failed",
+    "hwaccel initialisation returned error", "no device available for decoder",
+)
+
 class VideoEngine:
-    def __init__(self, output_path):
+    # Los valores del perfil (posición del personaje, tamaños) están pensados para 1080x1920
+    BASE_CANVAS = (1080, 1920)
+
+    def __init__(self, output_path, canvas_size=None):
         self.output_path = os.path.abspath(output_path)
-        self.canvas_size = (1080, 1920) 
-        self.temp_dir = os.path.abspath("assets/output")
-        os.makedirs(self.temp_dir, exist_ok=True)
+        self.canvas_size = tuple(canvas_size or self.BASE_CANVAS)
         # Cache para evitar recargar imágenes idénticas del disco
         self._sprite_cache = {}
 
-    def _generate_ass(self, segments, profile, override_preset=None, override_margin=None):
-        print(f"📝 Generando archivo de subtítulos (.ass)...")
+    def _generate_ass(self, segments, profile, out_path, override_preset=None, override_margin=None):
+        log.info(f"📝 Generando archivo de subtítulos (.ass)...")
         st_cfg = profile.get("layout", {}).get("subtitles", {})
         selected_preset = override_preset or st_cfg.get("preset_path", "default.ass")
         preset_path = os.path.join("assets", "subtitles", selected_preset)
         
         subs = pysubs2.load(preset_path) if os.path.exists(preset_path) else pysubs2.SSAFile()
         subs.events = [] 
-        subs.info["PlayResX"], subs.info["PlayResY"] = 1080, 1920
+        subs.info["PlayResX"], subs.info["PlayResY"] = self.canvas_size
         
         for style in subs.styles.values():
-            style.fontsize = 120 
+            style.fontsize = int(120 * self.canvas_size[0] / self.BASE_CANVAS[0])
             style.fontname = "Arial Black"
             style.alignment = 5           
             style.outline = 6
@@ -37,37 +58,64 @@ class VideoEngine:
 
         highlight = st_cfg.get("highlight_color", r"&H00FFFF&")
         word_count = 0
-        for seg in segments:
-            for w in seg.get("words", []):
-                start, end = int(w["start"] * 1000), int(w["end"] * 1000)
-                tags = r"\fscx0\fscy0\t(0,80,\fscx115\fscy115)\t(80,150,\fscx100\fscy100)"
-                text = f"{{{tags}\\1c{highlight}}}{w['word'].upper()}"
+        tags = r"\fscx0\fscy0\t(0,80,\fscx115\fscy115)\t(80,150,\fscx100\fscy100)"
+        timeline = segments.timeline
+        strings = timeline.vocab.strings
+        for i in range(len(segments)):
+            first, last = segments.word_range(i)
+            words = timeline.data[first:last]
+            # Los tiempos ya están en ms: sin conversión por palabra
+            for start, end, word_id in zip(words["start"].tolist(), words["end"].tolist(), words["word"].tolist()):
+                text = f"{{{tags}\\1c{highlight}}}{strings[word_id].upper()}"
                 subs.append(pysubs2.SSAEvent(start=start, end=end, text=text))
                 word_count += 1
         
-        path = os.path.join(self.temp_dir, f"subs_{int(time.time()*1000)}.ass")
-        subs.save(path)
-        print(f"✅ Subtítulos generados: {word_count} palabras procesadas.")
-        return path
+        subs.save(out_path)
+        log.info(f"✅ Subtítulos generados: {word_count} palabras procesadas.")
+        return out_path
+
+    @staticmethod
+    def plan_sprites(segments, prof):
+        """
+        Sprite del personaje para cada segmento (None si el perfil no usa personaje).
+        sprite_controller guarda estado global: las variantes de un job comparten un único
+        plan calculado antes de renderizar en paralelo (y así muestran las mismas poses).
+        """
+        char_cfg = prof.get("character", {})
+        if not char_cfg.get("enabled", False):
+            return None
+        sprite_pack = char_cfg.get("sprite_pack", "")
+        sprite_controller.reset_controller()
+        return [sprite_controller.pick_sprite(segments.phrase(i), sprite_pack) for i in range(len(segments))]
 
     def assemble_video(self, clip_paths, audio_path, segments, profile_name, job_path, 
-                        preset_from_front=None, position_from_front=None, layout_mode=None):
+                        preset_from_front=None, position_from_front=None, layout_mode=None,
+                        audio_duration=None, sprite_plan=None):
         
-        print(f"\n🎬 --- INICIANDO ENSAMBLAJE (Movis Engine) ---")
-        sprite_controller.reset_controller() 
+        log.info(f"🎬 --- INICIANDO ENSAMBLAJE (Movis Engine) ---")
+        if not isinstance(segments, SegmentTable):
+            segments = SegmentTable.from_json(segments)
+        seg_starts = segments.starts.tolist()
         prof = load_profile(profile_name)
+        if sprite_plan is None:
+            sprite_plan = self.plan_sprites(segments, prof)
         is_full_screen = str(layout_mode).lower() == "full_screen"
         
-        with wave.open(audio_path, 'rb') as f:
-            duration = float(f.getnframes() / f.getframerate())
+        # La duración llega de audio_post; solo /export (audio ya en disco) lee la cabecera
+        if audio_duration:
+            duration = float(audio_duration)
+        else:
+            with wave.open(audio_path, 'rb') as f:
+                duration = float(f.getnframes() / f.getframerate())
         
-        print(f"⏳ Duración: {duration:.2f}s | Perfil: {profile_name}")
+        log.info(f"⏳ Duración: {duration:.2f}s | Perfil: {profile_name}")
         
         comp = mv.layer.Composition(size=self.canvas_size, duration=duration)
-        scale_ratio = 1.0 
+        # Escala respecto al lienzo de referencia (1:1 => 0.5625 en vertical)
+        scale_ratio = self.canvas_size[1] / self.BASE_CANVAS[1]
 
         # --- 1. CAPA FONDO ---
-        print(f"🖼️ Configurando capa de fondo...")
+        log.info(f"🖼️ Configurando capa de fondo...")
         if is_full_screen:
             bg_video_path = prof.get("background", {}).get("path")
             if bg_video_path and os.path.exists(bg_video_path):
@@ -76,12 +124,12 @@ class VideoEngine:
                 scale_factor = max(self.canvas_size[0] / v_bg.size[0], self.canvas_size[1] / v_bg.size[1])
                 l_loop.scale.set(scale_factor)
                 l_loop.add_effect(mv.effect.GaussianBlur(radius=10)) 
-                print(f"   ↳ Fondo estático aplicado.")
+                log.info(f"↳ Fondo estático aplicado.")
         else:
             for i, path in enumerate(clip_paths):
                 if i >= len(segments) or not os.path.exists(path): continue
-                s_t = float(segments[i]["start"])
-                e_t = float(segments[i+1]["start"] if i < len(segments)-1 else duration)
+                s_t = seg_starts[i]
+                e_t = seg_starts[i+1] if i < len(segments)-1 else duration
                 v_layer = mv.layer.Video(path)
                 l_bg = comp.add_layer(v_layer, offset=s_t, end_time=e_t)
                 l_bg.position.set((self.canvas_size[0]/2, self.canvas_size[1]/2))
@@ -90,13 +138,13 @@ class VideoEngine:
 
         # --- 2. CAPA CLIPS DE STOCK ---
         if is_full_screen:
-            print(f"🎞️ Superponiendo clips de stock...")
-            side = int(600 * scale_ratio) 
+            log.info(f"🎞️ Superponiendo clips de stock...")
+            side = stock_layer_side(prof, layout_mode, self.canvas_size)
             center_y_stock = self.canvas_size[1] * 0.30 
             for i, path in enumerate(clip_paths):
                 if i >= len(segments) or not os.path.exists(path): continue
-                s_t = float(segments[i]["start"])
-                e_t = float(segments[i+1]["start"] if i < len(segments)-1 else duration)
+                s_t = seg_starts[i]
+                e_t = seg_starts[i+1] if i < len(segments)-1 else duration
                 v_src = mv.layer.Video(path)
                 l_st = comp.add_layer(v_src, offset=s_t, end_time=e_t)
                 l_st.position.set((self.canvas_size[0]/2, center_y_stock))
@@ -107,21 +155,21 @@ class VideoEngine:
 
         # --- 3. CAPA PERSONAJE (OPTIMIZADA CON CACHE) ---
         char_cfg = prof.get("character", {})
-        if char_cfg.get("enabled", False):
-            print(f"👤 Procesando personaje...")
+        if sprite_plan:
+            log.info(f"👤 Procesando personaje...")
             char_pos = char_cfg.get("position", {"x": 540, "y": 1500})
-            base_pos = (float(char_pos["x"]), float(char_pos["y"]))
-            base_scale = float(char_cfg.get("scale", 1.0))
-            sprite_pack = char_cfg.get("sprite_pack", "")
+            base_pos = (float(char_pos["x"]) * self.canvas_size[0] / self.BASE_CANVAS[0],
+                        float(char_pos["y"]) * scale_ratio)
+            base_scale = float(char_cfg.get("scale", 1.0)) * scale_ratio
             fade_dur = 0.12  
             
-            for i, seg in enumerate(segments):
-                s_start = float(seg["start"])
-                s_next = float(segments[i+1]["start"]) if i < len(segments)-1 else duration
+            for i in range(len(segments)):
+                s_start = seg_starts[i]
+                s_next = seg_starts[i+1] if i < len(segments)-1 else duration
                 s_end = min(s_next + fade_dur, duration)
 
-                img_path = sprite_controller.pick_sprite(seg["phrase"], sprite_pack)
-                if os.path.exists(img_path):
+                img_path = sprite_plan[i]
+                if img_path and os.path.exists(img_path):
                     # Cache de imagen para evitar I/O redundante
                     if img_path not in self._sprite_cache:
                         self._sprite_cache[img_path] = mv.layer.Image(img_path)
@@ -137,18 +185,25 @@ class VideoEngine:
                         keyframes=[0.0, actual_fade, (s_end - s_start) - actual_fade, (s_end - s_start)],
                         values=[0.0, 1.0, 1.0, 0.0]
                     )
-            print(f"✅ Personaje configurado.")
+            log.info(f"✅ Personaje configurado.")
 
         # --- 4. RENDER VISUAL ---
-        temp_video = os.path.join(job_path, "visual_raw.mp4")
-        print(f"⚙️ Iniciando renderizado Raw a 24 FPS...")
-        comp.write_video(temp_video, fps=24, audio=False) 
+        # Un raw por salida: las variantes de un job comparten job_path
+        out_name = os.path.splitext(os.path.basename(self.output_path))[0]
+        temp_video = os.path.join(job_path, f"visual_raw_{out_name}.mp4")
+        log.info(f"⚙️ Iniciando renderizado Raw a 24 FPS...")
+        with stage("movis_render"):
+            self._write_composition(comp, temp_video, fps=24, duration=duration)
 
         # --- 5. SUBTÍTULOS Y FFmpeg ---
-        final_margin = 0 if is_full_screen else 200 
-        ass_path = self._generate_ass(segments, prof, preset_from_front, final_margin)
+        final_margin = 0 if is_full_screen else int(200 * scale_ratio)
+        with stage("subtitles"):
+            # En el scratch del job (se borra con él); uno por salida por si hay variantes
+            ass_path = self._generate_ass(segments, prof, os.path.join(job_path, f"subs_{out_name}.ass"),
+                                          preset_from_front, final_margin)
 
-        final_path = self._run_final_ffmpeg(temp_video, audio_path, ass_path)
+        with stage("final_encode"):
+            final_path = self._run_final_ffmpeg(temp_video, audio_path, ass_path, duration)
 
         # --- LIMPIEZA DE MEMORIA ---
         self._sprite_cache.clear()
@@ -156,10 +211,34 @@ class VideoEngine:
 
         return final_path
 
-    def _run_final_ffmpeg(self, video_in, audio_in, ass_path):
-        print(f"🚀 Render final con FFmpeg (NVENC)...")
+    def _write_composition(self, comp, out_path, fps, duration):
+        """
+        Equivalente a comp.write_video(audio=False) pero reportando el progreso
+        frame a frame (movis solo lo muestra con tqdm en consola).
+        """
+        tracker = StageProgress("movis_render", duration)
+        times = np.arange(0.0, duration, 1.0 / fps)
+        report_every = max(1, int(fps))  # una actualización por segundo de vídeo
+        writer = imageio.get_writer(
+            uri=out_path, fps=fps, codec="libx264", pixelformat="yuv420p",
+            macro_block_size=None, ffmpeg_log_level="error"
+        )
+        try:
+            for i, t in enumerate(times):
+                writer.append_data(np.asarray(comp(t)))
+                if i % report_every == 0:
+                    tracker.advance(t + 1.0 / fps)
+        finally:
+            writer.close()
+        tracker.advance(duration)
+        log.info(f"✅ Render movis: {len(times)} frames a {tracker.realtime_factor or 0:.2f}x tiempo real")
+
+    def _run_final_ffmpeg(self, video_in, audio_in, ass_path, duration=None):
         ass_p = os.path.abspath(ass_path).replace("\\", "/").replace(":", "\\:")
-        
+        if FINAL_ENCODER == "libx264":
+            return self._run_final_ffmpeg_cpu(video_in, audio_in, ass_p, duration)
+
+        log.info(f"🚀 Render final con FFmpeg (NVENC)...")
         cmd = [
             "ffmpeg", "-y",
             "-hwaccel", "cuda",             # Aceleración de decodificación
@@ -180,10 +259,37 @@ class VideoEngine:
         ]
         
         try:
-            subprocess.run(cmd, check=True)
-            print(f"🏁 PROCESO COMPLETADO: {self.output_path}")
+            run_ffmpeg(cmd, "final_encode", progress=StageProgress("final_encode", duration))
+            log.info(f"🏁 PROCESO COMPLETADO: {self.output_path}")
         except subprocess.CalledProcessError as e:
-            print(f"❌ Error FFmpeg: {e}")
+            # Solo se pasa a CPU si falta NVENC/CUDA; cualquier otro error (entradas, .ass) se propaga
+            if not any(m in (e.stderr or "").lower() for m in _NO_NVENC_MARKERS):
+                log.error(f"❌ Error FFmpeg: {e}")
+                raise
+            log.warning(f"⚠️ NVENC no disponible, reintentando con libx264...")
+            return self._run_final_ffmpeg_cpu(video_in, audio_in, ass_p, duration)
+        except FFmpegStalled as e:
+            log.error(f"❌ Error FFmpeg: {e}")
+            raise
+
+        return self.output_path
+
+    def _run_final_ffmpeg_cpu(self, video_in, audio_in, ass_p, duration=None):
+        cmd_cpu = [
+            "ffmpeg", "-y",
+            "-i", video_in,
+            "-i", audio_in,
+            "-vf", f"ass='{ass_p}'",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+            "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-b:a", "192k",
+            "-shortest",
+            self.output_path
+        ]
+        try:
+            run_ffmpeg(cmd_cpu, "final_encode_cpu", progress=StageProgress("final_encode", duration))
+            log.info(f"🏁 PROCESO COMPLETADO: {self.output_path}")
+        except (subprocess.CalledProcessError, FFmpegStalled) as e:
+            log.error(f"❌ Error FFmpeg: {e}")
             raise e
-            
         return self.output_path
\ No newline at end of file
@@ -1,36 +1,69 @@
-import os, json, re, time, unicodedata, torch, subprocess, shutil, requests, warnings
-from pydub import AudioSegment
+import os, re, time, unicodedata, subprocess, shutil, requests, warnings
 from functools import lru_cache
-from faster_whisper import WhisperModel
-from elevenlabs.client import ElevenLabs
 import config  # Importación del archivo central de configuración
+import core.model_manager as models
+from core.tracing import get_logger
+from core.timeline import TimelineBuilder, dump as dump_timeline
+from modules.audio_post import postprocess_audio
+
+log = get_logger("voice_engine")
 
 os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "1"
 warnings.filterwarnings("ignore", category=UserWarning)
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PIPER_MODELS_DIR = os.path.join(BASE_DIR, "assets", "models")
+WHISPER_MODEL = getattr(config, "WHISPER_MODEL", "medium")
+
 # --- CONFIGURACIÓN ELEVENLABS (Mismo sistema que AssetManager) ---
 ELEVEN_API_KEY = getattr(config, "ELEVENLABS_API_KEY", None)
+ELEVEN_ENABLED = bool(ELEVEN_API_KEY and ELEVEN_API_KEY.strip() not in ("", "###"))
 
-if not ELEVEN_API_KEY or ELEVEN_API_KEY.strip() in ("", "###"):
-    print("⚠️ ELEVENLABS_API_KEY no configurada en config.py. Se usará Piper por defecto.")
-    client = None
-else:
-    client = ElevenLabs(api_key=ELEVEN_API_KEY)
+if not ELEVEN_ENABLED:
+    log.warning("⚠️ ELEVENLABS_API_KEY no configurada en config.py. Se usará Piper por defecto.")
 
-# --- OPTIMIZACIÓN DE CARGA (Whisper) ---
-_model = None
+# --- MODELOS (carga perezosa vía core.model_manager) ---
 _ZERO_WIDTH = dict.fromkeys([0x200B, 0x200C, 0x200D, 0xFEFF, 0x2060, 0x00AD], None)
 
+def _load_whisper():
+    import torch
+    from faster_whisper import WhisperModel
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    return WhisperModel(
+        WHISPER_MODEL, 
+        device=device, 
+        compute_type="float16" if device == "cuda" else "int8"
+    )
+
+def _load_elevenlabs():
+    from elevenlabs.client import ElevenLabs
+    return ElevenLabs(api_key=ELEVEN_API_KEY)
+
+def _load_piper_voices():
+    """
+    Piper corre como proceso aparte: 'cargar' es comprobar el binario y leer cada .onnx
+    una vez para dejarlo en la caché de páginas del SO (el primer job no paga la lectura).
+    Devuelve {voz: ruta}.
+    """
+    if shutil.which("piper") is None:
+        raise FileNotFoundError("binario 'piper' no encontrado en el PATH")
+    voices = {}
+    for name in sorted(os.listdir(PIPER_MODELS_DIR)) if os.path.isdir(PIPER_MODELS_DIR) else []:
+        if name.endswith(".onnx"):
+            path = os.path.join(PIPER_MODELS_DIR, name)
+            with open(path, "rb") as f:
+                while f.read(8 * 1024 * 1024):
+                    pass
+            voices[name[:-len(".onnx")]] = path
+    return voices
+
+models.register("whisper", _load_whisper)
+models.register("elevenlabs", _load_elevenlabs, idle_ttl=None)
+# Con ElevenLabs configurado, Piper solo es el fallback: si falta no bloquea /health/ready
+models.register("piper", _load_piper_voices, idle_ttl=None, optional=ELEVEN_ENABLED)
+
 def get_whisper_model():
-    global _model
-    if _model is None:
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        _model = WhisperModel(
-            "medium", 
-            device=device, 
-            compute_type="float16" if device == "cuda" else "int8"
-        )
-    return _model
+    return models.get("whisper")
 
 # --- LIMPIEZA Y PROSODIA ---
 def sanitize_for_piper(text: str) -> str:
@@ -55,23 +88,29 @@ async def generate_audio(texto, voice="FN2V6hDljTL9BYyYuy7p", save_path=None, **
     """
     Genera audio usando ElevenLabs (SDK v1) si hay API Key y el ID es reconocido, 
     de lo contrario usa Piper localmente.
+    La salida cruda pasa una sola vez por modules.audio_post (loudnorm + resample a WAV)
+    con los objetivos de `audio_config` (bloque "audio" del perfil).
+    Devuelve un AudioInfo (ruta, duración, medidas de sonoridad) o None si falla.
     """
     if not save_path:
         save_path = f"assets/audio/voice_{int(time.time())}.wav"
     
     os.makedirs(os.path.dirname(save_path), exist_ok=True)
     texto_ready = humanize_text(sanitize_for_piper(texto))
+    audio_cfg = kwargs.get("audio_config")
 
     # 1. ¿Es ElevenLabs o Piper?
     # Usamos ElevenLabs solo si el cliente existe y la voz no es un modelo local es_ES
-    is_elevenlabs = client is not None and "es_ES" not in voice
+    is_elevenlabs = ELEVEN_ENABLED and "es_ES" not in voice
 
     if is_elevenlabs:
+        temp_mp3 = save_path.replace(".wav", ".mp3")
         try:
-            print(f"🎙️ Generando con ElevenLabs API (Voice: {voice})...")
+            log.info(f"🎙️ Generando con ElevenLabs API (Voice: {voice})...")
             style_cfg = kwargs.get("elevenlabs_style", {})
             
             # Llamada oficial SDK v1
+            client = models.get("elevenlabs")
             audio_iterator = client.text_to_speech.convert(
                 text=texto_ready,
                 voice_id=voice,
@@ -86,36 +125,31 @@ async def generate_audio(texto, voice="FN2V6hDljTL9BYyYuy7p", save_path=None, **
             )
 
             # Guardar MP3 temporal
-            temp_mp3 = save_path.replace(".wav", ".mp3")
             with open(temp_mp3, "wb") as f:
                 for chunk in audio_iterator:
                     if chunk:
                         f.write(chunk)
 
-            # Convertir a WAV 48kHz para consistencia en el motor de video
-            audio = AudioSegment.from_file(temp_mp3)
-            if kwargs.get("postprocess_mode") == "radio":
-                audio = audio.normalize(headroom=0.1) + 3
-            
-            audio.set_frame_rate(48000).set_channels(1).export(save_path, format="wav", codec="pcm_s16le")
-            
-            if os.path.exists(temp_mp3): os.remove(temp_mp3)
-            return save_path
+            # MP3 -> loudnorm -> WAV 48kHz en una sola pasada
+            return postprocess_audio(temp_mp3, save_path, audio_cfg)
 
         except Exception as e:
-            print(f"⚠️ Error ElevenLabs: {e}. Reintentando con Piper...")
+            log.warning(f"⚠️ Error ElevenLabs: {e}. Reintentando con Piper...")
             voice = "es_ES-sharvard-medium" 
+        finally:
+            if os.path.exists(temp_mp3): os.remove(temp_mp3)
 
     # 2. Lógica de Piper (Fallback)
-    base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    model_path = os.path.join(base_path, "assets", "models", f"{voice}.onnx")
+    model_path = os.path.join(PIPER_MODELS_DIR, f"{voice}.onnx")
     
     if not os.path.exists(model_path):
         voice = "es_ES-sharvard-medium"
-        model_path = os.path.join(base_path, "assets", "models", f"{voice}.onnx")
+        model_path = os.path.join(PIPER_MODELS_DIR, f"{voice}.onnx")
 
+    # Piper escribe a su frecuencia nativa; el post-proceso genera el WAV final
+    raw_path = save_path.replace(".wav", ".piper.wav")
     command = [
-        "piper", "--model", model_path, "--output_file", save_path,
+        "piper", "--model", model_path, "--output_file", raw_path,
         "--length_scale", "1.0", "--sentence_silence", "0.4"
     ]
     
@@ -124,40 +158,36 @@ async def generate_audio(texto, voice="FN2V6hDljTL9BYyYuy7p", save_path=None, **
         proc.communicate(input=texto_ready.encode("utf-8"), timeout=60)
         
         # Normalizar siempre a 48kHz para evitar errores de renderizado
-        audio = AudioSegment.from_wav(save_path).set_frame_rate(48000).set_channels(1)
-        audio.export(save_path, format="wav", codec="pcm_s16le")
-        return save_path
+        return postprocess_audio(raw_path, save_path, audio_cfg)
     except Exception as e:
-        print(f"❌ Error crítico de Voz: {e}")
+        log.error(f"❌ Error crítico de Voz: {e}")
         return None
+    finally:
+        if os.path.exists(raw_path): os.remove(raw_path)
 
 # --- WHISPER Y TIMESTAMPS ---
 def get_word_timestamps(audio_path, job_path=None, original_text=""):
-    model = get_whisper_model()
-    segments, info = model.transcribe(
-        audio_path, 
-        language="es",
-        word_timestamps=True,
-        initial_prompt=original_text[:1000]
-    )
+    # transcribe() es perezoso: el modelo debe seguir cargado mientras se consumen los segmentos
+    with models.use("whisper") as model:
+        segments, info = model.transcribe(
+            audio_path, 
+            language="es",
+            word_timestamps=True,
+            initial_prompt=original_text[:1000]
+        )
 
-    words_data = []
-    for segment in segments:
-        if segment.words:
-            for w in segment.words:
-                raw = w.word.strip()
-                clean = re.sub(r"\W+", "", raw).upper()
-                if clean:
-                    words_data.append({
-                        "word": clean,
-                        "raw_word": raw,
-                        "start": round(w.start, 3),
-                        "end": round(w.end, 3)
-                    })
+        builder = TimelineBuilder()
+        for segment in segments:
+            if segment.words:
+                for w in segment.words:
+                    raw = w.word.strip()
+                    clean = re.sub(r"\W+", "", raw).upper()
+                    if clean:
+                        builder.append(clean, raw, w.start, w.end)
+    timeline = builder.build()
     
     if job_path:
         os.makedirs(job_path, exist_ok=True)
-        with open(os.path.join(job_path, "timestamps.json"), "w", encoding="utf-8") as f:
-            json.dump(words_data, f, indent=4, ensure_ascii=False)
+        dump_timeline(os.path.join(job_path, "timeline.tlb"), timeline)
 
-    return words_data
\ No newline at end of file
+    return timeline
@@ -0,0 +1,349 @@
+"""
+Pipeline de render (TTS -> transcripción -> clips -> movis -> encode), sin nada de la API.
+Lo ejecutan los workers (worker.py) a partir de las tareas del broker; el nodo API no
+importa este módulo, así que nunca carga modelos ni renderiza.
+"""
+import os, re, asyncio
+import gc
+import requests
+import core.sprite_controller as sprite_controller
+import core.progress as progress
+import core.model_manager as models
+import core.scratch as scratch
+import core.bandwidth as bandwidth
+from core.profile_manager import load_profile
+from core.layout_engine import stock_layer_side
+from core.profiling import stage
+from core.storage import make_storage
+from core.tracing import get_logger, job_context, span, current_span, current_job_id
+from core.timeline import SegmentTable
+from core.variants import ASPECTS, normalize_variants
+
+# Módulos propios
+from modules.voice_engine import generate_audio, get_word_timestamps
+from modules.asset_manager import AssetManager
+from modules.processor import extract_keywords
+from modules.video_engine import VideoEngine
+from modules.segmenter import segment_timeline, split_into_shorts
+from modules.audio_post import cut_audio
+
+log = get_logger("pipeline")
+
+# --- CONFIGURACIÓN Y RUTAS ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(BASE_DIR, "assets")
+
+# ----- N8N CONFIG -----
+N8N_WEBHOOK_URL = os.environ.get("AI_SHORTS_N8N_WEBHOOK_URL", "http://localhost:5678/webhook/video-listo")
+
+# Variantes de un mismo job renderizadas a la vez (cada una usa movis + un encode ffmpeg)
+VARIANT_WORKERS = max(1, int(os.environ.get("AI_SHORTS_VARIANT_WORKERS", "2")))
+
+# Destino de los vídeos terminados (ver core.storage)
+storage = make_storage()
+
+# --- UTILIDADES ---
+def sanitize_filename(name: str, fallback: str) -> str:
+    name = re.sub(r"[^a-zA-Z0-9_\-]+", "_", str(name or "").strip())
+    return name.strip("_") or fallback
+
+def notify_n8n(job_id, final_path, title, profile, variants=None):
+    """Función centralizada para avisar a n8n que el video está listo."""
+    payload = {
+        "job_id": job_id,
+        "status": "completed",
+        "file_path": final_path,
+        "title": title,
+        "profile": profile,
+        "event": "video_ready"
+    }
+    if variants:
+        payload["variants"] = variants
+    try:
+        # Enviamos el aviso al Webhook de n8n
+        response = requests.post(N8N_WEBHOOK_URL, json=payload, timeout=10)
+        log.info(f"📡 Aviso enviado a n8n: {response.status_code}")
+    except Exception as e:
+        log.warning(f"⚠️ n8n no respondió al aviso final: {e}")
+
+def group_timestamps(timeline, segmentation=None):
+    """Agrupa el WordTimeline en una SegmentTable con los umbrales del perfil (ver modules.segmenter)."""
+    return segment_timeline(timeline, segmentation)
+
+# --- LÓGICA DE PROCESAMIENTO ---
+
+async def process_row(text, profile, title, keywords_override, job_id, job_path=None, output_prefix="", layout_override=None,
+                      shorts=None):
+    """
+    Renderiza un vídeo completo y lo guarda en `storage` bajo `output_prefix`. Devuelve su ubicación.
+    Con `shorts` la narración se parte en varios shorts (ver modules.segmenter.split_into_shorts):
+    0 = los mínimos para no pasar de short_max_duration, N = N shorts. Devuelve {"shortK": ubicación}.
+    """
+    job_path = job_path or scratch.job_dir(job_id)
+    # Todo lo que ocurre dentro (incluidos hilos de asyncio.to_thread) hereda el job_id
+    progress.start_job(job_id)
+    status = "failed"
+    try:
+        with job_context(job_id), span("job", profile=profile or "default", title=title, layout=layout_override,
+                                       shorts=shorts):
+            if shorts is not None:
+                result = await _process_shorts(text, profile, title, keywords_override, job_id, job_path, output_prefix,
+                                               layout_override, int(shorts))
+            else:
+                result = await _process_row(text, profile, title, keywords_override, job_id, job_path, output_prefix,
+                                            layout_override)
+        status = "done"
+        return result
+    finally:
+        progress.finish_job(job_id, status)
+
+async def process_variants(text, profile, title, keywords_override, job_id, variants, job_path=None, output_prefix=""):
+    """
+    Un guion, N salidas: audio, transcripción y clips se calculan una vez y cada variante
+    (ver core.variants) se renderiza en paralelo sobre esos artefactos.
+    Devuelve {nombre_variante: ubicación}.
+    """
+    job_path = job_path or scratch.job_dir(job_id)
+    progress.start_job(job_id)
+    status = "failed"
+    try:
+        with job_context(job_id), span("job", profile=profile or "default", title=title, variants=len(variants)):
+            result = await _process_variants(text, profile, title, keywords_override, job_id, job_path, output_prefix,
+                                             normalize_variants(variants))
+        status = "done"
+        return result
+    finally:
+        progress.finish_job(job_id, status)
+
+async def _prepare_job(text, profile, keywords_override, job_id, job_path, outputs=((None, None),)):
+    """
+    TTS -> transcripción -> segmentos -> clips: todo lo que no depende del layout de salida.
+    `outputs` = [(layout, lienzo)] que se van a renderizar: fija la resolución de los clips.
+    """
+    prof_data = load_profile(profile)
+    audio, timeline = await _voice_timeline(text, prof_data, job_path)
+    with stage("group_timestamps"):
+        segments = group_timestamps(timeline, prof_data.get("segmentation"))
+    manager = _asset_manager(prof_data, profile, job_id, outputs)
+    clips = _collect_clips(manager, segments, keywords_override, job_path)
+    return {"profile": prof_data, "audio": audio, "segments": segments, "clips": clips}
+
+async def _voice_timeline(text, prof_data, job_path):
+    """TTS -> transcripción: (AudioInfo de la voz, WordTimeline)."""
+    voice_model = prof_data.get("voice_model", "es_ES-sharvard-medium")
+    el_style = prof_data.get("elevenlabs_style", {})
+    
+    audio_dir = os.path.join(job_path, "audio")
+    os.makedirs(audio_dir, exist_ok=True)
+    voice_path = os.path.join(audio_dir, "voice.wav")
+
+    progress.update("tts", 0.0)
+    with stage("tts"):
+        audio = await generate_audio(text, voice=voice_model, save_path=voice_path, elevenlabs_style=el_style,
+                                     audio_config=prof_data.get("audio"))
+    if audio is None:
+        raise RuntimeError("No se pudo generar la voz")
+    
+    progress.update("transcribe", 0.0)
+    with stage("transcribe"):
+        timeline = get_word_timestamps(audio.path, job_path, text)
+    return audio, timeline
+
+def _asset_manager(prof_data, profile, job_id, outputs):
+    # Los clips se comparten entre salidas: basta la mayor capa de stock entre ellas
+    stock_side = max(stock_layer_side(prof_data, layout, canvas) for layout, canvas in outputs)
+    return AssetManager(profile_name=profile, job_id=job_id, target_side=stock_side)
+
+def _collect_clips(manager, segments, keywords_override, job_path, clip_prefix="clip", progress_range=(0.0, 1.0)):
+    """Un clip de stock por segmento (keywords -> búsqueda -> mejor tramo -> descarga)."""
+    kw_override = (keywords_override or "").strip().replace(";", ",")
+    lo, hi = progress_range
+    clips = []
+    for j in range(len(segments)):
+        progress.update("assets", lo + (hi - lo) * j / max(len(segments), 1))
+        duracion_segmento = segments.end(j) - segments.start(j) + 0.5
+        with stage("keywords"):
+            kw = kw_override if kw_override else extract_keywords(segments.phrase(j))
+        options = manager.search_stock_videos(kw)
+        if options:
+            chosen, clip_start = manager.pick_best_clip(options, duracion_segmento)
+            p = manager.download_from_url(chosen["download_link"], f"{clip_prefix}_{j}", job_path,
+                                          duration=duracion_segmento, start=clip_start)
+            if p: clips.append(os.path.abspath(p))
+    return clips
+
+def _render_output(prepared, profile, job_path, out_temp, layout=None, preset=None, canvas_size=None, sprite_plan=None):
+    os.makedirs(os.path.dirname(out_temp), exist_ok=True)
+    engine = VideoEngine(output_path=out_temp, canvas_size=canvas_size)
+    return engine.assemble_video(
+        clip_paths=prepared["clips"], 
+        audio_path=os.path.abspath(prepared["audio"].path), 
+        audio_duration=prepared["audio"].duration,
+        segments=prepared["segments"], 
+        profile_name=profile, 
+        job_path=job_path,
+        preset_from_front=preset,
+        layout_mode=layout,
+        sprite_plan=sprite_plan
+    )
+
+def _cleanup_job(job_path, success):
+    sprite_controller._last_pose = None
+    gc.collect()
+    models.release_gpu_cache()
+    # Si falla se conserva para depurar (scratch.sweep() lo borra cuando caduca)
+    size = scratch.release(job_path) if success else scratch.usage(job_path)
+    net = bandwidth.pop_job(current_job_id())
+    current_span().set(scratch_bytes=size, download_bytes=net["bytes"], download_throttled=round(net["throttled"], 2))
+    if net["files"]:
+        log.info(f"🌐 Descargas del job: {net['files']} archivos, {net['bytes'] / 1e6:.1f} MB "
+                 f"en {net['seconds']:.1f}s (espera por límite {net['throttled']:.1f}s)")
+
+async def _process_row(text, profile, title, keywords_override, job_id, job_path, output_prefix, layout_override=None):
+    success = False
+    try:
+        log.info(f"🚀 Procesando: {title} | Job ID: {job_id}")
+        gc.collect()
+
+        prepared = await _prepare_job(text, profile, keywords_override, job_id, job_path,
+                                      outputs=[(layout_override, None)])
+        out_temp = os.path.join(job_path, "output", "final_render.mp4")
+        _render_output(prepared, profile, job_path, out_temp, layout=layout_override)
+
+        # El job_id en el nombre: dos guiones con el mismo título no comparten archivo
+        safe_title = sanitize_filename(title, fallback="video")
+        final_path = storage.put(out_temp, "/".join(p for p in (output_prefix, f"{safe_title}_{job_id}.mp4") if p),
+                                 move=True)
+        log.info(f"✨ VIDEO LISTO: {final_path}")
+        
+        success = True
+        
+        # --- AVISO A N8N (AUTOMÁTICO) ---
+        notify_n8n(job_id, final_path, title, profile)
+            
+        return final_path
+
+    except Exception as e:
+        log.exception(f"❌ Error: {str(e)}")
+        raise e
+    finally:
+        _cleanup_job(job_path, success)
+
+async def _process_variants(text, profile, title, keywords_override, job_id, job_path, output_prefix, variants):
+    success = False
+    try:
+        log.info(f"🚀 Procesando: {title} | Job ID: {job_id} | {len(variants)} variantes")
+        gc.collect()
+
+        prepared = await _prepare_job(text, profile, keywords_override, job_id, job_path,
+                                      outputs=[(v["layout"], ASPECTS[v["aspect"]]) for v in variants])
+        # Mismas poses en todas las variantes (y sin tocar el estado global desde varios hilos)
+        sprite_plan = VideoEngine.plan_sprites(prepared["segments"], prepared["profile"])
+        safe_title = sanitize_filename(title, fallback="video")
+        limit = asyncio.Semaphore(VARIANT_WORKERS)
+
+        async def render_variant(v):
+            out_temp = os.path.join(job_path, "output", f"final_{v['name']}.mp4")
+            async with limit:
+                with span("variant", name=v["name"], aspect=v["aspect"], layout=v["layout"]):
+                    # movis y ffmpeg corren en hilos: los encodes de varias variantes se solapan
+                    await asyncio.to_thread(
+                        _render_output, prepared, profile, job_path, out_temp,
+                        layout=v["layout"], preset=v["preset"], canvas_size=ASPECTS[v["aspect"]], sprite_plan=sprite_plan
+                    )
+            key = "/".join(p for p in (output_prefix, f"{safe_title}_{job_id}_{v['name']}.mp4") if p)
+            return v["name"], await asyncio.to_thread(storage.put, out_temp, key, move=True)
+
+        outputs = dict(await asyncio.gather(*(render_variant(v) for v in variants)))
+        for name, path in outputs.items():
+            log.info(f"✨ VARIANTE LISTA ({name}): {path}")
+        
+        success = True
+        notify_n8n(job_id, next(iter(outputs.values())), title, profile, variants=outputs)
+        return outputs
+
+    except Exception as e:
+        log.exception(f"❌ Error: {str(e)}")
+        raise e
+    finally:
+        _cleanup_job(job_path, success)
+
+async def _process_shorts(text, profile, title, keywords_override, job_id, job_path, output_prefix, layout_override, shorts):
+    success = False
+    try:
+        log.info(f"🚀 Procesando: {title} | Job ID: {job_id} | partido en shorts")
+        gc.collect()
+
+        prof_data = load_profile(profile)
+        audio, timeline = await _voice_timeline(text, prof_data, job_path)
+        with stage("group_timestamps"):
+            parts = split_into_shorts(timeline, prof_data.get("segmentation"), target_count=shorts or None)
+        if not parts:
+            raise RuntimeError("La transcripción no tiene palabras")
+        # Un solo AssetManager: no repite clips entre shorts del mismo guion
+        manager = _asset_manager(prof_data, profile, job_id, [(layout_override, None)])
+        safe_title = sanitize_filename(title, fallback="video")
+
+        outputs = {}
+        for i, part in enumerate(parts, 1):
+            name = f"short{i}"
+            # El audio de cada short llega hasta el inicio del siguiente (conserva la pausa final)
+            next_start = parts[i]["start"] if i < len(parts) else None
+            short_audio = cut_audio(audio, part["start"], next_start, os.path.join(job_path, "audio", f"{name}.wav"))
+            clips = _collect_clips(manager, part["segments"], keywords_override, job_path, f"{name}_clip",
+                                   ((i - 1) / len(parts), i / len(parts)))
+            prepared = {"profile": prof_data, "audio": short_audio, "segments": part["segments"], "clips": clips}
+            out_temp = os.path.join(job_path, "output", f"final_{name}.mp4")
+            with span("short", index=i, start=part["start"], end=part["end"]):
+                _render_output(prepared, profile, job_path, out_temp, layout=layout_override)
+            key = "/".join(p for p in (output_prefix, f"{safe_title}_{job_id}_{name}.mp4") if p)
+            outputs[name] = storage.put(out_temp, key, move=True)
+            log.info(f"✨ SHORT LISTO ({i}/{len(parts)}): {outputs[name]}")
+
+        success = True
+        notify_n8n(job_id, next(iter(outputs.values())), title, profile, variants=outputs)
+        return outputs
+
+    except Exception as e:
+        log.exception(f"❌ Error: {str(e)}")
+        raise e
+    finally:
+        _cleanup_job(job_path, success)
+
+async def render_export(job_id, selections, timestamps, profile=None, preset=None, position=None):
+    """Export manual desde el editor: clips elegidos + timestamps editados. Devuelve la ubicación."""
+    with job_context(job_id), span("export", profile=profile or "default"):
+        return await _render_export(job_id, selections, timestamps, profile, preset, position)
+
+async def _render_export(job_id, selections, timestamps, profile, preset_from_front, position_from_front):
+    success = False
+    job_path = scratch.job_dir(job_id)
+    segments = SegmentTable.from_json(timestamps)
+    try:
+        manager = AssetManager(profile_name=profile)
+        clips = []
+        for i, (idx, url) in enumerate(selections.items()):
+            progress.update("assets", i / max(len(selections), 1))
+            clips.append(manager.download_from_url(url, f"clip_{i}", job_path, duration=(segments.end(int(idx))-segments.start(int(idx))+0.2)))
+        clips = [c for c in clips if c]
+
+        out_temp = os.path.join(job_path, "output", "final.mp4")
+        os.makedirs(os.path.dirname(out_temp), exist_ok=True)
+
+        await asyncio.to_thread(
+            VideoEngine(output_path=out_temp).assemble_video,
+            clip_paths=clips, audio_path=os.path.join(job_path, "audio", "voice.wav"), 
+            segments=segments, profile_name=profile, job_path=job_path,
+            preset_from_front=preset_from_front, position_from_front=position_from_front
+        )
+
+        final_path = storage.put(out_temp, f"Manual/video_{job_id}.mp4", move=True)
+        
+        # --- AVISO A N8N (MANUAL) ---
+        notify_n8n(job_id, final_path, f"Manual_{job_id}", profile)
+        success = True
+        return final_path
+    finally:
+        bandwidth.pop_job(job_id)
+        if success:
+            scratch.release(job_path)
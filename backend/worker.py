@@ -0,0 +1,189 @@
+"""
+Worker de render: consume tareas del broker, ejecuta el pipeline y publica progreso y resultado.
+
+Uso (desde backend/):
+    python -m worker                       # broker SQLite local (data/broker.db)
+    AI_SHORTS_BROKER_URL=redis://cola:6379/0 AI_SHORTS_STORAGE_URL=s3://bucket/shorts python -m worker
+
+Cada proceso ejecuta `--concurrency` tareas a la vez (1 por defecto: el render ya usa
+todos los núcleos); para escalar se lanzan más procesos o máquinas contra el mismo broker.
+Cada tarea corre en un hilo propio con su propio event loop (el pipeline tiene etapas
+síncronas largas): el loop del worker queda libre para heartbeats y mantenimiento.
+"""
+import argparse, asyncio, os, socket, time, uuid
+import core.model_manager as models
+import core.progress as progress
+import core.scratch as scratch
+import core.bandwidth as bandwidth
+from core.broker import make_broker, LEASE_SECONDS
+from core.tracing import setup_logging, get_logger
+
+log = get_logger("worker")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Mismo valor que en main.py: fuera del directorio servido en /assets
+DATA_DIR = os.environ.get("AI_SHORTS_DATA_DIR") or os.path.join(BASE_DIR, "data")
+BROKER_DB = os.path.join(DATA_DIR, "broker.db")
+
+POLL_INTERVAL = 1.0       # espera entre consultas con la cola vacía
+HOUSEKEEPING_INTERVAL = 10.0
+PROGRESS_INTERVAL = 0.5   # frecuencia máxima de escritura de progreso en el broker
+
+
+class ProgressReporter:
+    """Listener de core.progress que reenvía (con throttling) cada snapshot al broker."""
+
+    def __init__(self, broker, task_id, worker_id):
+        self.broker = broker
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self._last = 0.0
+
+    def __call__(self, snap, force=False):
+        now = time.monotonic()
+        if snap is None or (not force and now - self._last < PROGRESS_INTERVAL):
+            return
+        self._last = now
+        try:
+            self.broker.report_progress(self.task_id, self.worker_id, snap)
+        except Exception as e:
+            log.warning(f"⚠️ No se pudo publicar el progreso de {self.task_id}: {e}")
+
+
+class Worker:
+    def __init__(self, broker, worker_id=None, concurrency=1, kinds=None):
+        self.broker = broker
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+        self.concurrency = concurrency
+        self.kinds = kinds
+        self.running = {}
+        self.job_dirs = set()  # job_ids cuyo scratch está en uso (en /export no es el task_id)
+        self.processed = 0
+        self.pipeline = None
+
+    async def run_task(self, task):
+        task_id, kind, payload = task["task_id"], task["kind"], task["payload"] or {}
+        # El progreso se registra con el job_id del pipeline (en /export no coincide con task_id)
+        progress_key = payload.get("job_id", task_id)
+        reporter = ProgressReporter(self.broker, task_id, self.worker_id)
+        progress.discard(progress_key)
+        progress.start_job(progress_key)
+        progress.add_listener(progress_key, reporter)
+        heartbeat = asyncio.create_task(self._heartbeat(task_id))
+        self.running[task_id] = kind
+        self.job_dirs.add(progress_key)
+        log.info(f"🛠️ Tarea {task_id} ({kind}) intento {task['attempts']}")
+        try:
+            location = await asyncio.to_thread(asyncio.run, self._execute(task_id, kind, payload))
+            progress.finish_job(progress_key, "done")
+            await asyncio.to_thread(reporter, progress.get(progress_key), True)
+            owned = await asyncio.to_thread(self.broker.complete, task_id, self.worker_id, {"location": location})
+        except Exception as e:
+            progress.finish_job(progress_key, "failed")
+            await asyncio.to_thread(reporter, progress.get(progress_key), True)
+            log.exception(f"❌ Tarea {task_id} fallida: {e}")
+            owned = await asyncio.to_thread(self.broker.fail, task_id, self.worker_id, f"{type(e).__name__}: {e}")
+        finally:
+            heartbeat.cancel()
+            self.running.pop(task_id, None)
+            self.job_dirs.discard(progress_key)
+            self.processed += 1
+            progress.discard(progress_key)
+        if not owned:
+            log.warning(f"⚠️ Tarea {task_id}: el lease ya no es de este worker, resultado descartado")
+
+    async def _execute(self, task_id, kind, payload):
+        if kind == "render":
+            return await self.pipeline.process_row(job_id=task_id, **payload)
+        if kind == "variants":
+            return await self.pipeline.process_variants(job_id=task_id, **payload)
+        if kind == "export":
+            return await self.pipeline.render_export(**payload)
+        raise ValueError(f"Tipo de tarea desconocido: {kind}")
+
+    async def _heartbeat(self, task_id):
+        while True:
+            await asyncio.sleep(LEASE_SECONDS / 4)
+            try:
+                owned = await asyncio.to_thread(self.broker.heartbeat, task_id, self.worker_id)
+            except Exception as e:
+                log.warning(f"⚠️ Heartbeat de {task_id} falló: {e}")
+                continue
+            if not owned:
+                log.warning(f"⚠️ Tarea {task_id}: lease perdido (reencolada o terminada por otro)")
+                return
+
+    async def _slot(self, once):
+        while True:
+            task = await asyncio.to_thread(self.broker.claim, self.worker_id, self.kinds)
+            if task is None:
+                if once:
+                    return
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+            await self.run_task(task)
+
+    def status(self):
+        return {
+            "host": socket.gethostname(), "pid": os.getpid(), "concurrency": self.concurrency,
+            "running": dict(self.running), "processed": self.processed,
+            "ready": models.is_ready(), "models": models.status()["models"],
+            "scratch": scratch.stats(), "bandwidth": bandwidth.stats(),
+        }
+
+    async def _sweep_scratch(self):
+        stale = await asyncio.to_thread(scratch.sweep, keep=set(self.job_dirs))
+        if stale:
+            log.info(f"🧹 {stale} directorio(s) de scratch abandonados en cola de borrado")
+
+    async def _housekeeping(self):
+        last_sweep = time.monotonic()
+        while True:
+            try:
+                if time.monotonic() - last_sweep >= scratch.SWEEP_INTERVAL:
+                    last_sweep = time.monotonic()
+                    await self._sweep_scratch()
+                await asyncio.to_thread(self.broker.requeue_expired)
+                await asyncio.to_thread(lambda: self.broker.worker_heartbeat(self.worker_id, self.status()))
+                evicted = await asyncio.to_thread(models.evict_idle)
+                if evicted:
+                    log.info(f"🧹 Modelos inactivos descargados: {', '.join(evicted)}")
+            except Exception as e:
+                log.warning(f"⚠️ Mantenimiento del worker falló: {e}")
+            await asyncio.sleep(HOUSEKEEPING_INTERVAL)
+
+    async def run(self, once=False, warmup=True):
+        import pipeline  # pesado: solo en el worker
+        self.pipeline = pipeline
+        bandwidth.share_via(self.broker)  # AI_SHORTS_BANDWIDTH_MBPS es global a todos los workers
+        await self._sweep_scratch()
+        log.info(f"👷 Worker {self.worker_id} | concurrencia {self.concurrency} | tipos {self.kinds or 'todos'}")
+        housekeeping = asyncio.create_task(self._housekeeping())
+        if warmup:
+            # Las tareas pueden reclamarse ya: models.get() espera a que termine la carga
+            asyncio.create_task(asyncio.to_thread(models.warm_up))
+        else:
+            models.warm_up([])  # sin precarga: listo ya, los modelos se cargan en el primer uso
+        try:
+            await asyncio.gather(*(self._slot(once) for _ in range(self.concurrency)))
+        finally:
+            housekeeping.cancel()
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Worker de render de AI Shorts")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("AI_SHORTS_WORKER_CONCURRENCY", "1")))
+    parser.add_argument("--kinds", nargs="*", default=None, help="Tipos de tarea a consumir (render, variants, export)")
+    parser.add_argument("--worker-id", default=None)
+    parser.add_argument("--once", action="store_true", help="Salir cuando la cola quede vacía")
+    parser.add_argument("--no-warmup", action="store_true")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    os.chdir(BASE_DIR)  # el pipeline usa rutas relativas a backend/
+    worker = Worker(make_broker(default_path=BROKER_DB), args.worker_id, max(1, args.concurrency), args.kinds)
+    asyncio.run(worker.run(once=args.once, warmup=not args.no_warmup))
+
+
+if __name__ == "__main__":
+    main_cli()